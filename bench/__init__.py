@@ -0,0 +1,10 @@
+"""Benchmarks of the firmware hot paths, for CPython and the MicroPython unix port.
+
+	python bench/run.py            # run and compare with bench/baselines/<impl>.json
+	micropython bench/run.py
+	python bench/run.py --save     # store current results as the new baseline
+
+QuecPython-only modules are replaced by bench/shims.py. Every case reports
+ops/s, bytes allocated per op and garbage collections per 1000 ops; a case
+regresses when ops/s drops or bytes/op grows by more than the threshold.
+"""
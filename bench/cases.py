@@ -0,0 +1,201 @@
+"""Firmware hot paths: each case factory returns an op, CASES lists (name, factory, iterations)"""
+import ustruct
+import ujson
+from usr.gt06_protocol import GT06Protocol
+from usr.http_protocol import HTTPProtocol
+from usr.data_buffer import DataBuffer
+from usr.gps_controller import GPSController
+from usr.battery import BatteryMonitor
+from usr.logger import LogRing
+from usr.location import LocationFix, fixes
+from bench.shims import FakeSocket
+
+
+GSV = (
+	['$GPGSV', '4', '1', '13', '05', '21', '278', '', '07', '65', '105', '23', '08', '39', '067', '23', '09', '13', '161', '', '0*67'],
+	['$GPGSV', '4', '2', '13', '13', '33', '307', '14', '14', '45', '226', '', '15', '09', '323', '', '20', '07', '250', '', '0*6D'],
+	['$GPGSV', '4', '3', '13', '21', '17', '246', '', '22', '28', '226', '', '27', '18', '039', '18', '30', '83', '273', '', '0*68'],
+	['$GPGSV', '4', '4', '13', '194', '28', '069', '27', '0*6B']
+)
+RMC = ['$GNRMC', '103416.000', 'A', '5322.44671', 'N', '05858.01250', 'E', '12.40', '16.51', '091125', '', '', 'A', 'V*36']
+GGA = ['$GNGGA', '103416.000', '5322.44671', 'N', '05858.01250', 'E', '1', '10', '1.5', '13.8', 'M', '-11.1', 'M', '', '*50']
+
+
+class Leds:
+	def set_network_status(self, mode):
+		pass
+
+
+class FakeGNSS:
+	"""GNSS returning fixed NMEA sentences"""
+
+	def readAndParse(self):
+		return 1
+
+	def getRMC(self):
+		return RMC
+
+	def getGGA(self):
+		return GGA
+
+	def getGSV(self):
+		return GSV
+
+	def getLocation(self):
+		return (53.374112, 'N', 58.966875, 'E')
+
+	def getAltitude(self):
+		return 312.5
+
+	def getSpeed(self):
+		return 22.9
+
+	def getUsedSateCnt(self):
+		return 10
+
+
+def _wifi(count):
+	"""Fingerprint: count byte, MAC + abs(RSSI) per AP"""
+	data = bytearray([count])
+	for i in range(count):
+		data.extend(bytes([0x02, 0x1A, 0x11, 0x00, i, 0x10 + i, 50 + i]))
+	return bytes(data)
+
+
+def _cells(count):
+	"""LBS record: count byte, MCC MNC LAC CI RSSI per cell"""
+	data = bytearray([count])
+	for i in range(count):
+		data.extend(ustruct.pack('>HHHIB', 250, 1, 0x1D2C, 0x0ABC1230 + i, 70 + i))
+	return bytes(data)
+
+
+def _record(**extra):
+	record = {'timestamp': 1790000000, 'latitude': 53.374112, 'longitude': 58.966875, 'altitude': 312.5, 'speed': 22.9,
+	          'course': 16, 'satellites': 10, 'battery': 87, 'charging': False, 'valid': True, 'source': 'gps', 'accuracy': 1.5}
+	record.update(extra)
+	fix = LocationFix()
+	fix.update(record)
+	return fix
+
+
+def _gt06():
+	protocol = GT06Protocol('bench', 5023, Leds())
+	protocol.socket = FakeSocket()
+	protocol.connected = True
+	return protocol
+
+
+def gt06_crc():
+	protocol = _gt06()
+	body = bytes(range(30))
+	return lambda: protocol._calculate_crc(body)
+
+
+def gt06_location():
+	protocol = _gt06()
+	record = _record()
+	return lambda: protocol.send_location(record)
+
+
+def gt06_hybrid():
+	protocol = _gt06()
+	record = _record(valid=False, source='hybrid', wifi=_wifi(5), cells=_cells(3))
+	return lambda: protocol.send_location(record)
+
+
+def http_location():
+	protocol = HTTPProtocol('bench', 80, '/api/location', Leds())
+	record = _record()
+	return lambda: protocol.send_location(record)
+
+
+def json_dumps():
+	record = _record().to_dict()
+	record['imei'] = '866123456789012'
+	return lambda: ujson.dumps(record)
+
+
+def _buffer_cycle(backlog):
+	buffer = DataBuffer()
+	record = _record()
+
+	def op():
+		for _ in range(backlog):
+			buffer.add(record)
+		while buffer.size():
+			buffer.peek(8)
+			buffer.remove(8)
+	return op
+
+
+def buffer_10():
+	return _buffer_cycle(10)
+
+
+def buffer_100():
+	return _buffer_cycle(100)
+
+
+def buffer_500():
+	return _buffer_cycle(500)
+
+
+def _gps():
+	gps = GPSController(1, 10)
+	gps.gnss = FakeGNSS()
+	gps.enabled = True
+	return gps
+
+
+def gps_gsv():
+	gps = _gps()
+	return gps.get_satellites_info
+
+
+def gps_rmc():
+	gps = _gps()
+	return lambda: fixes.release(gps.get_location())
+
+
+def battery_percentage():
+	battery = BatteryMonitor(sample=False)
+	voltages = [3.0 + i * 0.013 for i in range(100)]
+
+	def op():
+		for voltage in voltages:
+			battery._voltage_to_percentage(voltage)
+	return op
+
+
+def _log():
+	ring = LogRing()
+	ring.configure(level='INFO', console='OFF')
+	return ring.get('bench')
+
+
+def log_filtered():
+	log = _log()
+	return lambda: log.debug('{} sent successfully', 'GPS location')
+
+
+def log_ring():
+	log = _log()
+	return lambda: log.info('{} sent successfully', 'GPS location')
+
+
+CASES = (
+	('gt06_crc', gt06_crc, 2000),
+	('gt06_location', gt06_location, 1000),
+	('gt06_hybrid', gt06_hybrid, 1000),
+	('http_location', http_location, 1000),
+	('json_dumps', json_dumps, 2000),
+	('buffer_add_drain_10', buffer_10, 100),
+	('buffer_add_drain_100', buffer_100, 20),
+	('buffer_add_drain_500', buffer_500, 5),
+	('gps_gsv_parse', gps_gsv, 2000),
+	('gps_rmc_location', gps_rmc, 2000),
+	('battery_percentage_x100', battery_percentage, 200),
+	('log_filtered', log_filtered, 5000),
+	('log_ring', log_ring, 2000)
+)
@@ -0,0 +1,94 @@
+"""Estimated mAh/day of reporting strategies on the same simulated day (CPython only).
+
+	python -m bench.energy --day bench/days/delivery.json
+	python -m bench.energy --scenario commute --server HTTP interval_60s sleep_5min
+
+Every strategy replays the day in a fresh simulator with config overrides and
+reports the firmware energy ledger (usr/energy.py) projected to a day, its
+largest components and, for reference, the charge drawn from the simulated
+battery (whose model only knows awake, sleep and GNSS current).
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+
+from sim import World, install, uninstall, run_tracker
+from sim.run import write_config
+from sim.scenarios import SCENARIOS, recorded
+
+
+# (name, config overrides) compared against the first entry
+STRATEGIES = (
+	('default', {}),
+	('interval_30s', {'update_interval': 30}),
+	('interval_60s', {'update_interval': 60}),
+	('sleep_5min', {'sleep_timeout': 300}),
+	('wake_6h', {'wake_interval': 21600}),
+	('no_wifi', {'wifi_location_enabled': False}),
+	('no_lbs', {'lbs_enabled': False}),
+	('led_eco', {'led_eco_timeout': 60}),
+	('burst_30', {'burst_points': 30, 'burst_interval': 600}),
+	('burst_10min', {'burst_interval': 600})
+)
+
+
+def run_strategy(scenario, overrides, hours, seed, server):
+	"""Run one strategy, return firmware ledger snapshot and simulator figures"""
+	world = World(seed=seed)
+	scenario(world)
+	write_config(world, server, **overrides)
+	install(world)
+	try:
+		with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+			report = run_tracker(world, hours)
+		model_mah = world.battery.consumed_mah
+	finally:
+		uninstall()
+		world.close()
+	ledger = report['energy']
+	return {
+		'mah_day': ledger['mah_day'],
+		'model_mah_day': round(model_mah * 24.0 / hours, 1),
+		'components': dict((name, value['mah']) for name, value in ledger['components'].items()),
+		'packets': sum(report['packets'].values()),
+		'awake_s': report['awake_s']
+	}
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Compare reporting strategies by estimated energy per day')
+	parser.add_argument('strategies', nargs='*', help='strategy names (default: all)')
+	parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='commute')
+	parser.add_argument('--day', help='recorded day JSON (see sim.scenarios.recorded)')
+	parser.add_argument('--hours', type=float, default=24.0)
+	parser.add_argument('--seed', type=int, default=1)
+	parser.add_argument('--server', default='GT06', choices=['GT06', 'HTTP'])
+	parser.add_argument('--json', action='store_true', help='print results as JSON')
+	args = parser.parse_args(argv)
+
+	scenario = recorded(args.day) if args.day else SCENARIOS[args.scenario]
+	selected = [entry for entry in STRATEGIES if not args.strategies or entry[0] in args.strategies]
+	if not selected or selected[0][0] != 'default':
+		selected.insert(0, STRATEGIES[0])
+	results = []
+	for name, overrides in selected:
+		results.append((name, run_strategy(scenario, overrides, args.hours, args.seed, args.server)))
+
+	if args.json:
+		print(json.dumps(dict(results), indent=2, sort_keys=True))
+		return 0
+	reference = results[0][1]['mah_day']
+	print('{:<14} {:>9} {:>7} {:>11} {:>8} {:>8}  {}'.format('strategy', 'mAh/day', 'diff', 'sim mAh/day', 'packets', 'awake s', 'largest components (mAh)'))
+	for name, result in results:
+		top = sorted(result['components'].items(), key=lambda item: -item[1])[:3]
+		diff = '{:+.0f}%'.format((result['mah_day'] - reference) * 100.0 / reference) if reference else ''
+		print('{:<14} {:>9} {:>7} {:>11} {:>8} {:>8}  {}'.format(
+			name, result['mah_day'], diff, result['model_mah_day'], result['packets'], result['awake_s'],
+			' '.join('{}:{:.0f}'.format(component, mah) for component, mah in top)))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,161 @@
+import gc
+import sys
+import time
+try:
+	import builtins
+except ImportError:
+	builtins = None
+
+
+MICROPYTHON = sys.implementation.name == 'micropython'
+# Ops measured one by one for allocation; MicroPython runs them with GC disabled
+ALLOC_SAMPLES = 20
+
+
+if MICROPYTHON:
+	def _now_us():
+		return time.ticks_us()
+
+	def _elapsed_us(start):
+		return time.ticks_diff(time.ticks_us(), start)
+else:
+	import tracemalloc
+
+	def _now_us():
+		return time.perf_counter_ns() // 1000
+
+	def _elapsed_us(start):
+		return time.perf_counter_ns() // 1000 - start
+
+
+def _noop(*args, **kwargs):
+	pass
+
+
+class Quiet:
+	"""Silence firmware print() while benchmark ops run"""
+
+	def __enter__(self):
+		self.saved = print
+		if builtins:
+			builtins.print = _noop
+		return self
+
+	def __exit__(self, *args):
+		if builtins:
+			builtins.print = self.saved
+
+
+def _gc_collections():
+	"""Total collections so far (CPython only)"""
+	return sum(generation['collections'] for generation in gc.get_stats())
+
+
+def _time_ops(op, iterations):
+	"""Run op iterations times, return elapsed microseconds"""
+	gc.collect()
+	start = _now_us()
+	for _ in range(iterations):
+		op()
+	return max(_elapsed_us(start), 1)
+
+
+def _count_gc(op, iterations):
+	"""Collections triggered by iterations ops"""
+	gc.collect()
+	if not MICROPYTHON:
+		before = _gc_collections()
+		for _ in range(iterations):
+			op()
+		return _gc_collections() - before
+	# MicroPython has no counter: a drop of allocated bytes means the heap was collected
+	count = 0
+	previous = gc.mem_alloc()
+	for _ in range(iterations):
+		op()
+		current = gc.mem_alloc()
+		if current < previous:
+			count += 1
+		previous = current
+	return count
+
+
+def _alloc_per_op(op, samples):
+	"""Bytes allocated per op: heap growth with GC off (MicroPython), traced peak (CPython)"""
+	total = 0
+	gc.collect()
+	if MICROPYTHON:
+		gc.disable()
+		try:
+			for _ in range(samples):
+				before = gc.mem_alloc()
+				op()
+				total += gc.mem_alloc() - before
+		finally:
+			gc.enable()
+		return total // samples
+	tracemalloc.start()
+	try:
+		for _ in range(samples):
+			tracemalloc.reset_peak()
+			before = tracemalloc.get_traced_memory()[0]
+			op()
+			total += tracemalloc.get_traced_memory()[1] - before
+	finally:
+		tracemalloc.stop()
+	return total // samples
+
+
+def measure(op, iterations):
+	"""Benchmark op, return {'ops_s', 'alloc_b', 'gc_kop'}"""
+	with Quiet():
+		for _ in range(min(iterations, 10)):
+			op()
+		elapsed = _time_ops(op, iterations)
+		collections = _count_gc(op, iterations)
+		alloc = _alloc_per_op(op, min(iterations, ALLOC_SAMPLES))
+	return {
+		'ops_s': int(iterations * 1000000 // elapsed),
+		'alloc_b': alloc,
+		'gc_kop': round(collections * 1000.0 / iterations, 2)
+	}
+
+
+def compare(results, baseline, threshold):
+	"""Rows of (name, result, baseline or None, regressed)"""
+	rows = []
+	for name, result in results:
+		base = baseline.get(name)
+		regressed = False
+		if base:
+			if result['ops_s'] < base['ops_s'] * (100 - threshold) / 100:
+				regressed = True
+			if result['alloc_b'] > base['alloc_b'] * (100 + threshold) / 100 + 16:
+				regressed = True
+		rows.append((name, result, base, regressed))
+	return rows
+
+
+def _delta(value, base):
+	if not base:
+		return ''
+	return '{:+.0f}%'.format((value - base) * 100.0 / base)
+
+
+def format_rows(rows):
+	"""Result table with change against baseline"""
+	lines = ['{:<28} {:>10} {:>7} {:>9} {:>7} {:>7}'.format('case', 'ops/s', 'diff', 'bytes/op', 'diff', 'gc/kop')]
+	for name, result, base, regressed in rows:
+		lines.append('{:<28} {:>10} {:>7} {:>9} {:>7} {:>7}{}'.format(
+			name, result['ops_s'], _delta(result['ops_s'], base and base['ops_s']),
+			result['alloc_b'], _delta(result['alloc_b'], base and base['alloc_b']),
+			result['gc_kop'], '  REGRESSION' if regressed else ''))
+	return lines
+
+
+def dump_baseline(results):
+	"""Baseline JSON, one case per line sorted by name so changes diff cleanly"""
+	lines = []
+	for name, result in sorted(results):
+		lines.append('  "{}": {{"ops_s": {}, "alloc_b": {}, "gc_kop": {}}}'.format(name, result['ops_s'], result['alloc_b'], result['gc_kop']))
+	return '{\n' + ',\n'.join(lines) + '\n}\n'
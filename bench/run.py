@@ -0,0 +1,69 @@
+"""Run benchmarks: run.py [--save] [--quick] [--threshold PCT] [name ...]"""
+import sys
+
+
+BENCH_DIR = __file__.rsplit('/', 1)[0] if '/' in __file__ else '.'
+ROOT = BENCH_DIR.rsplit('/', 1)[0] if '/' in BENCH_DIR else '..' if BENCH_DIR == '.' else '.'
+if ROOT not in sys.path:
+	sys.path.insert(0, ROOT)
+
+from bench import shims
+shims.install()
+import json
+from bench import harness
+from bench.cases import CASES
+
+
+def _baseline_path():
+	return '{}/baselines/{}.json'.format(BENCH_DIR, sys.implementation.name)
+
+
+def _load_baseline():
+	try:
+		with open(_baseline_path()) as f:
+			return json.load(f)
+	except OSError:
+		return {}
+
+
+def main(argv):
+	save = '--save' in argv
+	quick = '--quick' in argv
+	threshold = 20
+	names = []
+	i = 0
+	while i < len(argv):
+		if argv[i] == '--threshold':
+			threshold = int(argv[i + 1])
+			i += 1
+		elif not argv[i].startswith('--'):
+			names.append(argv[i])
+		i += 1
+
+	results = []
+	for name, factory, iterations in CASES:
+		if names and not [n for n in names if n in name]:
+			continue
+		if quick:
+			iterations = max(iterations // 10, 1)
+		with harness.Quiet():
+			op = factory()
+		results.append((name, harness.measure(op, iterations)))
+
+	baseline = _load_baseline()
+	rows = harness.compare(results, baseline, threshold)
+	print('{} {}, baseline: {}'.format(sys.implementation.name, sys.version.split()[0], _baseline_path() if baseline else 'none'))
+	for line in harness.format_rows(rows):
+		print(line)
+	if save:
+		merged = dict(baseline)
+		merged.update(dict(results))
+		with open(_baseline_path(), 'w') as f:
+			f.write(harness.dump_baseline(list(merged.items())))
+		print('Baseline saved:', _baseline_path())
+		return 0
+	return 1 if [row for row in rows if row[3]] else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
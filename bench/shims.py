@@ -0,0 +1,222 @@
+# QuecPython-only modules needed to import the benchmarked firmware modules.
+# Works on CPython and the MicroPython unix port: shims are plain classes
+# registered in sys.modules, no module objects are created.
+import gc as host_gc
+import sys
+import time
+
+
+MICROPYTHON = sys.implementation.name == 'micropython'
+# u-prefixed module names mapped to the CPython standard library
+U_MODULES = (('ujson', 'json'), ('ustruct', 'struct'), ('ubinascii', 'binascii'), ('uos', 'os'), ('uarray', 'array'), ('urandom', 'random'))
+HTTP_OK = b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n'
+GT06_ACK = b'\x78\x78\x05\x12\x00\x01\xd9\xdc\x0d\x0a'
+
+
+class utime:
+	"""CPython utime with MicroPython ticks API"""
+
+	TICKS_MAX = (1 << 30) - 1
+
+	@staticmethod
+	def time():
+		return int(time.time())
+
+	@staticmethod
+	def localtime(secs=None):
+		t = time.gmtime(secs)
+		return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
+
+	@staticmethod
+	def sleep(seconds):
+		time.sleep(seconds)
+
+	@staticmethod
+	def sleep_ms(ms):
+		time.sleep(ms / 1000.0)
+
+	@staticmethod
+	def ticks_ms():
+		return int(time.monotonic() * 1000) & utime.TICKS_MAX
+
+	@staticmethod
+	def ticks_us():
+		return int(time.monotonic() * 1000000) & utime.TICKS_MAX
+
+	@staticmethod
+	def ticks_add(ticks, delta):
+		return (ticks + delta) & utime.TICKS_MAX
+
+	@staticmethod
+	def ticks_diff(end, start):
+		half = (utime.TICKS_MAX + 1) // 2
+		return ((end - start + half) & utime.TICKS_MAX) - half
+
+
+class HostGC:
+	"""CPython gc with MicroPython heap figures (fixed 1 MB heap)"""
+
+	HEAP = 1024 * 1024
+
+	def __getattr__(self, name):
+		return getattr(host_gc, name)
+
+	def mem_alloc(self):
+		return self.HEAP // 4
+
+	def mem_free(self):
+		return self.HEAP - self.mem_alloc()
+
+
+class FakeSocket:
+	"""Socket answering every send with a GT06 acknowledge"""
+
+	def __init__(self, *args):
+		self.sent = 0
+
+	def settimeout(self, timeout):
+		pass
+
+	def connect(self, addr):
+		pass
+
+	def send(self, data):
+		self.sent += len(data)
+		return len(data)
+
+	def recv(self, size):
+		return GT06_ACK
+
+	def close(self):
+		pass
+
+
+class HTTPSocket(FakeSocket):
+	"""Socket returning an HTTP 200 response once, then EOF"""
+
+	def __init__(self, *args):
+		FakeSocket.__init__(self)
+		self.done = False
+
+	def recv(self, size):
+		if self.done:
+			return b''
+		self.done = True
+		return HTTP_OK
+
+
+class usocket:
+	AF_INET = 2
+	SOCK_STREAM = 1
+	socket = HTTPSocket
+
+	@staticmethod
+	def getaddrinfo(host, port, *args):
+		return [(2, 1, 0, '', ('127.0.0.1', port))]
+
+
+class Pin:
+	OUT = 1
+	IN = 0
+	PULL_DISABLE = 0
+	PULL_PU = 1
+	PULL_PD = 2
+	GPIO10 = 10
+
+	def __init__(self, *args):
+		pass
+
+	def write(self, value):
+		pass
+
+
+class UART:
+	UART2 = 2
+
+
+class machine:
+	Pin = Pin
+	UART = UART
+	RTC = object
+	ExtInt = object
+
+
+class Power:
+	@staticmethod
+	def getVbatt():
+		return 3900
+
+
+class USB:
+	def getStatus(self):
+		return 0
+
+
+class misc:
+	Power = Power
+	USB = USB
+
+
+class GNSSStub:
+	def __init__(self, *args):
+		pass
+
+
+class gnss:
+	GNSS = GNSSStub
+
+
+class modem:
+	@staticmethod
+	def getDevImei():
+		return '866123456789012'
+
+
+class net:
+	@staticmethod
+	def csqQueryPoll():
+		return 20
+
+	@staticmethod
+	def getCellInfo():
+		return ([], [], [])
+
+
+class ntptime:
+	host = ''
+
+	@staticmethod
+	def settime(*args):
+		return 0
+
+
+class wifiScan:
+	@staticmethod
+	def support():
+		return False
+
+
+class osTimer:
+	def start(self, *args):
+		return 0
+
+	def stop(self):
+		return 0
+
+
+def install():
+	"""Register shims for modules the runtime does not provide"""
+	if not MICROPYTHON:
+		sys.modules['utime'] = utime
+		sys.modules['gc'] = HostGC()
+		for name, host in U_MODULES:
+			sys.modules[name] = __import__(host)
+	else:
+		for name, host in U_MODULES:
+			try:
+				__import__(name)
+			except ImportError:
+				sys.modules[name] = __import__(host)
+	for name, shim in (('usocket', usocket), ('machine', machine), ('misc', misc), ('gnss', gnss), ('modem', modem),
+	                   ('net', net), ('ntptime', ntptime), ('osTimer', osTimer), ('wifiScan', wifiScan)):
+		sys.modules[name] = shim
@@ -1,185 +1,185 @@
-
-"""
->>> help("modules")
-G711              cmath             net               uerrno
-SecureData        dataCall          ntptime           uhashlib
-TenCentYun        dial              osTimer           uio
-__main__          ethernet          pm                ujson
-__wifiLocator     event_message     ql_fs             umqtt
-_boot             example           qrcode            unzip
-_thread           file_crc32        quecIot           uos
-_uasyncio         file_sha256       queue             uping
-aLiYun            fota              request           urandom
-app_fota          ftplib            rsa               ure
-app_fota_download ftplibtls         sensor            uselect
-app_fota_mount    gc                sim               usocket
-app_fota_updater  gnss              slip              ussl
-atcmd             hashlib           sms               ustruct
-audio             hls               sys               usys
-audioCodec        hmac              sys_bus           utils
-backup_restore    hmacSha1          system            utime
-bak_util          log               time              uwebsocket
-base64            lvgl              tp                uzlib
-builtins          machine           uarray            webserver
-camera            math              ubinascii         wifiScan
-cellLocator       micropython       ucollections      wifilocator
-checkNet          misc              ucryptolib
-checksum          modem             uctypes
-
->>> help(builtins)
-object <module 'builtins'> is of type module
-	__name__ -- builtins
-	__build_class__ -- <function>
-	__import__ -- <function>
-	__repl_print__ -- <function>
-	bool -- <class 'bool'>
-	bytes -- <class 'bytes'>
-	bytearray -- <class 'bytearray'>
-	complex -- <class 'complex'>
-	dict -- <class 'dict'>
-	enumerate -- <class 'enumerate'>
-	filter -- <class 'filter'>
-	float -- <class 'float'>
-	frozenset -- <class 'frozenset'>
-	int -- <class 'int'>
-	list -- <class 'list'>
-	map -- <class 'map'>
-	memoryview -- <class 'memoryview'>
-	object -- <class 'object'>
-	property -- <class 'property'>
-	range -- <class 'range'>
-	reversed -- <class 'reversed'>
-	set -- <class 'set'>
-	slice -- <class 'slice'>
-	str -- <class 'str'>
-	super -- <class 'super'>
-	tuple -- <class 'tuple'>
-	type -- <class 'type'>
-	zip -- <class 'zip'>
-	classmethod -- <class 'classmethod'>
-	staticmethod -- <class 'staticmethod'>
-	Ellipsis -- Ellipsis
-	NotImplemented -- NotImplemented
-	abs -- <function>
-	all -- <function>
-	any -- <function>
-	bin -- <function>
-	callable -- <function>
-	compile -- <function>
-	chr -- <function>
-	delattr -- <function>
-	dir -- <function>
-	divmod -- <function>
-	eval -- <function>
-	exec -- <function>
-	execfile -- <function>
-	getattr -- <function>
-	setattr -- <function>
-	globals -- <function>
-	hasattr -- <function>
-	hash -- <function>
-	help -- <function>
-	hex -- <function>
-	id -- <function>
-	input -- <function>
-	isinstance -- <function>
-	issubclass -- <function>
-	iter -- <function>
-	len -- <function>
-	locals -- <function>
-	max -- <function>
-	min -- <function>
-	next -- <function>
-	oct -- <function>
-	ord -- <function>
-	pow -- <function>
-	print -- <function>
-	repr -- <function>
-	round -- <function>
-	sorted -- <function>
-	sum -- <function>
-	BaseException -- <class 'BaseException'>
-	ArithmeticError -- <class 'ArithmeticError'>
-	AssertionError -- <class 'AssertionError'>
-	AttributeError -- <class 'AttributeError'>
-	EOFError -- <class 'EOFError'>
-	Exception -- <class 'Exception'>
-	GeneratorExit -- <class 'GeneratorExit'>
-	ImportError -- <class 'ImportError'>
-	IndentationError -- <class 'IndentationError'>
-	IndexError -- <class 'IndexError'>
-	KeyboardInterrupt -- <class 'KeyboardInterrupt'>
-	SoftReset -- <class 'SoftReset'>
-	KeyError -- <class 'KeyError'>
-	LookupError -- <class 'LookupError'>
-	MemoryError -- <class 'MemoryError'>
-	NameError -- <class 'NameError'>
-	NotImplementedError -- <class 'NotImplementedError'>
-	OSError -- <class 'OSError'>
-	OverflowError -- <class 'OverflowError'>
-	RuntimeError -- <class 'RuntimeError'>
-	StopAsyncIteration -- <class 'StopAsyncIteration'>
-	StopIteration -- <class 'StopIteration'>
-	SyntaxError -- <class 'SyntaxError'>
-	SystemExit -- <class 'SystemExit'>
-	TypeError -- <class 'TypeError'>
-	ValueError -- <class 'ValueError'>
-	ViperTypeError -- <class 'ViperTypeError'>
-	ZeroDivisionError -- <class 'ZeroDivisionError'>
-	input -- <function>
-	open -- <function>
-
->>> help(wifiScan)
-object <module 'wifiScan'> is of type module
-	__name__ -- wifiScan
-	__qpy_module_deinit__ -- <function>
-	support -- <function>
-	control -- <function>
-	getState -- <function>
-	start -- <function>
-	asyncStart -- <function>
-	getConfig -- <function>
-	setConfig -- <function>
-	setCallback -- <function>
-
->>> help(wifilocator)
-object <module 'wifilocator' from 'wifilocator.py'> is of type module
-	socket -- <module 'usocket'>
-	log -- <module 'log' from 'log.py'>
-	net -- <module 'net'>
-	__name__ -- wifilocator
-	__file__ -- wifilocator.py
-	__wifiLocator -- <module '__wifiLocator'>
-	wifilocator -- <class 'wifilocator'>
-	dataCall -- <module 'dataCall' from 'dataCall.py'>
-
->>> help(misc)
-object <module 'misc'> is of type module
-	__name__ -- misc
-	Power -- <module 'misc'>
-	ADC -- <class 'ADC'>
-	PowerKey -- <class 'PowerKey'>
-	PWM -- <class 'PWM'>
-	PWM_V2 -- <class 'PWM_V2'>
-	USB -- <class 'USB'>
-	USBNET -- <module 'USBNET'>
-	replEnable -- <function>
-	replUpdatePassswd -- <function>
-	IncCoreVoltage -- <function>
-
->>> help(webserver)
-object <class 'webserver'> is of type type
-	__name__ -- webserver
-	__del__ -- <function>
-	send -- <function>
-	recv -- <function>
-	async_wait -- <function>
-	stop_session -- <function>
-
->>> help(ucollections)
-object <module 'ucollections'> is of type module
-	__name__ -- ucollections
-	deque -- <class 'deque'>
-	namedtuple -- <function>
-
-"""
+
+"""
+>>> help("modules")
+G711              cmath             net               uerrno
+SecureData        dataCall          ntptime           uhashlib
+TenCentYun        dial              osTimer           uio
+__main__          ethernet          pm                ujson
+__wifiLocator     event_message     ql_fs             umqtt
+_boot             example           qrcode            unzip
+_thread           file_crc32        quecIot           uos
+_uasyncio         file_sha256       queue             uping
+aLiYun            fota              request           urandom
+app_fota          ftplib            rsa               ure
+app_fota_download ftplibtls         sensor            uselect
+app_fota_mount    gc                sim               usocket
+app_fota_updater  gnss              slip              ussl
+atcmd             hashlib           sms               ustruct
+audio             hls               sys               usys
+audioCodec        hmac              sys_bus           utils
+backup_restore    hmacSha1          system            utime
+bak_util          log               time              uwebsocket
+base64            lvgl              tp                uzlib
+builtins          machine           uarray            webserver
+camera            math              ubinascii         wifiScan
+cellLocator       micropython       ucollections      wifilocator
+checkNet          misc              ucryptolib
+checksum          modem             uctypes
+
+>>> help(builtins)
+object <module 'builtins'> is of type module
+	__name__ -- builtins
+	__build_class__ -- <function>
+	__import__ -- <function>
+	__repl_print__ -- <function>
+	bool -- <class 'bool'>
+	bytes -- <class 'bytes'>
+	bytearray -- <class 'bytearray'>
+	complex -- <class 'complex'>
+	dict -- <class 'dict'>
+	enumerate -- <class 'enumerate'>
+	filter -- <class 'filter'>
+	float -- <class 'float'>
+	frozenset -- <class 'frozenset'>
+	int -- <class 'int'>
+	list -- <class 'list'>
+	map -- <class 'map'>
+	memoryview -- <class 'memoryview'>
+	object -- <class 'object'>
+	property -- <class 'property'>
+	range -- <class 'range'>
+	reversed -- <class 'reversed'>
+	set -- <class 'set'>
+	slice -- <class 'slice'>
+	str -- <class 'str'>
+	super -- <class 'super'>
+	tuple -- <class 'tuple'>
+	type -- <class 'type'>
+	zip -- <class 'zip'>
+	classmethod -- <class 'classmethod'>
+	staticmethod -- <class 'staticmethod'>
+	Ellipsis -- Ellipsis
+	NotImplemented -- NotImplemented
+	abs -- <function>
+	all -- <function>
+	any -- <function>
+	bin -- <function>
+	callable -- <function>
+	compile -- <function>
+	chr -- <function>
+	delattr -- <function>
+	dir -- <function>
+	divmod -- <function>
+	eval -- <function>
+	exec -- <function>
+	execfile -- <function>
+	getattr -- <function>
+	setattr -- <function>
+	globals -- <function>
+	hasattr -- <function>
+	hash -- <function>
+	help -- <function>
+	hex -- <function>
+	id -- <function>
+	input -- <function>
+	isinstance -- <function>
+	issubclass -- <function>
+	iter -- <function>
+	len -- <function>
+	locals -- <function>
+	max -- <function>
+	min -- <function>
+	next -- <function>
+	oct -- <function>
+	ord -- <function>
+	pow -- <function>
+	print -- <function>
+	repr -- <function>
+	round -- <function>
+	sorted -- <function>
+	sum -- <function>
+	BaseException -- <class 'BaseException'>
+	ArithmeticError -- <class 'ArithmeticError'>
+	AssertionError -- <class 'AssertionError'>
+	AttributeError -- <class 'AttributeError'>
+	EOFError -- <class 'EOFError'>
+	Exception -- <class 'Exception'>
+	GeneratorExit -- <class 'GeneratorExit'>
+	ImportError -- <class 'ImportError'>
+	IndentationError -- <class 'IndentationError'>
+	IndexError -- <class 'IndexError'>
+	KeyboardInterrupt -- <class 'KeyboardInterrupt'>
+	SoftReset -- <class 'SoftReset'>
+	KeyError -- <class 'KeyError'>
+	LookupError -- <class 'LookupError'>
+	MemoryError -- <class 'MemoryError'>
+	NameError -- <class 'NameError'>
+	NotImplementedError -- <class 'NotImplementedError'>
+	OSError -- <class 'OSError'>
+	OverflowError -- <class 'OverflowError'>
+	RuntimeError -- <class 'RuntimeError'>
+	StopAsyncIteration -- <class 'StopAsyncIteration'>
+	StopIteration -- <class 'StopIteration'>
+	SyntaxError -- <class 'SyntaxError'>
+	SystemExit -- <class 'SystemExit'>
+	TypeError -- <class 'TypeError'>
+	ValueError -- <class 'ValueError'>
+	ViperTypeError -- <class 'ViperTypeError'>
+	ZeroDivisionError -- <class 'ZeroDivisionError'>
+	input -- <function>
+	open -- <function>
+
+>>> help(wifiScan)
+object <module 'wifiScan'> is of type module
+	__name__ -- wifiScan
+	__qpy_module_deinit__ -- <function>
+	support -- <function>
+	control -- <function>
+	getState -- <function>
+	start -- <function>
+	asyncStart -- <function>
+	getConfig -- <function>
+	setConfig -- <function>
+	setCallback -- <function>
+
+>>> help(wifilocator)
+object <module 'wifilocator' from 'wifilocator.py'> is of type module
+	socket -- <module 'usocket'>
+	log -- <module 'log' from 'log.py'>
+	net -- <module 'net'>
+	__name__ -- wifilocator
+	__file__ -- wifilocator.py
+	__wifiLocator -- <module '__wifiLocator'>
+	wifilocator -- <class 'wifilocator'>
+	dataCall -- <module 'dataCall' from 'dataCall.py'>
+
+>>> help(misc)
+object <module 'misc'> is of type module
+	__name__ -- misc
+	Power -- <module 'misc'>
+	ADC -- <class 'ADC'>
+	PowerKey -- <class 'PowerKey'>
+	PWM -- <class 'PWM'>
+	PWM_V2 -- <class 'PWM_V2'>
+	USB -- <class 'USB'>
+	USBNET -- <module 'USBNET'>
+	replEnable -- <function>
+	replUpdatePassswd -- <function>
+	IncCoreVoltage -- <function>
+
+>>> help(webserver)
+object <class 'webserver'> is of type type
+	__name__ -- webserver
+	__del__ -- <function>
+	send -- <function>
+	recv -- <function>
+	async_wait -- <function>
+	stop_session -- <function>
+
+>>> help(ucollections)
+object <module 'ucollections'> is of type module
+	__name__ -- ucollections
+	deque -- <class 'deque'>
+	namedtuple -- <function>
+
+"""
@@ -0,0 +1,79 @@
+"""Host simulation of the QuecPython runtime.
+
+Runs the unmodified firmware from usr/ under CPython with deterministic
+virtual time: every firmware thread is a host thread, but only one runs at a
+time and the clock jumps to the next timer when all of them are blocked.
+
+	from sim import World, install, uninstall, run_tracker
+
+	world = World(seed=1)
+	install(world)
+	report = run_tracker(world, hours=24)
+	uninstall()
+
+install() puts the stub modules into sys.modules (_thread and gc are
+replaced there as well, names the stubs lack fall through to the host
+modules) and maps the firmware flash directory /usr to world.fs_root.
+"""
+import builtins
+import os
+import sys
+
+from sim.kernel import Kernel, SimExit
+from sim.world import World
+from sim import stubs
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_saved = None
+
+
+def install(world):
+	"""Inject stub modules bound to world and redirect /usr file access"""
+	global _saved
+	if _saved is not None:
+		uninstall()
+	modules = stubs.build(world)
+	host_open = builtins.open
+
+	def sim_open(file, *args, **kwargs):
+		if isinstance(file, str) and os.path.dirname(file) == '/usr':
+			file = world.map_path(file)
+		return host_open(file, *args, **kwargs)
+
+	_saved = {'modules': dict((name, sys.modules.get(name)) for name in modules), 'open': host_open}
+	sys.modules.update(modules)
+	builtins.open = sim_open
+	if ROOT not in sys.path:
+		sys.path.insert(0, ROOT)
+	# Firmware modules bind stubs at import time, force a fresh import per world
+	for name in list(sys.modules):
+		if name == 'usr' or name.startswith('usr.'):
+			del sys.modules[name]
+	return world
+
+
+def uninstall():
+	"""Restore host modules and open()"""
+	global _saved
+	if _saved is None:
+		return
+	for name, module in _saved['modules'].items():
+		if module is None:
+			sys.modules.pop(name, None)
+		else:
+			sys.modules[name] = module
+	builtins.open = _saved['open']
+	_saved = None
+
+
+def run_tracker(world, hours=1.0):
+	"""Boot GPSTracker in the simulated device and run it for virtual hours"""
+	def boot():
+		from usr.main import GPSTracker
+		world.tracker = GPSTracker()
+
+	world.kernel.spawn(boot, name='main')
+	world.kernel.run_for(hours * 3600)
+	return world.report()
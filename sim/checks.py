@@ -0,0 +1,307 @@
+"""Pass/fail checks of a simulated run (python -m sim.run --check)
+
+Scenarios name their checks in world.checks. A Probe installed after sim.install() and
+before run_tracker() wraps firmware and stub functions to record what the device did
+(sampled fixes, events, retry windows, connection attempts, power tiers, buffer saves);
+the checks compare that with what the servers received.
+"""
+import calendar
+import sys
+
+
+# Sampled fixes newer than this at the end of the run may still be in flight in the uplink worker
+IN_FLIGHT_S = 120
+
+
+class Probe:
+	"""Device-side records for the checks, bound to the firmware modules of one install()"""
+
+	def __init__(self, world):
+		self.world = world
+		# Sampled (non-event) fix timestamps in submit order
+		self.sampled = []
+		# (ms, event) submitted events
+		self.events = []
+		# (start ms, end ms, class, delay s, consecutive failures) link retry windows
+		self.windows = []
+		# ms of link success (window closed)
+		self.successes = []
+		# ms of forced attempts inside a window (events, replies)
+		self.forced = []
+		# host: [(start ms, end ms, class, delay s, consecutive failures)] endpoint retry windows
+		self.endpoint_windows = {}
+		# host: [ms] endpoint successes
+		self.endpoint_successes = {}
+		# host: [ms] connection attempts (DNS lookups)
+		self.attempts = {}
+		# (ms, tier name) power policy tier changes
+		self.tiers = []
+		# (ms, records) offline buffer saves to flash
+		self.saves = []
+		# Timestamps of sampled fixes still in the uplink queue or buffer at the end
+		self.pending = []
+		self.end_time = None
+		self.protocol = None
+		self.policy = None
+		# Retry and power tier tables of the firmware under test
+		self.backoff = None
+		self.power_tiers = None
+		self._install()
+
+	def _now(self):
+		return self.world.kernel.now_ms
+
+	def _install(self):
+		from usr import connection, data_buffer, failover, power_policy, uplink
+		from usr.location import LocationFix
+		probe = self
+		self.backoff = connection.BACKOFF
+		self.power_tiers = power_policy.POWER_TIERS
+
+		submit = uplink.UplinkWorker.submit
+
+		def probe_submit(worker, data):
+			if isinstance(data, LocationFix):
+				if data.event:
+					probe.events.append((probe._now(), data.event))
+				else:
+					probe.sampled.append(data.timestamp)
+			return submit(worker, data)
+		uplink.UplinkWorker.submit = probe_submit
+
+		prepare = connection.ConnectionManager.prepare
+
+		def probe_prepare(manager, force=False):
+			if force and manager.pdp_up and not manager.ready():
+				probe.forced.append(probe._now())
+			return prepare(manager, force)
+		connection.ConnectionManager.prepare = probe_prepare
+
+		link_failure = connection.ConnectionManager.failure
+
+		def probe_link_failure(manager, kind):
+			link_failure(manager, kind)
+			now = probe._now()
+			probe.windows.append((now, now + manager.delay * 1000, manager.last_class, manager.delay, manager.failures))
+		connection.ConnectionManager.failure = probe_link_failure
+
+		link_success = connection.ConnectionManager.success
+
+		def probe_link_success(manager):
+			probe.successes.append(probe._now())
+			link_success(manager)
+		connection.ConnectionManager.success = probe_link_success
+
+		endpoint_failure = failover.Endpoint.failure
+
+		def probe_endpoint_failure(endpoint, kind):
+			delay = endpoint_failure(endpoint, kind)
+			now = probe._now()
+			windows = probe.endpoint_windows.setdefault(endpoint.protocol.host, [])
+			windows.append((now, now + delay * 1000, kind, delay, endpoint.failures))
+			return delay
+		failover.Endpoint.failure = probe_endpoint_failure
+
+		endpoint_success = failover.Endpoint.success
+
+		def probe_endpoint_success(endpoint, latency):
+			probe.endpoint_successes.setdefault(endpoint.protocol.host, []).append(probe._now())
+			endpoint_success(endpoint, latency)
+		failover.Endpoint.success = probe_endpoint_success
+
+		evaluate = power_policy.PowerPolicy.evaluate
+
+		def probe_evaluate(policy):
+			tier = evaluate(policy)
+			if tier:
+				probe.tiers.append((probe._now(), tier['name']))
+			return tier
+		power_policy.PowerPolicy.evaluate = probe_evaluate
+
+		save_to_flash = data_buffer.DataBuffer.save_to_flash
+
+		def probe_save_to_flash(buffer):
+			saved = save_to_flash(buffer)
+			if saved:
+				probe.saves.append((probe._now(), len(buffer.buffer)))
+			return saved
+		data_buffer.DataBuffer.save_to_flash = probe_save_to_flash
+
+		usocket = sys.modules['usocket']
+		getaddrinfo = usocket.getaddrinfo
+
+		def probe_getaddrinfo(host, port, *args):
+			probe.attempts.setdefault(host, []).append(probe._now())
+			return getaddrinfo(host, port, *args)
+		usocket.getaddrinfo = probe_getaddrinfo
+
+	def finish(self):
+		"""Collect end-of-run state, call after run_tracker() and before uninstall()"""
+		tracker = self.world.tracker
+		self.end_time = self.world.time()
+		if tracker is None:
+			return
+		self.protocol = tracker.protocol
+		self.policy = tracker.policy
+		records = [data for _, data in tracker.uplink.queue.items] + list(tracker.data_buffer.buffer)
+		self.pending = [record.get('timestamp') for record in records if record.get('latitude') is not None and not record.get('event')]
+
+
+def _gt06_time(payload):
+	"""Seconds of a GT06 YY MM DD hh mm ss field"""
+	return calendar.timegm((2000 + payload[0], payload[1], payload[2], payload[3], payload[4], payload[5], 0, 0, 0))
+
+
+def _delivered(server):
+	"""Timestamps of location records received by server"""
+	times = []
+	for _, key, payload in server.received:
+		if key in ('0x12', '0x6A', '0x6B'):
+			times.append(_gt06_time(payload[:6]))
+		elif key == '0x69':
+			times.append(_gt06_time(payload[-6:]))
+		elif key == 'http_location' and not payload.get('event'):
+			times.append(payload['timestamp'])
+	return times
+
+
+def _events(server):
+	"""Event names received by server"""
+	alarms = {0x0E: 'low_battery', 0x0F: 'shutdown'}
+	events = []
+	for _, key, payload in server.received:
+		if key == '0x13' and payload[3] in alarms:
+			events.append(alarms[payload[3]])
+		elif key == 'http_location' and payload.get('event'):
+			events.append(payload['event'])
+	return events
+
+
+def delivered_once(world, probe):
+	"""Every sampled fix reached exactly one server once, or is still queued or buffered at the end (not both)"""
+	received = {}
+	for server in world.servers.values():
+		for timestamp in _delivered(server):
+			received[timestamp] = received.get(timestamp, 0) + 1
+	sampled = set(probe.sampled)
+	pending = set(probe.pending)
+	duplicated = sorted(t for t, count in received.items() if count > 1)
+	unknown = sorted(t for t in received if t not in sampled)
+	lost = sorted(t for t in sampled if t not in received and t not in pending and t < probe.end_time - IN_FLIGHT_S)
+	# Delivered but still buffered: sent again after the next boot
+	kept = sorted(t for t in pending if t in received)
+	detail = '{} sampled, {} delivered, {} pending, {} duplicated, {} unknown, {} lost, {} delivered and kept'.format(
+		len(sampled), len(received), len(pending), len(duplicated), len(unknown), len(lost), len(kept))
+	if duplicated or unknown or lost or kept:
+		detail += ', first: {}'.format((duplicated + unknown + lost + kept)[0])
+	return not (duplicated or unknown or lost or kept or len(probe.sampled) != len(sampled)), detail
+
+
+def _inside(start, end, closed, times):
+	"""Times strictly inside (start, end) that come before the first of closed after start"""
+	for close in closed:
+		if start < close < end:
+			end = close
+	return [t for t in times if start < t < end]
+
+
+def backoff(world, probe):
+	"""Retry windows follow the BACKOFF table per failure class, and no connection is attempted inside one
+	except forced (event, reply) attempts through the link window"""
+	errors = []
+	attempts = sorted(t for times in probe.attempts.values() for t in times)
+	link_closed = sorted([start for start, _, _, _, _ in probe.windows] + probe.successes)
+	for start, end, kind, delay, failures in probe.windows:
+		base, maximum = probe.backoff[kind]
+		limit = min(base << min(failures - 1, 16), maximum)
+		if not limit // 2 <= delay <= limit:
+			errors.append('link {} #{} delay {}s outside {}..{}s'.format(kind, failures, delay, limit // 2, limit))
+		forced = [t for t in probe.forced if start <= t < end]
+		early = [t for t in _inside(start, end, link_closed, attempts) if not any(f <= t for f in forced)]
+		if early:
+			errors.append('attempt {} ms into {} window at {} ms'.format(early[0] - start, kind, start))
+	endpoint_count = 0
+	for host, windows in probe.endpoint_windows.items():
+		closed = sorted([start for start, _, _, _, _ in windows] + probe.endpoint_successes.get(host, []))
+		for start, end, kind, delay, failures in windows:
+			endpoint_count += 1
+			base, maximum = probe.backoff[kind]
+			if delay != min(base << min(failures - 1, 16), maximum):
+				errors.append('{} {} #{} delay {}s'.format(host, kind, failures, delay))
+			early = _inside(start, end, closed, probe.attempts.get(host, []))
+			if early:
+				errors.append('attempt {} ms into {} {} window at {} ms'.format(early[0] - start, host, kind, start))
+	classes = sorted(set(kind for _, _, kind, _, _ in probe.windows))
+	detail = '{} link windows ({}), {} endpoint windows, {} forced attempts'.format(
+		len(probe.windows), ', '.join(classes), endpoint_count, len(probe.forced))
+	if errors:
+		detail += '; {} errors, first: {}'.format(len(errors), errors[0])
+	return bool(probe.windows or endpoint_count) and not errors, detail
+
+
+def failback(world, probe):
+	"""A backup server took records and the primary is active again at the end"""
+	protocol = probe.protocol
+	endpoints = getattr(protocol, 'endpoints', None)
+	if not endpoints:
+		return False, 'no failover protocol'
+	backup = sum(len(_delivered(world.servers[host])) for host in world.backups)
+	active = protocol.active is endpoints[0]
+	return backup > 0 and active, 'active {}, {} records via backups'.format(protocol.active.name, backup)
+
+
+def events_duplicated(world, probe):
+	"""Every low battery event reached each server (duplicate_events)"""
+	submitted = [event for _, event in probe.events if event == 'low_battery']
+	counts = dict((host, _events(server).count('low_battery')) for host, server in world.servers.items())
+	detail = '{} submitted, received {}'.format(len(submitted), ', '.join('{}: {}'.format(host, count) for host, count in sorted(counts.items())))
+	return bool(submitted) and all(count >= len(submitted) for count in counts.values()), detail
+
+
+def power_tiers(world, probe):
+	"""Discharge walks the power tiers down one way (no flapping) to shutdown: a low battery event per tier
+	that asks for one reaches the server, the shutdown event is delivered and the buffer saved before power off"""
+	names = [tier['name'] for tier in probe.power_tiers]
+	changes = [name for _, name in probe.tiers]
+	order = [names.index(name) for name in changes]
+	errors = []
+	if order != sorted(set(order)):
+		errors.append('tiers not monotonic')
+	if not changes or changes[-1] != names[-1]:
+		errors.append('no shutdown tier')
+	if probe.policy is None or probe.policy.transitions != len(changes):
+		errors.append('policy.transitions {}'.format(probe.policy and probe.policy.transitions))
+	expected = sum(1 for name in changes if probe.power_tiers[names.index(name)].get('event'))
+	submitted = [ms for ms, event in probe.events if event == 'low_battery']
+	received = sum(_events(server).count('low_battery') for server in world.servers.values())
+	if len(submitted) != expected or received < expected:
+		errors.append('low_battery events: {} expected, {} submitted, {} received'.format(expected, len(submitted), received))
+	shutdown = [ms for ms, event in probe.events if event == 'shutdown']
+	delivered = [ms for server in world.servers.values() for ms, key, payload in server.received
+	             if (key == '0x13' and payload[3] == 0x0F) or (key == 'http_location' and payload.get('event') == 'shutdown')]
+	off = world.powered_off
+	if not off or off[1] != 'down':
+		errors.append('not powered down')
+	elif not shutdown or not delivered or not shutdown[0] <= delivered[0] <= off[0]:
+		errors.append('shutdown event not delivered before power off')
+	elif not [ms for ms, _ in probe.saves if shutdown[0] <= ms <= off[0]]:
+		errors.append('buffer not saved before power off')
+	detail = '{} ({} transitions), {} low battery events, powered off at {}s'.format(
+		' -> '.join([names[0]] + changes), len(changes), len(submitted), off[0] // 1000 if off else None)
+	if errors:
+		detail += '; ' + ', '.join(errors)
+	return not errors, detail
+
+
+CHECKS = {
+	'delivered_once': delivered_once,
+	'backoff': backoff,
+	'failback': failback,
+	'events_duplicated': events_duplicated,
+	'power_tiers': power_tiers
+}
+
+
+def run_checks(world, probe):
+	"""Run the scenario's checks, return [(name, passed, detail)]"""
+	return [(name,) + CHECKS[name](world, probe) for name in world.checks]
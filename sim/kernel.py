@@ -0,0 +1,222 @@
+import heapq
+import threading
+import traceback
+from collections import deque
+
+
+class SimExit(BaseException):
+	"""Raised in simulated threads to unwind them when the simulation stops"""
+	pass
+
+
+class SimThread:
+	"""Firmware thread backed by a host thread that only runs while holding the kernel baton"""
+
+	def __init__(self, kernel, func, args, name):
+		self.kernel = kernel
+		self.func = func
+		self.args = args
+		self.name = name
+		self.ident = kernel.next_ident()
+		self.done = False
+		self.go = threading.Event()
+		self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+	def _run(self):
+		"""Host thread body"""
+		self.go.wait()
+		self.go.clear()
+		try:
+			if not self.kernel.stopping:
+				self.func(*self.args)
+		except SimExit:
+			pass
+		except Exception:
+			print('Unhandled exception in thread {}:'.format(self.name))
+			traceback.print_exc()
+		finally:
+			self.done = True
+			self.kernel.switch.set()
+
+
+class SimLock:
+	"""_thread lock with FIFO hand-over, released lock goes straight to the first waiter"""
+
+	def __init__(self, kernel):
+		self.kernel = kernel
+		self._locked = False
+		self.waiters = deque()
+
+	def acquire(self, waitflag=1, timeout=-1):
+		"""Acquire lock, blocking in virtual time"""
+		if not self._locked:
+			self._locked = True
+			return True
+		if not waitflag:
+			return False
+		thread = self.kernel.current
+		if thread is None:
+			raise RuntimeError('blocking acquire outside of simulated thread')
+		self.waiters.append(thread)
+		self.kernel.block()
+		return True
+
+	def release(self):
+		"""Release lock, may be called from any thread or callback"""
+		if not self._locked:
+			raise RuntimeError('release unlocked lock')
+		if self.waiters:
+			self.kernel.ready(self.waiters.popleft())
+		else:
+			self._locked = False
+
+	def locked(self):
+		"""Check if lock is held"""
+		return self._locked
+
+	def __enter__(self):
+		self.acquire()
+		return self
+
+	def __exit__(self, *args):
+		self.release()
+
+
+class Kernel:
+	"""Deterministic scheduler: one simulated thread runs at a time and the
+	virtual clock jumps to the next timer when every thread is blocked"""
+
+	def __init__(self):
+		self.now_ms = 0
+		self.timers = []
+		self.timer_seq = 0
+		self.run_queue = deque()
+		self.current = None
+		self.switch = threading.Event()
+		self.threads = []
+		self.stopping = False
+		self.switches = 0
+		self._ident = 0
+		self._irq_queue = deque()
+		self._irq_thread = None
+		self._irq_idle = False
+
+	def next_ident(self):
+		"""Allocate thread identifier"""
+		self._ident += 1
+		return self._ident
+
+	def spawn(self, func, args=(), name=None):
+		"""Create simulated thread, it starts when the scheduler picks it"""
+		thread = SimThread(self, func, args, name or getattr(func, '__name__', 'thread'))
+		self.threads.append(thread)
+		thread.thread.start()
+		self.run_queue.append(thread)
+		return thread
+
+	def call_later(self, ms, callback, *args):
+		"""Run callback in scheduler context after ms of virtual time, returns cancellable handle"""
+		self.timer_seq += 1
+		entry = [self.now_ms + max(0, int(ms)), self.timer_seq, callback, args, True]
+		heapq.heappush(self.timers, entry)
+		return entry
+
+	def cancel(self, entry):
+		"""Cancel timer returned by call_later"""
+		if entry:
+			entry[4] = False
+
+	def irq(self, callback, *args):
+		"""Run firmware callback in the callback thread, as the modem firmware does"""
+		self._irq_queue.append((callback, args))
+		if self._irq_thread is None:
+			self._irq_thread = self.spawn(self._irq_loop, name='callback')
+		elif self._irq_idle:
+			self._irq_idle = False
+			self.ready(self._irq_thread)
+
+	def _irq_loop(self):
+		"""Callback thread body"""
+		while True:
+			if not self._irq_queue:
+				self._irq_idle = True
+				self.block()
+				continue
+			callback, args = self._irq_queue.popleft()
+			try:
+				callback(*args)
+			except SimExit:
+				raise
+			except Exception:
+				print('Callback error:')
+				traceback.print_exc()
+
+	def ready(self, thread):
+		"""Make blocked thread runnable"""
+		if thread not in self.run_queue:
+			self.run_queue.append(thread)
+
+	def block(self):
+		"""Give up the baton until another thread or timer makes current thread ready"""
+		thread = self.current
+		if thread is None:
+			raise RuntimeError('blocking call outside of simulated thread')
+		self.switch.set()
+		thread.go.wait()
+		thread.go.clear()
+		if self.stopping:
+			raise SimExit()
+
+	def sleep_ms(self, ms):
+		"""Block current thread for ms of virtual time"""
+		thread = self.current
+		if thread is None:
+			raise RuntimeError('sleep outside of simulated thread')
+		if ms <= 0:
+			self.run_queue.append(thread)
+		else:
+			self.call_later(ms, self.ready, thread)
+		self.block()
+
+	def run(self, until_ms=None):
+		"""Run until virtual time until_ms, all threads finished or stop() was called"""
+		while not self.stopping:
+			if self.run_queue:
+				thread = self.run_queue.popleft()
+				if thread.done:
+					continue
+				self.current = thread
+				self.switch.clear()
+				thread.go.set()
+				self.switch.wait()
+				self.current = None
+				self.switches += 1
+				continue
+			while self.timers and not self.timers[0][4]:
+				heapq.heappop(self.timers)
+			if not self.timers:
+				break
+			if until_ms is not None and self.timers[0][0] > until_ms:
+				break
+			entry = heapq.heappop(self.timers)
+			self.now_ms = max(self.now_ms, entry[0])
+			entry[2](*entry[3])
+		if until_ms is not None and not self.stopping:
+			self.now_ms = max(self.now_ms, until_ms)
+		return self.now_ms
+
+	def run_for(self, seconds):
+		"""Advance simulation by seconds of virtual time"""
+		return self.run(self.now_ms + int(seconds * 1000))
+
+	def stop(self):
+		"""Stop scheduling (device powered down)"""
+		self.stopping = True
+
+	def shutdown(self):
+		"""Stop and unwind all host threads"""
+		self.stopping = True
+		for thread in self.threads:
+			if not thread.done:
+				thread.go.set()
+				thread.thread.join(1)
@@ -0,0 +1,103 @@
+"""Run GPSTracker in the simulator: python -m sim.run --scenario commute --hours 24"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+from sim import World, install, uninstall, run_tracker, stubs
+from sim.checks import Probe, run_checks
+from sim.scenarios import SCENARIOS, recorded
+from sim.world import SERVER_HOST
+
+
+class TimestampWriter:
+	"""Prefix firmware output lines with virtual time"""
+
+	def __init__(self, stream, kernel):
+		self.stream = stream
+		self.kernel = kernel
+		self.line_start = True
+
+	def write(self, text):
+		for line in text.splitlines(True):
+			if self.line_start:
+				self.stream.write('[{:10.3f}] '.format(self.kernel.now_ms / 1000.0))
+			self.stream.write(line)
+			self.line_start = line.endswith('\n')
+		return len(text)
+
+	def flush(self):
+		self.stream.flush()
+
+
+def write_config(world, server='GT06', **overrides):
+	"""Write firmware config to the simulated flash: server (backups for the scenario's backup servers),
+	motion wake pin, WiFi location, then scenario config and overrides; call after the scenario set up the world"""
+	port = 5023 if server == 'GT06' else 80
+	config = {'server': {'protocol': server, 'host': SERVER_HOST, 'port': port, 'path': '/api/location'},
+	          'motion_pin': 12, 'wifi_location_enabled': True}
+	if world.backups:
+		config['servers'] = [{'protocol': server, 'host': host, 'port': port, 'path': '/api/location'} for host in world.backups]
+	config.update(world.config)
+	config.update(overrides)
+	with open(os.path.join(world.fs_root, 'tracker_config.json'), 'w') as f:
+		json.dump(config, f)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Run tracker firmware on the host with virtual time')
+	parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='commute')
+	parser.add_argument('--day', help='replay recorded day JSON instead of a scenario (see sim.scenarios.recorded)')
+	parser.add_argument('--hours', type=float, default=24.0)
+	parser.add_argument('--seed', type=int, default=1)
+	parser.add_argument('--server', default='GT06', choices=['GT06', 'HTTP'])
+	parser.add_argument('--log', help='write firmware output to file instead of stdout')
+	parser.add_argument('--quiet', action='store_true', help='discard firmware output')
+	parser.add_argument('--console', default='INFO', help='firmware console log level (DEBUG, INFO, WARN, ERROR)')
+	parser.add_argument('--trace-memory', action='store_true', help='report host allocations (tracemalloc) as firmware heap')
+	parser.add_argument('--check', action='store_true', help="run the scenario's checks (sim.checks), exit status 1 if one fails")
+	args = parser.parse_args(argv)
+
+	world = World(seed=args.seed)
+	(recorded(args.day) if args.day else SCENARIOS[args.scenario])(world)
+	write_config(world, args.server, log_console=args.console)
+	install(world)
+	if args.trace_memory:
+		stubs.trace_memory()
+	probe = Probe(world) if args.check else None
+	started = time.time()
+	if args.quiet:
+		target = open(os.devnull, 'w')
+	elif args.log:
+		target = open(args.log, 'w')
+	else:
+		target = sys.stdout
+	try:
+		with contextlib.redirect_stdout(TimestampWriter(target, world.kernel)):
+			report = run_tracker(world, args.hours)
+		if probe:
+			probe.finish()
+	finally:
+		uninstall()
+		world.close()
+		if target is not sys.stdout:
+			target.close()
+	report['wall_s'] = round(time.time() - started, 2)
+	report['speedup'] = int(report['virtual_s'] / max(report['wall_s'], 0.001))
+	print(json.dumps(report, indent=2, sort_keys=True))
+	if not probe:
+		return 0
+	if not world.checks:
+		print('No checks for this scenario')
+		return 0
+	failed = 0
+	for name, passed, detail in run_checks(world, probe):
+		print('{} {}: {}'.format('PASS' if passed else 'FAIL', name, detail))
+		failed += not passed
+	return 1 if failed else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,130 @@
+"""Scripted device days for the simulator: each function configures a World"""
+import json
+
+
+def parked(world):
+	"""Vehicle parked all day: tracker should spend most of the time asleep"""
+	world.gnss.motion = []
+
+
+def commute(world):
+	"""Two 40 minute drives with a tunnel and a parked day in between"""
+	world.gnss.motion = [(8 * 3600, 8 * 3600 + 2400, 45.0, 30.0), (18 * 3600, 18 * 3600 + 2400, 40.0, 210.0)]
+	world.gnss.outages = [(8 * 3600 + 900, 8 * 3600 + 1080)]
+	for start, end, speed, course in world.gnss.motion:
+		world.trigger_motion(at=start + 5)
+
+
+def flaky_network(world):
+	"""Commute with packet loss, slow links and a DNS outage window"""
+	commute(world)
+	world.network.set_faults(drop=0.1, latency_ms=800)
+	world.at(12 * 3600, lambda: world.network.set_faults(dns_fail=1.0))
+	world.at(14 * 3600, lambda: world.network.set_faults(dns_fail=0.0))
+	world.at(13 * 3600, world.network.set_pdp, False)
+
+
+def server_outage(world):
+	"""Commute with one failure of each class: server refusing, connect timeouts, rejected login,
+	PDP loss with failing reactivation, and a DNS outage while parked"""
+	commute(world)
+	world.checks = ['delivered_once', 'backoff']
+	network = world.network
+	drive = 8 * 3600
+	world.at(drive + 600, lambda: network.set_faults(refuse=1.0))
+	world.at(drive + 600, world.server.drop_connections)
+	world.at(drive + 1800, lambda: network.set_faults(refuse=0.0))
+	world.at(12 * 3600, lambda: network.set_faults(dns_fail=1.0))
+	world.at(14 * 3600, lambda: network.set_faults(dns_fail=0.0))
+	drive = 18 * 3600
+	world.at(drive + 300, lambda: network.set_faults(connect_timeout=1.0))
+	world.at(drive + 300, world.server.drop_connections)
+	world.at(drive + 900, lambda: network.set_faults(connect_timeout=0.0))
+	world.at(drive + 1200, setattr, world.server, 'accept_login', False)
+	world.at(drive + 1200, world.server.drop_connections)
+	world.at(drive + 1200, setattr, world.server, 'http_status', '403 Forbidden')
+	world.at(drive + 1800, setattr, world.server, 'accept_login', True)
+	world.at(drive + 1800, setattr, world.server, 'http_status', '200 OK')
+	world.at(drive + 1900, lambda: network.set_faults(pdp_fail=1.0))
+	world.at(drive + 1900, network.set_pdp, False)
+	world.at(drive + 2300, lambda: network.set_faults(pdp_fail=0.0))
+
+
+def failover(world):
+	"""Commute with a backup server: the primary is unreachable during the first drive and slow during the
+	second; the battery starts near the saver tier so the low battery event is delivered to both servers"""
+	commute(world)
+	world.checks = ['delivered_once', 'backoff', 'failback', 'events_duplicated']
+	world.add_server('backup.example.com')
+	world.config['duplicate_events'] = True
+	world.battery.charge_mah = world.battery.capacity_mah * 0.3
+	primary = world.server
+	drive = 8 * 3600
+	world.at(drive + 300, primary.set_outage, 'timeout')
+	world.at(drive + 1800, primary.set_outage, None)
+	drive = 18 * 3600
+	world.at(drive - 600, setattr, primary, 'latency_ms', 4000)
+	world.at(drive + 2400, setattr, primary, 'latency_ms', 0)
+
+
+def reconfigure(world):
+	"""Operator moves the tracker to a new server by SMS during the first drive and changes the APN during
+	the second; every record must reach exactly one of the servers"""
+	commute(world)
+	world.checks = ['delivered_once']
+	world.add_server('new.example.com', backup=False)
+
+	def move():
+		server = world.tracker.config.get('server')
+		world.sms.deliver('+10000000001', 'SERVER,{},new.example.com:{}'.format(server['protocol'], server['port']))
+
+	world.at(8 * 3600 + 600, move)
+	world.sms.deliver('+10000000001', 'APN,internet.example', at=18 * 3600 + 600)
+
+
+def remote_config(world):
+	"""Server reconfigures the tracker in-band and an operator asks for status by SMS"""
+	commute(world)
+	world.at(600, world.server.queue_command, 'INTERVAL,30')
+	world.sms.deliver('+10000000001', 'STATUS,PWR|NET', at=900)
+
+
+def discharge(world):
+	"""Commute on a nearly empty small battery: the power policy steps through every tier down to a clean
+	shutdown within the day"""
+	commute(world)
+	world.checks = ['power_tiers', 'delivered_once']
+	world.battery.capacity_mah = 200
+	world.battery.charge_mah = 200 * 0.4
+
+
+def recorded(path):
+	"""Scenario replaying a recorded day from JSON: motion [[start, end, km/h, course]], outages [[start, end]],
+	charging [[start, end]], sms [[at, phone, text]] and battery voltage [[at, mV]], times in seconds from
+	midnight; checks lists the sim.checks checks the day expects to pass"""
+	with open(path) as f:
+		day = json.load(f)
+
+	def replay(world):
+		world.gnss.motion = [tuple(segment) for segment in day.get('motion', [])]
+		world.gnss.outages = [tuple(outage) for outage in day.get('outages', [])]
+		world.battery.charging = [tuple(window) for window in day.get('charging', [])]
+		world.battery.trace = [tuple(sample) for sample in day.get('voltage', [])]
+		world.checks = list(day.get('checks', []))
+		for start, end, speed, course in world.gnss.motion:
+			world.trigger_motion(at=start + 5)
+		for at, phone, text in day.get('sms', []):
+			world.sms.deliver(phone, text, at=at)
+	return replay
+
+
+SCENARIOS = {
+	'parked': parked,
+	'commute': commute,
+	'discharge': discharge,
+	'flaky_network': flaky_network,
+	'server_outage': server_outage,
+	'failover': failover,
+	'reconfigure': reconfigure,
+	'remote_config': remote_config
+}
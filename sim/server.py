@@ -0,0 +1,174 @@
+import json
+import struct
+
+
+def crc16(data):
+	"""CRC16-IBM as used by GT06"""
+	crc = 0xFFFF
+	for byte in data:
+		crc ^= byte
+		for _ in range(8):
+			if crc & 0x0001:
+				crc = (crc >> 1) ^ 0xA001
+			else:
+				crc >>= 1
+	return crc
+
+
+def gt06_frame(protocol, payload, serial):
+	"""Build GT06 frame"""
+	body = bytes([len(payload) + 5, protocol]) + payload + struct.pack('>H', serial)
+	return b'\x78\x78' + body + struct.pack('>H', crc16(body)) + b'\r\n'
+
+
+class Connection:
+	"""Server side of one TCP connection, feed() returns bytes to send back"""
+
+	def __init__(self, server, host, port):
+		self.server = server
+		self.host = host
+		self.port = port
+		self.buffer = b''
+		self.closed = False
+
+	def feed(self, data):
+		"""Process bytes from device"""
+		self.buffer += data
+		if self.buffer.startswith(b'\x78\x78'):
+			return self._gt06()
+		return self._http()
+
+	def _gt06(self):
+		"""Parse complete GT06 frames, acknowledge each"""
+		response = b''
+		while len(self.buffer) >= 5 and self.buffer.startswith(b'\x78\x78'):
+			end = 3 + self.buffer[2] + 2
+			if len(self.buffer) < end:
+				break
+			frame = self.buffer[:end]
+			self.buffer = self.buffer[end:]
+			body = frame[2:-4]
+			if crc16(body) != struct.unpack('>H', frame[-4:-2])[0]:
+				self.server.record('crc_error', frame)
+				continue
+			protocol = body[1]
+			serial = struct.unpack('>H', body[-2:])[0]
+			if protocol == 0x01 and not self.server.accept_login:
+				# Rejected login: no acknowledgement, connection closed
+				self.server.record('login_rejected', body[2:-2])
+				self.closed = True
+				break
+			self.server.record(protocol, body[2:-2])
+			if self.server.ack:
+				response += gt06_frame(protocol, b'', serial)
+			response += self.server.pop_gt06_command()
+		return response
+
+	def _http(self):
+		"""Parse HTTP request once headers and Content-Length body arrived"""
+		if b'\r\n\r\n' not in self.buffer:
+			return b''
+		head, body = self.buffer.split(b'\r\n\r\n', 1)
+		length = 0
+		for line in head.split(b'\r\n'):
+			if line.lower().startswith(b'content-length:'):
+				length = int(line[15:].strip())
+		if len(body) < length:
+			return b''
+		self.buffer = b''
+		try:
+			document = json.loads(body[:length])
+		except ValueError:
+			document = None
+		status = self.server.http_status
+		if not status.startswith('2'):
+			# Rejected request: the device keeps the records and sends them again
+			self.server.record('http_rejected', document)
+			self.closed = True
+			return 'HTTP/1.1 {}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'.format(status).encode()
+		if isinstance(document, dict) and isinstance(document.get('records'), list):
+			# Burst: one POST carrying several records
+			for record in document['records']:
+				self.server.record(self._kind(record), record)
+		else:
+			self.server.record(self._kind(document), document)
+		reply = self.server.pop_http_command()
+		self.closed = True
+		return 'HTTP/1.1 {}\r\nContent-Length: {}\r\nConnection: close\r\n\r\n'.format(status, len(reply)).encode() + reply
+
+	def _kind(self, document):
+		"""Packet kind of HTTP JSON document"""
+		if not isinstance(document, dict):
+			return 'http'
+		for key in ('reply', 'status', 'metrics', 'memory', 'log'):
+			if key in document:
+				return 'http_' + key
+		return 'http_location'
+
+
+class SimServer:
+	"""Tracking server accepting GT06 and HTTP, with queued remote commands"""
+
+	def __init__(self, world):
+		self.world = world
+		self.ack = True
+		self.accept_login = True
+		# None, 'refuse' or 'timeout' while the server is unreachable; extra delay of connect and responses
+		self.outage = None
+		self.latency_ms = 0
+		self.http_status = '200 OK'
+		self.received = []
+		self.counts = {}
+		self.gt06_commands = []
+		self.http_commands = []
+		self.command_flag = 1
+		self.connections = []
+
+	def connect(self, host, port):
+		"""Accept TCP connection"""
+		connection = Connection(self, host, port)
+		self.connections = [c for c in self.connections if not c.closed] + [connection]
+		return connection
+
+	def drop_connections(self):
+		"""Close all open connections (server restart), the device sees a reset on the next send"""
+		for connection in self.connections:
+			connection.closed = True
+		self.connections = []
+
+	def set_outage(self, outage):
+		"""Make server unreachable ('refuse' or 'timeout', dropping open connections) or reachable again (None)"""
+		self.outage = outage
+		if outage:
+			self.drop_connections()
+
+	def record(self, kind, payload):
+		"""Store received packet"""
+		key = '0x{:02X}'.format(kind) if isinstance(kind, int) else kind
+		self.counts[key] = self.counts.get(key, 0) + 1
+		self.received.append((self.world.kernel.now_ms, key, payload))
+
+	def queue_command(self, text):
+		"""Send configuration command with the next response (GT06 0x80 / HTTP directive)"""
+		self.gt06_commands.append(text)
+		self.http_commands.append(text)
+
+	def pop_gt06_command(self):
+		"""Next 0x80 server command frame or b''"""
+		if not self.gt06_commands:
+			return b''
+		text = self.gt06_commands.pop(0)
+		self.http_commands.remove(text)
+		command = text.encode()
+		payload = bytes([4 + len(command)]) + struct.pack('>I', self.command_flag) + command + b'\x00\x02'
+		self.command_flag += 1
+		return gt06_frame(0x80, payload, 0)
+
+	def pop_http_command(self):
+		"""Next directive body or b''"""
+		if not self.http_commands:
+			return b''
+		text = self.http_commands.pop(0)
+		self.gt06_commands.remove(text)
+		self.command_flag += 1
+		return json.dumps({'id': self.command_flag - 1, 'command': text}).encode()
@@ -0,0 +1,681 @@
+import _thread as host_thread
+import array
+import binascii
+import calendar
+import errno
+import gc as host_gc
+import json
+import os
+import struct
+import time
+import tracemalloc
+import types
+
+from sim.kernel import SimLock, SimExit
+
+
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+# Bound by build()
+world = None
+
+
+def _module(name, **attrs):
+	"""Create module object with attributes"""
+	module = types.ModuleType(name)
+	module.__dict__.update(attrs)
+	return module
+
+
+def _fallback(host):
+	"""Module __getattr__ forwarding names the stub does not define to the host module"""
+	def __getattr__(name):
+		return getattr(host, name)
+	return __getattr__
+
+
+# utime
+
+def _time():
+	return world.time()
+
+
+def _localtime(secs=None):
+	t = time.gmtime(world.time() if secs is None else secs)
+	return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
+
+
+def _mktime(t):
+	return calendar.timegm(tuple(t[:6]) + (0, 0, 0))
+
+
+def _sleep(seconds):
+	world.kernel.sleep_ms(int(seconds * 1000))
+
+
+def _sleep_ms(ms):
+	world.kernel.sleep_ms(ms)
+
+
+def _sleep_us(us):
+	world.kernel.sleep_ms(us // 1000)
+
+
+def _ticks_ms():
+	return world.kernel.now_ms & TICKS_MAX
+
+
+def _ticks_us():
+	return (world.kernel.now_ms * 1000) & TICKS_MAX
+
+
+def _ticks_add(ticks, delta):
+	return (ticks + delta) & TICKS_MAX
+
+
+def _ticks_diff(end, start):
+	return ((end - start + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+
+# _thread
+
+def _allocate_lock():
+	return SimLock(world.kernel)
+
+
+def _start_new_thread(func, args, kwargs=None):
+	thread = world.kernel.spawn((lambda: func(*args, **kwargs)) if kwargs else func, () if kwargs else args,
+	                            getattr(func, '__name__', 'thread'))
+	return thread.ident
+
+
+def _get_ident():
+	thread = world.kernel.current
+	return thread.ident if thread else 0
+
+
+# gc
+
+class GcModel:
+	"""Heap figures reported to the firmware, traced: allocated bytes follow host tracemalloc"""
+
+	heap_size = 1024 * 1024
+	allocated = 200 * 1024
+	collections = 0
+	threshold = -1
+	enabled = True
+	traced = False
+	trace_base = 0
+
+
+def _collect():
+	GcModel.collections += 1
+	return 0
+
+
+def _mem_free():
+	return GcModel.heap_size - _mem_alloc()
+
+
+def _mem_alloc():
+	if GcModel.traced:
+		return min(max(tracemalloc.get_traced_memory()[0] - GcModel.trace_base, 0), GcModel.heap_size)
+	return GcModel.allocated
+
+
+def trace_memory(heap_size=4 * 1024 * 1024):
+	"""Report host allocations made from now on; CPython objects are larger than on device, so is the heap"""
+	tracemalloc.start()
+	GcModel.traced = True
+	GcModel.heap_size = heap_size
+	GcModel.trace_base = tracemalloc.get_traced_memory()[0]
+
+
+def _threshold(amount=None):
+	if amount is None:
+		return GcModel.threshold
+	GcModel.threshold = amount
+
+
+def _gc_enable():
+	GcModel.enabled = True
+
+
+def _gc_disable():
+	GcModel.enabled = False
+
+
+def _gc_isenabled():
+	return GcModel.enabled
+
+
+# uos
+
+def _listdir(path='/usr'):
+	return sorted(os.listdir(world.map_path(path)))
+
+
+def _remove(path):
+	os.remove(world.map_path(path))
+
+
+def _rename(old, new):
+	os.replace(world.map_path(old), world.map_path(new))
+
+
+def _stat(path):
+	return tuple(os.stat(world.map_path(path)))[:10]
+
+
+def _mkdir(path):
+	os.mkdir(world.map_path(path))
+
+
+# pm
+
+def _create_wakelock(name, length=0):
+	index = len(world.power.wakelocks) + 1
+	world.power.wakelocks[index] = False
+	world.power.record('create_wakelock', name)
+	return index
+
+
+def _wakelock_lock(index):
+	world.power.wakelocks[index] = True
+	world.power.record('wakelock_lock', index)
+	return 0
+
+
+def _wakelock_unlock(index):
+	world.power.wakelocks[index] = False
+	world.power.record('wakelock_unlock', index)
+	return 0
+
+
+def _autosleep(flag):
+	world.power.autosleep = bool(flag)
+	world.power.record('autosleep', flag)
+	return 0
+
+
+def _get_wakelock_num():
+	return len([locked for locked in world.power.wakelocks.values() if locked])
+
+
+class OsTimer:
+	"""osTimer firing callbacks in the callback thread"""
+
+	def __init__(self):
+		self.entry = None
+
+	def start(self, period, repeat, callback):
+		self.stop()
+		self.period = max(1, int(period))
+		self.repeat = repeat
+		self.callback = callback
+		self.entry = world.kernel.call_later(self.period, self._fire)
+		return 0
+
+	def _fire(self):
+		if self.repeat:
+			self.entry = world.kernel.call_later(self.period, self._fire)
+		else:
+			self.entry = None
+		world.kernel.irq(self.callback, self)
+
+	def stop(self):
+		world.kernel.cancel(self.entry)
+		self.entry = None
+		return 0
+
+
+# machine
+
+class Pin:
+	"""GPIO recorded in world.pins"""
+
+	IN = 0
+	OUT = 1
+	PULL_DISABLE = 0
+	PULL_PU = 1
+	PULL_PD = 2
+
+	def __init__(self, pin, direction=IN, pull=PULL_DISABLE, value=0):
+		self.pin = pin
+		self.direction = direction
+		if direction == self.OUT:
+			world.set_pin(pin, value)
+
+	def write(self, value):
+		world.set_pin(self.pin, value)
+		return 0
+
+	def read(self):
+		return world.pins.get(self.pin, 0)
+
+
+class UART:
+	"""UART without peer"""
+
+	UART0 = 0
+	UART1 = 1
+	UART2 = 2
+	UART3 = 3
+
+	def __init__(self, port, *args):
+		self.port = port
+
+	def write(self, data):
+		return len(data)
+
+	def read(self, length=0):
+		return b''
+
+	def any(self):
+		return 0
+
+	def close(self):
+		return 0
+
+
+class ExtInt:
+	"""External interrupt driven by world.trigger_motion()"""
+
+	IRQ_RISING = 0
+	IRQ_FALLING = 1
+	IRQ_RISING_FALLING = 2
+	PULL_DISABLE = 0
+	PULL_PU = 1
+	PULL_PD = 2
+
+	def __init__(self, pin, mode, pull, callback):
+		self.pin = pin
+		self.callback = callback
+		self.enabled = False
+		world.motion_callbacks.append(self)
+
+	def enable(self):
+		self.enabled = True
+		return 0
+
+	def disable(self):
+		self.enabled = False
+		return 0
+
+
+class RTC:
+	"""Module RTC with one alarm"""
+
+	def __init__(self):
+		self.callback = None
+		self.alarm_time = None
+		self.entry = None
+
+	def datetime(self, value=None):
+		if value is None:
+			t = _localtime()
+			return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0)
+		world.set_time(calendar.timegm((value[0], value[1], value[2], value[4], value[5], value[6], 0, 0, 0)))
+		return 0
+
+	def register_callback(self, callback):
+		self.callback = callback
+		return 0
+
+	def set_alarm(self, value):
+		self.alarm_time = calendar.timegm((value[0], value[1], value[2], value[4], value[5], value[6], 0, 0, 0))
+		return 0
+
+	def enable_alarm(self, on):
+		world.kernel.cancel(self.entry)
+		self.entry = None
+		if on and self.alarm_time is not None:
+			self.entry = world.kernel.call_later(max(0, self.alarm_time - world.time()) * 1000, self._fire)
+		return 0
+
+	def _fire(self):
+		self.entry = None
+		if self.callback:
+			world.kernel.irq(self.callback, (1,))
+
+
+for _pin in range(1, 48):
+	setattr(Pin, 'GPIO{}'.format(_pin), _pin)
+	setattr(ExtInt, 'GPIO{}'.format(_pin), _pin)
+
+
+# misc
+
+class Power:
+	"""Battery voltage and power control"""
+
+	@staticmethod
+	def getVbatt():
+		return world.battery.voltage_mv()
+
+	@staticmethod
+	def powerDown():
+		world.power_off()
+		raise SimExit()
+
+	@staticmethod
+	def powerRestart():
+		world.power_off(restart=True)
+		raise SimExit()
+
+
+class USB:
+	"""USB power detection"""
+
+	def getStatus(self):
+		return 1 if world.battery.is_charging() else 0
+
+
+# gnss
+
+def _nmea_coord(value, degrees_digits):
+	degrees = int(abs(value))
+	minutes = (abs(value) - degrees) * 60
+	return '{:0{}d}{:08.5f}'.format(degrees, degrees_digits, minutes)
+
+
+class GNSS:
+	"""Receiver reporting world.gnss state in QuecPython gnss API format
+	(NMEA is parsed continuously, sentences always reflect the current fix)"""
+
+	def __init__(self, *args):
+		pass
+
+	@property
+	def fixed(self):
+		return world.gnss.has_fix()
+
+	def readAndParse(self):
+		return 1 if world.gnss.powered else 0
+
+	def getRMC(self):
+		model = world.gnss
+		if not model.powered:
+			return -1
+		lat, lon, speed, course = model.position()
+		t = time.gmtime(world.true_time())
+		return ['$GNRMC', '{:02d}{:02d}{:02d}.000'.format(t.tm_hour, t.tm_min, t.tm_sec), 'A' if self.fixed else 'V',
+		        _nmea_coord(lat, 2), 'N' if lat >= 0 else 'S', _nmea_coord(lon, 3), 'E' if lon >= 0 else 'W',
+		        '{:.2f}'.format(speed / 1.852), '{:.2f}'.format(course), '{:02d}{:02d}{:02d}'.format(t.tm_mday, t.tm_mon, t.tm_year % 100),
+		        '', '', 'A', 'V*36']
+
+	def getGGA(self):
+		model = world.gnss
+		if not model.powered:
+			return -1
+		lat, lon, speed, course = model.position()
+		return ['$GNGGA', '000000.000', _nmea_coord(lat, 2), 'N', _nmea_coord(lon, 3), 'E', '1' if self.fixed else '0',
+		        str(model.satellites), str(model.hdop), str(model.altitude), 'M', '0.0', 'M', '', '*50']
+
+	def getGSV(self):
+		model = world.gnss
+		if not model.powered:
+			return -1
+		sats = []
+		for i in range(model.satellites):
+			sats.extend(['{:02d}'.format(i + 1), str(20 + i * 5), str(i * 40), str(30 + i) if self.fixed else ''])
+		return (['$GPGSV', '1', '1', str(model.satellites)] + sats + ['0*67'],)
+
+	def getLocation(self):
+		lat, lon, speed, course = world.gnss.position()
+		return (abs(lat), 'N' if lat >= 0 else 'S', abs(lon), 'E' if lon >= 0 else 'W')
+
+	def getAltitude(self):
+		return world.gnss.altitude
+
+	def getSpeed(self):
+		return world.gnss.position()[2]
+
+	def getUsedSateCnt(self):
+		return world.gnss.satellites if self.fixed else 0
+
+	def isFix(self):
+		return 1 if self.fixed else 0
+
+
+# modem, net, checkNet, dataCall, ntptime
+
+def _get_imei():
+	return world.imei
+
+
+def _get_cell_info():
+	return world.network.cells
+
+
+def _csq():
+	return world.network.csq if world.network.registered() else 99
+
+
+def _wait_network_ready(timeout=60):
+	network = world.network
+	deadline = world.kernel.now_ms + timeout * 1000
+	while not network.registered():
+		if world.kernel.now_ms >= deadline:
+			return (2, 0)
+		world.kernel.sleep_ms(min(1000, deadline - world.kernel.now_ms))
+	return (3, 1)
+
+
+def _set_apn(*args):
+	return 0
+
+
+def _datacall_set_callback(callback):
+	world.network.datacall_callback = callback
+	return 0
+
+
+def _datacall_activate(profile=1):
+	network = world.network
+	if not network.registered():
+		return -1
+	world.kernel.sleep_ms(network.pdp_delay_ms)
+	if network.fault('pdp_fail'):
+		return -1
+	network.set_pdp(True)
+	return 0
+
+
+def _datacall_get_info(profile=1, ip_type=0):
+	active = 1 if world.network.pdp_active else 0
+	return (profile, ip_type, [active, 0, '10.0.0.2', '8.8.8.8', '8.8.4.4'])
+
+
+def _ntp_settime(timezone=0, timetuple=None):
+	if timetuple is not None:
+		world.set_time(calendar.timegm(tuple(timetuple[:6]) + (0, 0, 0)))
+		return 0
+	network = world.network
+	if not network.pdp_active:
+		raise OSError(errno.ENETUNREACH, 'network unreachable')
+	world.kernel.sleep_ms(network.rtt_ms)
+	if network.fault('ntp_fail') or network.fault('drop'):
+		raise OSError(errno.ETIMEDOUT, 'NTP timeout')
+	world.set_time(world.true_time())
+	return 0
+
+
+# usocket
+
+class Socket:
+	"""TCP socket talking to the world's server for the host, with latency and fault injection"""
+
+	def __init__(self, family=2, kind=1, proto=0):
+		self.timeout = None
+		self.connection = None
+		self.rx = b''
+		self.rx_at = 0
+
+	def settimeout(self, timeout):
+		self.timeout = timeout
+
+	def _timeout_ms(self):
+		return 60000 if self.timeout is None else int(self.timeout * 1000)
+
+	def connect(self, addr):
+		network = world.network
+		if not network.pdp_active:
+			raise OSError(errno.ENETUNREACH, 'network unreachable')
+		network.stats['connects'] += 1
+		server = world.servers.get(addr[0], world.server)
+		if network.fault('connect_timeout') or server.outage == 'timeout':
+			world.kernel.sleep_ms(self._timeout_ms())
+			raise OSError(errno.ETIMEDOUT, 'connect timeout')
+		world.kernel.sleep_ms(network.connect_ms + network.faults.get('latency_ms', 0) + server.latency_ms)
+		if network.fault('refuse') or server.outage == 'refuse':
+			raise OSError(errno.ECONNREFUSED, 'connection refused')
+		self.connection = server.connect(addr[0], addr[1])
+
+	def send(self, data):
+		network = world.network
+		if self.connection is None or not network.pdp_active:
+			raise OSError(errno.ENOTCONN, 'not connected')
+		if self.connection.closed:
+			raise OSError(errno.ECONNRESET, 'connection reset')
+		data = bytes(data)
+		network.stats['sent_bytes'] += len(data)
+		if network.fault('drop'):
+			network.stats['dropped'] += 1
+			return len(data)
+		response = self.connection.feed(data)
+		if response:
+			self.rx += response
+			self.rx_at = world.kernel.now_ms + network.rtt_ms + network.faults.get('latency_ms', 0) + self.connection.server.latency_ms
+		return len(data)
+
+	write = send
+	sendall = send
+
+	def recv(self, size):
+		if self.connection is None:
+			raise OSError(errno.ENOTCONN, 'not connected')
+		if not self.rx:
+			if self.connection.closed:
+				return b''
+			world.kernel.sleep_ms(self._timeout_ms())
+			raise OSError(errno.ETIMEDOUT, 'timeout')
+		wait = self.rx_at - world.kernel.now_ms
+		if wait > self._timeout_ms():
+			world.kernel.sleep_ms(self._timeout_ms())
+			raise OSError(errno.ETIMEDOUT, 'timeout')
+		if wait > 0:
+			world.kernel.sleep_ms(wait)
+		data = self.rx[:size]
+		self.rx = self.rx[size:]
+		world.network.stats['received_bytes'] += len(data)
+		return data
+
+	read = recv
+
+	def close(self):
+		self.connection = None
+
+
+def _getaddrinfo(host, port, *args):
+	network = world.network
+	if not network.pdp_active:
+		raise OSError(errno.ENETUNREACH, 'network unreachable')
+	network.stats['dns'] += 1
+	world.kernel.sleep_ms(network.rtt_ms)
+	if network.fault('dns_fail'):
+		raise OSError(-202, 'DNS lookup failed')
+	return [(2, 1, 0, '', (host, port))]
+
+
+# sms
+
+def _sms_set_callback(callback):
+	world.sms.callback = callback
+	return 0
+
+
+def _sms_search(index):
+	message = world.sms.inbox.get(index)
+	if message is None:
+		return -1
+	phone, text, timestamp = message
+	t = time.gmtime(timestamp)
+	return (phone, text, '{:02d}/{:02d}/{:02d},{:02d}:{:02d}:{:02d}+00'.format(t.tm_year % 100, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec))
+
+
+def _sms_delete(index, delmode=0):
+	world.sms.inbox.pop(index, None)
+	return 0
+
+
+def _sms_send(phone, text, encoding='GSM'):
+	world.kernel.sleep_ms(world.network.rtt_ms * 4)
+	world.sms.sent.append((world.kernel.now_ms, phone, text))
+	return 0
+
+
+# wifiScan
+
+def _wifi_control(on):
+	world.wifi.enabled = bool(on)
+	return 0
+
+
+def _wifi_set_callback(callback):
+	world.wifi.callback = callback
+	return 0
+
+
+def _wifi_async_start():
+	wifi = world.wifi
+	if not wifi.enabled:
+		return -1
+	wifi.scans += 1
+	world.kernel.call_later(wifi.scan_ms, _wifi_scan_done)
+	return 0
+
+
+def _wifi_scan_done():
+	wifi = world.wifi
+	if wifi.enabled and wifi.callback:
+		aps = [(mac, rssi + world.random.randint(-3, 3)) for mac, rssi in wifi.aps]
+		world.kernel.irq(wifi.callback, (len(aps), aps))
+
+
+def build(sim_world):
+	"""Create stub modules bound to sim_world, keyed by import name"""
+	global world
+	world = sim_world
+	return {
+		'utime': _module('utime', time=_time, localtime=_localtime, gmtime=_localtime, mktime=_mktime, sleep=_sleep,
+		                 sleep_ms=_sleep_ms, sleep_us=_sleep_us, ticks_ms=_ticks_ms, ticks_us=_ticks_us, ticks_cpu=_ticks_us,
+		                 ticks_add=_ticks_add, ticks_diff=_ticks_diff),
+		'_thread': _module('_thread', allocate_lock=_allocate_lock, start_new_thread=_start_new_thread, get_ident=_get_ident,
+		                   stack_size=lambda size=0: 0, __getattr__=_fallback(host_thread)),
+		'gc': _module('gc', collect=_collect, mem_free=_mem_free, mem_alloc=_mem_alloc, threshold=_threshold,
+		              enable=_gc_enable, disable=_gc_disable, isenabled=_gc_isenabled, model=GcModel, __getattr__=_fallback(host_gc)),
+		'uos': _module('uos', listdir=_listdir, remove=_remove, rename=_rename, stat=_stat, mkdir=_mkdir),
+		'ujson': _module('ujson', dumps=json.dumps, loads=json.loads, dump=json.dump, load=json.load),
+		'ustruct': struct,
+		'ubinascii': binascii,
+		'urandom': _module('urandom', randint=sim_world.random.randint, getrandbits=sim_world.random.getrandbits, random=sim_world.random.random),
+		'uarray': array,
+		'pm': _module('pm', create_wakelock=_create_wakelock, wakelock_lock=_wakelock_lock, wakelock_unlock=_wakelock_unlock,
+		              autosleep=_autosleep, get_wakelock_num=_get_wakelock_num),
+		'osTimer': OsTimer,
+		'machine': _module('machine', Pin=Pin, UART=UART, ExtInt=ExtInt, RTC=RTC),
+		'misc': _module('misc', Power=Power, USB=USB),
+		'gnss': _module('gnss', GNSS=GNSS),
+		'modem': _module('modem', getDevImei=_get_imei),
+		'net': _module('net', getCellInfo=_get_cell_info, csqQueryPoll=_csq),
+		'checkNet': _module('checkNet', waitNetworkReady=_wait_network_ready),
+		'dataCall': _module('dataCall', setApn=_set_apn, setCallback=_datacall_set_callback, activate=_datacall_activate,
+		                    getInfo=_datacall_get_info),
+		'ntptime': _module('ntptime', host='pool.ntp.org', settime=_ntp_settime),
+		'usocket': _module('usocket', socket=Socket, getaddrinfo=_getaddrinfo, AF_INET=2, SOCK_STREAM=1),
+		'sms': _module('sms', setCallback=_sms_set_callback, searchTextMsg=_sms_search, deleteMsg=_sms_delete, sendTextMsg=_sms_send),
+		'wifiScan': _module('wifiScan', control=_wifi_control, setCallback=_wifi_set_callback, asyncStart=_wifi_async_start)
+	}
@@ -0,0 +1,424 @@
+import bisect
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+from sim.kernel import Kernel
+from sim.server import SimServer
+
+
+# 2026-01-01 00:00:00 UTC: real time, served by NTP and GNSS
+TRUE_EPOCH = 1767225600
+# 2020-01-01 00:00:00 UTC: module RTC after power-on without network time (World(nitz=False))
+RTC_EPOCH = 1577836800
+GNSS_POWER_PIN = 10
+# Host name of the primary tracking server in the firmware config
+SERVER_HOST = 'tracker.example.com'
+
+
+class PowerModel:
+	"""Records pm wakelock/autosleep transitions and time spent awake and asleep"""
+
+	def __init__(self, kernel):
+		self.kernel = kernel
+		self.autosleep = False
+		self.wakelocks = {}
+		self.transitions = []
+		self.state = 'awake'
+		self.state_since = 0
+		self.time_ms = {'awake': 0, 'sleep': 0}
+
+	def record(self, event, detail=None):
+		"""Log pm call and re-evaluate sleep state"""
+		self.transitions.append((self.kernel.now_ms, event, detail))
+		held = [name for name, locked in self.wakelocks.items() if locked]
+		self._set_state('sleep' if self.autosleep and not held else 'awake')
+
+	def _set_state(self, state):
+		"""Account time of previous state"""
+		now = self.kernel.now_ms
+		self.time_ms[self.state] += now - self.state_since
+		self.state_since = now
+		if state != self.state:
+			self.transitions.append((now, 'state', state))
+			self.state = state
+
+	def totals(self):
+		"""Time in ms per state up to now"""
+		totals = dict(self.time_ms)
+		totals[self.state] += self.kernel.now_ms - self.state_since
+		return totals
+
+
+class GnssModel:
+	"""Scriptable receiver: time to first fix, outages and a motion plan"""
+
+	def __init__(self, world, latitude=55.751244, longitude=37.618423, ttff=35, hot_ttff=5):
+		self.world = world
+		self.latitude = latitude
+		self.longitude = longitude
+		self.altitude = 150.0
+		self.speed = 0.0
+		self.course = 0.0
+		self.ttff = ttff
+		self.hot_ttff = hot_ttff
+		self.satellites = 9
+		self.hdop = 1.2
+		self.powered = False
+		self.powered_at = 0
+		self.off_at = None
+		self.fix_at = None
+		# (start s, end s) without fix, e.g. tunnels or indoor parking
+		self.outages = []
+		# (start s, end s, speed km/h, course deg)
+		self.motion = []
+		self.updated_ms = 0
+
+	def set_power(self, on):
+		"""GNSS power pin changed"""
+		now = self.world.kernel.now_ms
+		if on and not self.powered:
+			warm = self.off_at is not None and now - self.off_at < 2 * 3600 * 1000
+			self.fix_at = now + (self.hot_ttff if warm else self.ttff) * 1000
+		elif not on and self.powered:
+			self.off_at = now
+			self.fix_at = None
+		self.powered = on
+
+	def _advance(self):
+		"""Integrate motion plan up to current virtual time"""
+		now = self.world.kernel.now_ms
+		t = self.updated_ms
+		while t < now:
+			step = min(now - t, 1000)
+			seconds = t / 1000.0
+			self.speed = 0.0
+			for start, end, speed, course in self.motion:
+				if start <= seconds < end:
+					self.speed = speed
+					self.course = course
+					break
+			if self.speed:
+				distance = self.speed / 3.6 * step / 1000.0
+				self.latitude += distance * math.cos(math.radians(self.course)) / 111320.0
+				self.longitude += distance * math.sin(math.radians(self.course)) / (111320.0 * math.cos(math.radians(self.latitude)))
+			t += step
+		self.updated_ms = now
+
+	def has_fix(self):
+		"""Receiver powered, first fix acquired and not in outage"""
+		if not self.powered or self.fix_at is None or self.world.kernel.now_ms < self.fix_at:
+			return False
+		seconds = self.world.kernel.now_ms / 1000.0
+		for start, end in self.outages:
+			if start <= seconds < end:
+				return False
+		return True
+
+	def moving(self):
+		"""Motion plan says the vehicle moves now"""
+		seconds = self.world.kernel.now_ms / 1000.0
+		for start, end, speed, course in self.motion:
+			if start <= seconds < end and speed:
+				return True
+		return False
+
+	def position(self):
+		"""Current (lat, lon, speed km/h, course)"""
+		self._advance()
+		return self.latitude, self.longitude, self.speed, self.course
+
+
+class BatteryModel:
+	"""Coulomb counter with a Li-ion discharge curve and charger schedule"""
+
+	# (percent, mV) discharge curve
+	CURVE = [(100, 4180), (90, 4040), (80, 3940), (70, 3860), (60, 3790), (50, 3740), (40, 3690), (30, 3650),
+	         (20, 3600), (10, 3540), (5, 3480), (0, 3300)]
+
+	def __init__(self, world, capacity_mah=1000, level=0.8, awake_ma=28.0, sleep_ma=1.5, gnss_ma=22.0):
+		self.world = world
+		self.capacity_mah = capacity_mah
+		self.charge_mah = capacity_mah * level
+		self.awake_ma = awake_ma
+		self.sleep_ma = sleep_ma
+		self.gnss_ma = gnss_ma
+		self.charger_ma = 500.0
+		# (start s, end s) with USB power connected
+		self.charging = []
+		self.noise_mv = 8
+		# Recorded (second, mV) samples replayed instead of the discharge curve (sim.scenarios.recorded)
+		self.trace = []
+		self.updated_ms = 0
+		# Charge drawn by the device, including time on charger
+		self.consumed_mah = 0.0
+
+	def is_charging(self):
+		"""USB power connected now"""
+		seconds = self.world.kernel.now_ms / 1000.0
+		for start, end in self.charging:
+			if start <= seconds < end:
+				return True
+		return False
+
+	def current_ma(self):
+		"""Average current for the present device state"""
+		current = self.sleep_ma if self.world.power.state == 'sleep' else self.awake_ma
+		if self.world.gnss.powered:
+			current += self.gnss_ma
+		return current
+
+	def _advance(self):
+		"""Integrate charge since last update"""
+		now = self.world.kernel.now_ms
+		hours = (now - self.updated_ms) / 3600000.0
+		self.updated_ms = now
+		self.consumed_mah += self.current_ma() * hours
+		delta = self.charger_ma if self.is_charging() else -self.current_ma()
+		self.charge_mah = max(0.0, min(self.capacity_mah, self.charge_mah + delta * hours))
+
+	def percentage(self):
+		"""State of charge 0..100"""
+		self._advance()
+		return 100.0 * self.charge_mah / self.capacity_mah
+
+	def voltage_mv(self):
+		"""Terminal voltage with measurement noise, interpolated from the trace when one is replayed"""
+		if self.trace:
+			return self._trace_mv()
+		percent = self.percentage()
+		mv = self.CURVE[-1][1]
+		for i in range(len(self.CURVE) - 1):
+			p_high, v_high = self.CURVE[i]
+			p_low, v_low = self.CURVE[i + 1]
+			if p_low <= percent <= p_high:
+				mv = v_low + (percent - p_low) * (v_high - v_low) / (p_high - p_low)
+				break
+		if self.is_charging():
+			mv += 80
+		return int(mv + self.world.random.randint(-self.noise_mv, self.noise_mv))
+
+	def _trace_mv(self):
+		"""Recorded voltage at the present time, held at the first and last sample outside the trace"""
+		seconds = self.world.kernel.now_ms / 1000.0
+		i = bisect.bisect_right(self.trace, (seconds, float('inf')))
+		if i == 0:
+			return self.trace[0][1]
+		if i == len(self.trace):
+			return self.trace[-1][1]
+		(t_low, v_low), (t_high, v_high) = self.trace[i - 1], self.trace[i]
+		return int(v_low + (seconds - t_low) * (v_high - v_low) / (t_high - t_low))
+
+
+class NetworkModel:
+	"""Cellular registration, PDP context and fault injection for sockets"""
+
+	def __init__(self, world):
+		self.world = world
+		self.registered_at = 8
+		self.pdp_active = False
+		self.pdp_delay_ms = 1500
+		self.datacall_callback = None
+		self.csq = 20
+		self.rtt_ms = 300
+		self.connect_ms = 400
+		# Fault injection, probabilities 0..1 evaluated per operation
+		self.faults = {'drop': 0.0, 'dns_fail': 0.0, 'refuse': 0.0, 'connect_timeout': 0.0, 'pdp_fail': 0.0, 'ntp_fail': 0.0, 'latency_ms': 0}
+		self.stats = {'dns': 0, 'connects': 0, 'sent_bytes': 0, 'received_bytes': 0, 'dropped': 0, 'faults': 0}
+		# GSM, UMTS and LTE cell lists in net.getCellInfo() format
+		self.cells = ([], [], [(0, 0x1A2B3C4, 250, 1, 301, 0x1F40, 1850, -71), (1, 0x1A2B3C5, 250, 1, 302, 0x1F40, 1850, -85)])
+
+	def set_faults(self, **faults):
+		"""Change fault injection settings"""
+		self.faults.update(faults)
+
+	def fault(self, name):
+		"""Roll fault with configured probability"""
+		probability = self.faults.get(name, 0.0)
+		if probability and self.world.random.random() < probability:
+			self.stats['faults'] += 1
+			return True
+		return False
+
+	def registered(self):
+		"""Registered to cellular network"""
+		return self.world.kernel.now_ms >= self.registered_at * 1000
+
+	def latency(self):
+		"""One-way delivery latency in ms"""
+		return self.rtt_ms // 2 + self.faults.get('latency_ms', 0)
+
+	def set_pdp(self, active):
+		"""Change PDP state (e.g. network drops the data call) and notify firmware"""
+		if active == self.pdp_active:
+			return
+		self.pdp_active = active
+		if self.datacall_callback:
+			self.world.kernel.irq(self.datacall_callback, (1, 1 if active else 0, None))
+
+
+class SmsModel:
+	"""SIM message storage, inbound delivery and outbound log"""
+
+	def __init__(self, world):
+		self.world = world
+		self.callback = None
+		self.inbox = {}
+		self.next_index = 0
+		self.sent = []
+
+	def deliver(self, phone, text, at=None):
+		"""Deliver SMS now or at virtual second 'at'"""
+		if at is not None:
+			self.world.at(at, self.deliver, phone, text)
+			return
+		index = self.next_index
+		self.next_index += 1
+		self.inbox[index] = (phone, text, self.world.true_time())
+		if self.callback:
+			self.world.kernel.irq(self.callback, (1, 'SM', index))
+
+
+class WifiModel:
+	"""Access points visible to the scanner"""
+
+	def __init__(self, world):
+		self.world = world
+		self.enabled = False
+		self.callback = None
+		self.scan_ms = 2500
+		self.scans = 0
+		self.aps = [('a4:2b:b0:11:22:%02x' % i, -50 - i * 6) for i in range(10)]
+
+
+class World:
+	"""Simulated device surroundings shared by all stub modules"""
+
+	def __init__(self, seed=1, fs_root=None, imei='866123456789012', nitz=True):
+		self.kernel = Kernel()
+		self.random = random.Random(seed)
+		self.imei = imei
+		# Network time (NITZ) normally sets the RTC before firmware starts
+		self.rtc_offset = TRUE_EPOCH if nitz else RTC_EPOCH
+		self.true_offset = TRUE_EPOCH
+		self.own_fs = fs_root is None
+		self.fs_root = fs_root or tempfile.mkdtemp(prefix='zx908-sim-')
+		self.pins = {}
+		self.power = PowerModel(self.kernel)
+		self.gnss = GnssModel(self)
+		self.battery = BatteryModel(self)
+		self.network = NetworkModel(self)
+		self.sms = SmsModel(self)
+		self.wifi = WifiModel(self)
+		self.server = SimServer(self)
+		# Tracking servers by host name
+		self.servers = {SERVER_HOST: self.server}
+		# Firmware config entries set by the scenario (merged by sim.run.write_config)
+		self.config = {}
+		# Hosts of add_server() configured as backup servers
+		self.backups = []
+		# Names of sim.checks checks the scenario expects to pass (sim.run --check)
+		self.checks = []
+		self.motion_callbacks = []
+		self.rtc_alarm = None
+		self.powered_off = None
+		self.tracker = None
+
+	def time(self):
+		"""Module RTC time in seconds"""
+		return self.rtc_offset + self.kernel.now_ms // 1000
+
+	def true_time(self):
+		"""Real time in seconds"""
+		return self.true_offset + self.kernel.now_ms // 1000
+
+	def set_time(self, seconds):
+		"""Set module RTC"""
+		self.rtc_offset = seconds - self.kernel.now_ms // 1000
+
+	def add_server(self, host, backup=True):
+		"""Add tracking server, configured as backup unless the scenario switches to it later"""
+		server = SimServer(self)
+		self.servers[host] = server
+		if backup:
+			self.backups.append(host)
+		return server
+
+	def at(self, seconds, func, *args):
+		"""Run func at virtual second (scenario scripting, scheduler context)"""
+		return self.kernel.call_later(seconds * 1000 - self.kernel.now_ms, func, *args)
+
+	def set_pin(self, pin, value):
+		"""GPIO output changed"""
+		self.pins[pin] = value
+		if pin == GNSS_POWER_PIN:
+			self.gnss.set_power(bool(value))
+
+	def trigger_motion(self, at=None):
+		"""Fire motion sensor interrupt now or at virtual second 'at'"""
+		if at is not None:
+			self.at(at, self.trigger_motion)
+			return
+		for ext_int in self.motion_callbacks:
+			if ext_int.enabled:
+				self.kernel.irq(ext_int.callback, (ext_int.pin, 1))
+
+	def map_path(self, path):
+		"""Map firmware '/usr/...' path to the host directory"""
+		if path == '/usr' or path == '/usr/':
+			return self.fs_root
+		return os.path.join(self.fs_root, path[len('/usr/'):])
+
+	def power_off(self, restart=False):
+		"""Misc.Power powerDown / powerRestart"""
+		self.powered_off = (self.kernel.now_ms, 'restart' if restart else 'down')
+		self.kernel.stop()
+
+	def report(self):
+		"""Summary of the run"""
+		totals = self.power.totals()
+		report = {
+			'virtual_s': self.kernel.now_ms // 1000,
+			'switches': self.kernel.switches,
+			'awake_s': totals['awake'] // 1000,
+			'sleep_s': totals['sleep'] // 1000,
+			'pm_transitions': len(self.power.transitions),
+			'battery_percent': round(self.battery.percentage(), 1),
+			'packets': self._packets(),
+			'sms_sent': len(self.sms.sent),
+			'wifi_scans': self.wifi.scans,
+			'network': dict(self.network.stats),
+			'powered_off': self.powered_off,
+			'memory': self._firmware('usr.memory', 'memory'),
+			'energy': self._firmware('usr.energy', 'energy'),
+			'log': self._firmware('usr.logger', 'logger'),
+			'link': self._firmware('usr.connection', 'link')
+		}
+		if len(self.servers) > 1:
+			report['servers'] = dict((host, dict(server.counts)) for host, server in self.servers.items())
+			protocol = getattr(self.tracker, 'protocol', None)
+			if hasattr(protocol, 'snapshot'):
+				report['failover'] = protocol.snapshot()
+		return report
+
+	def _packets(self):
+		"""Packets received by all servers per kind"""
+		packets = {}
+		for server in self.servers.values():
+			for key, count in server.counts.items():
+				packets[key] = packets.get(key, 0) + count
+		return packets
+
+	def _firmware(self, module_name, name):
+		"""Snapshot of firmware singleton (memory, energy, logger, connection) if it was loaded"""
+		module = sys.modules.get(module_name)
+		return getattr(module, name).snapshot() if module else None
+
+	def close(self):
+		"""Stop threads and remove temporary flash directory"""
+		self.kernel.shutdown()
+		if self.own_fs:
+			shutil.rmtree(self.fs_root, ignore_errors=True)
@@ -1,53 +1,171 @@
-from misc import Power, USB
-
-
-class BatteryMonitor:
-	"""Battery monitoring with accurate voltage-to-percentage conversion"""
-
-	VOLTAGE_TABLE = [
-		(4.143, 100), (4.079, 95), (4.023, 90), (3.972, 85), (3.923, 80), (3.877, 75), (3.837, 70),
-		(3.804, 65), (3.774, 60), (3.748, 55), (3.722, 50), (3.695, 45), (3.670, 40), (3.647, 35),
-		(3.626, 30), (3.607, 25), (3.587, 20), (3.563, 15), (3.529, 10), (3.477, 5), (3.430, 0), (3.100, 0)]
-
-	def __init__(self):
-		self.voltage = 0.0
-		self.percentage = 0
-		self.is_charging = False
-		self.usb = USB()
-		self.update()
-
-	def update(self):
-		"""Update battery status"""
-		try:
-			self.voltage = Power.getVbatt() / 1000.0
-			self.percentage = self._voltage_to_percentage(self.voltage)
-			usb_status = self.usb.getStatus()
-			self.is_charging = (usb_status == 1)
-		except Exception as e:
-			print('Battery update error:', e)
-
-	def _voltage_to_percentage(self, voltage):
-		"""Convert voltage to percentage using interpolation"""
-		if voltage >= self.VOLTAGE_TABLE[0][0]:
-			return 100
-		if voltage <= self.VOLTAGE_TABLE[-1][0]:
-			return 0
-		for i in range(len(self.VOLTAGE_TABLE) - 1):
-			v_high, p_high = self.VOLTAGE_TABLE[i]
-			v_low, p_low = self.VOLTAGE_TABLE[i + 1]
-			if v_low <= voltage <= v_high:
-				percentage = p_low + (voltage - v_low) * (p_high - p_low) / (v_high - v_low)
-				return int(percentage)
-		return 0
-
-	def get_percentage(self):
-		"""Get battery percentage"""
-		return self.percentage
-
-	def get_voltage(self):
-		"""Get battery voltage"""
-		return self.voltage
-
-	def is_low(self, threshold=20):
-		"""Check if battery is low"""
-		return self.percentage < threshold
+import utime
+import uarray
+from misc import Power, USB
+from usr.logger import get_logger
+
+
+log = get_logger('battery')
+
+# Lookup table covers MIN_MV..MAX_MV in LUT_STEP_MV steps
+MIN_MV = 3100
+MAX_MV = 4200
+LUT_STEP_MV = 10
+MEDIAN_WINDOW = 5
+# Voltage sag while the radio transmits, added back to samples taken under load
+LOAD_DROP_MV = 60
+# Minimum time between discharge rate estimates
+RATE_WINDOW = 600
+
+
+class BatteryMonitor:
+	"""Battery state estimator: median + EMA filtering, load compensation, time-to-empty"""
+
+	VOLTAGE_TABLE = [
+		(4.143, 100), (4.079, 95), (4.023, 90), (3.972, 85), (3.923, 80), (3.877, 75), (3.837, 70),
+		(3.804, 65), (3.774, 60), (3.748, 55), (3.722, 50), (3.695, 45), (3.670, 40), (3.647, 35),
+		(3.626, 30), (3.607, 25), (3.587, 20), (3.563, 15), (3.529, 10), (3.477, 5), (3.430, 0), (3.100, 0)]
+
+	def __init__(self, sample=True):
+		self.voltage = 0.0
+		self.percentage = 0
+		self.is_charging = False
+		self.filtered_mv = 0
+		self.window = uarray.array('H', [0] * MEDIAN_WINDOW)
+		self.window_count = 0
+		self.window_pos = 0
+		self.load_active = 0
+		self.interval = 5
+		self.rate = 0.0
+		self.rate_anchor = None
+		self.low = False
+		self.lut = self._build_lut()
+		self.usb = USB() if sample else None
+		if sample:
+			self.update()
+
+	def _build_lut(self):
+		"""Precompute percentage for every LUT_STEP_MV from MIN_MV to MAX_MV"""
+		lut = bytearray((MAX_MV - MIN_MV) // LUT_STEP_MV + 1)
+		for i in range(len(lut)):
+			lut[i] = self._interpolate((MIN_MV + i * LUT_STEP_MV) / 1000.0)
+		return lut
+
+	def _interpolate(self, voltage):
+		"""Convert voltage to percentage using table interpolation"""
+		if voltage >= self.VOLTAGE_TABLE[0][0]:
+			return 100
+		if voltage <= self.VOLTAGE_TABLE[-1][0]:
+			return 0
+		for i in range(len(self.VOLTAGE_TABLE) - 1):
+			v_high, p_high = self.VOLTAGE_TABLE[i]
+			v_low, p_low = self.VOLTAGE_TABLE[i + 1]
+			if v_low <= voltage <= v_high:
+				percentage = p_low + (voltage - v_low) * (p_high - p_low) / (v_high - v_low)
+				return int(percentage)
+		return 0
+
+	def load_begin(self):
+		"""Mark start of high current load (radio TX)"""
+		self.load_active += 1
+
+	def load_end(self):
+		"""Mark end of high current load"""
+		if self.load_active > 0:
+			self.load_active -= 1
+
+	def update(self):
+		"""Sample battery hardware and update estimate"""
+		try:
+			usb_status = self.usb.getStatus()
+			self.feed(Power.getVbatt(), utime.time(), usb_status == 1)
+		except Exception as e:
+			log.error('Battery update error: {}', e)
+
+	def feed(self, mv, now, charging=False):
+		"""Process one voltage sample in mV taken at time now (seconds)"""
+		if self.load_active:
+			mv += LOAD_DROP_MV
+		if charging != self.is_charging:
+			# Charger plugged/unplugged: voltage steps, restart filters
+			self.window_count = 0
+			self.window_pos = 0
+			self.rate_anchor = None
+		self.is_charging = charging
+		self.window[self.window_pos] = mv
+		self.window_pos = (self.window_pos + 1) % MEDIAN_WINDOW
+		if self.window_count < MEDIAN_WINDOW:
+			self.window_count += 1
+		median = self._median()
+		previous = self.filtered_mv
+		if self.window_count == 1:
+			self.filtered_mv = median
+		else:
+			self.filtered_mv = (self.filtered_mv * 3 + median) // 4
+		self.voltage = self.filtered_mv / 1000.0
+		self.percentage = self._voltage_to_percentage(self.voltage)
+		self._update_rate(now)
+		self._update_interval(abs(self.filtered_mv - previous))
+
+	def _median(self):
+		"""Median of filled part of sample window"""
+		values = sorted(self.window[:self.window_count])
+		return values[len(values) // 2]
+
+	def _update_rate(self, now):
+		"""Update discharge rate estimate in percent per hour"""
+		if self.is_charging:
+			self.rate = 0.0
+			return
+		if self.rate_anchor is None:
+			self.rate_anchor = (now, self.filtered_mv)
+			return
+		anchor_time, anchor_mv = self.rate_anchor
+		elapsed = now - anchor_time
+		if elapsed < RATE_WINDOW:
+			return
+		dropped = self._voltage_to_percentage(anchor_mv / 1000.0) - self.percentage
+		rate = dropped * 3600.0 / elapsed
+		self.rate = rate if not self.rate else (self.rate * 3 + rate) / 4
+		self.rate_anchor = (now, self.filtered_mv)
+
+	def _update_interval(self, delta_mv):
+		"""Sample often while voltage moves, back off up to 60s when stable"""
+		if delta_mv > 20 or self.is_charging:
+			self.interval = 5
+		elif delta_mv <= 5:
+			self.interval = min(self.interval * 2, 60)
+
+	def _voltage_to_percentage(self, voltage):
+		"""Convert voltage to percentage using precomputed lookup table"""
+		mv = int(voltage * 1000)
+		if mv <= MIN_MV:
+			return 0
+		if mv >= MAX_MV:
+			return 100
+		return self.lut[(mv - MIN_MV) // LUT_STEP_MV]
+
+	def next_interval(self):
+		"""Get seconds until next sample"""
+		return self.interval
+
+	def get_percentage(self):
+		"""Get battery percentage"""
+		return self.percentage
+
+	def get_voltage(self):
+		"""Get battery voltage"""
+		return self.voltage
+
+	def get_hours_remaining(self):
+		"""Get estimated hours until empty, or None if unknown"""
+		if self.is_charging or self.rate < 0.1:
+			return None
+		return self.percentage / self.rate
+
+	def is_low(self, threshold=20):
+		"""Check if battery is low (2% hysteresis to avoid flapping)"""
+		if self.low:
+			self.low = self.percentage < threshold + 2
+		else:
+			self.low = self.percentage < threshold
+		return self.low
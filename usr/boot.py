@@ -0,0 +1,36 @@
+import utime
+from usr.logger import get_logger
+
+
+log = get_logger('boot')
+
+
+class BootProfile:
+	"""Records time since power-on (ticks_ms) at which each boot phase completed"""
+
+	def __init__(self):
+		self.phases = []
+
+	def mark(self, name):
+		"""Record phase completion, only the first occurrence counts"""
+		for phase, _ in self.phases:
+			if phase == name:
+				return False
+		ms = utime.ticks_ms()
+		self.phases.append((name, ms))
+		log.info('Boot phase {}: {} ms', name, ms)
+		return True
+
+	def get(self, name):
+		"""Get phase time in ms since power-on, or None"""
+		for phase, ms in self.phases:
+			if phase == name:
+				return ms
+		return None
+
+	def summary(self):
+		"""Get phases as 'name=ms' list"""
+		return ' '.join(['{}={}'.format(phase, ms) for phase, ms in self.phases])
+
+
+boot_profile = BootProfile()
@@ -0,0 +1,131 @@
+import ustruct
+import utime
+import uos
+from usr.wifi_scanner import iter_fingerprint
+from usr.logger import get_logger
+
+
+log = get_logger('bssid')
+
+CACHE_FILE = '/usr/bssid_cache.bin'
+# Record layout: MAC(6) lat*1e7(4) lon*1e7(4) last used minute(2)
+RECORD_FORMAT = '>6siiH'
+RECORD_SIZE = 16
+SLOTS_PER_BUCKET = 8
+EMPTY_MAC = bytes(6)
+
+
+class BSSIDCache:
+	"""Flash-backed BSSID to position index for offline WiFi positioning"""
+
+	def __init__(self, buckets=64):
+		self.buckets = buckets
+		self.table = bytearray(buckets * SLOTS_PER_BUCKET * RECORD_SIZE)
+		self.dirty = False
+		self.last_flush = utime.time()
+		self.hits = 0
+		self.misses = 0
+		self._load()
+
+	def _load(self):
+		"""Load table from flash"""
+		try:
+			if CACHE_FILE.split('/')[-1] in uos.listdir('/usr'):
+				with open(CACHE_FILE, 'rb') as f:
+					data = f.read()
+				if len(data) == len(self.table):
+					self.table[:] = data
+					log.info('BSSID cache loaded: {} entries', self.count())
+				else:
+					log.warn('BSSID cache size changed, starting empty')
+		except Exception as e:
+			log.error('BSSID cache load error: {}', e)
+
+	def flush(self, force=False):
+		"""Write table to flash if changed (at most every 10 minutes unless forced)"""
+		if not self.dirty or (not force and utime.time() - self.last_flush < 600):
+			return False
+		try:
+			with open(CACHE_FILE, 'wb') as f:
+				f.write(self.table)
+			self.dirty = False
+			self.last_flush = utime.time()
+			return True
+		except Exception as e:
+			log.error('BSSID cache save error: {}', e)
+			return False
+
+	def count(self):
+		"""Get number of stored BSSIDs"""
+		used = 0
+		for offset in range(0, len(self.table), RECORD_SIZE):
+			if self.table[offset:offset + 6] != EMPTY_MAC:
+				used += 1
+		return used
+
+	def _bucket_offset(self, mac):
+		"""Get table offset of bucket for MAC"""
+		return ((mac[4] << 8 | mac[5]) % self.buckets) * SLOTS_PER_BUCKET * RECORD_SIZE
+
+	def _now(self):
+		"""Get 16-bit minute stamp used for LRU"""
+		return (utime.time() // 60) & 0xFFFF
+
+	def _find(self, mac):
+		"""Find slot offset for MAC, or LRU/free slot to replace if missing"""
+		start = self._bucket_offset(mac)
+		now = self._now()
+		victim = start
+		victim_age = -1
+		for offset in range(start, start + SLOTS_PER_BUCKET * RECORD_SIZE, RECORD_SIZE):
+			slot_mac = self.table[offset:offset + 6]
+			if slot_mac == mac:
+				return offset, True
+			if slot_mac == EMPTY_MAC:
+				age = 0x10000
+			else:
+				age = (now - ustruct.unpack_from('>H', self.table, offset + 14)[0]) & 0xFFFF
+			if age > victim_age:
+				victim = offset
+				victim_age = age
+		return victim, False
+
+	def learn(self, fingerprint, latitude, longitude):
+		"""Store APs of fingerprint at given GNSS position"""
+		lat = int(latitude * 10000000)
+		lon = int(longitude * 10000000)
+		now = self._now()
+		for mac, rssi in iter_fingerprint(fingerprint):
+			mac = bytes(mac)
+			offset, found = self._find(mac)
+			if found:
+				_, old_lat, old_lon, _ = ustruct.unpack_from(RECORD_FORMAT, self.table, offset)
+				ustruct.pack_into(RECORD_FORMAT, self.table, offset, mac, (old_lat * 3 + lat) // 4, (old_lon * 3 + lon) // 4, now)
+			else:
+				ustruct.pack_into(RECORD_FORMAT, self.table, offset, mac, lat, lon, now)
+		self.dirty = True
+
+	def locate(self, fingerprint):
+		"""Get RSSI-weighted (latitude, longitude, accuracy) or None if no AP is known"""
+		lat_sum = 0.0
+		lon_sum = 0.0
+		weight_sum = 0
+		matched = 0
+		now = self._now()
+		for mac, rssi in iter_fingerprint(fingerprint):
+			offset, found = self._find(bytes(mac))
+			if not found:
+				continue
+			_, lat, lon, _ = ustruct.unpack_from(RECORD_FORMAT, self.table, offset)
+			ustruct.pack_into('>H', self.table, offset + 14, now)
+			weight = max(1, 100 + rssi)
+			lat_sum += lat * weight
+			lon_sum += lon * weight
+			weight_sum += weight
+			matched += 1
+		if not matched:
+			self.misses += 1
+			return None
+		self.hits += 1
+		accuracy = 100 if matched == 1 else 50
+		return (lat_sum / weight_sum / 10000000, lon_sum / weight_sum / 10000000, accuracy)
@@ -0,0 +1,70 @@
+import net
+import ustruct
+import utime
+from usr.logger import get_logger
+
+
+log = get_logger('cells')
+
+# Cell list layout: count byte, then per cell MCC(2) MNC(2, 3-digit MNCs exceed a byte) LAC/TAC(2) CI(4) abs(RSSI)(1)
+CELL_RECORD_SIZE = 11
+
+
+class CellScanner:
+	"""Serving and neighbour cell collector for LBS location fallback"""
+
+	def __init__(self, max_cells=7, max_age=60):
+		self.max_cells = max_cells
+		self.max_age = max_age
+		self.cells = None
+		self.cells_time = 0
+		self.read_count = 0
+
+	def get_cells(self):
+		"""Get cached cell list, re-read from modem when older than max_age"""
+		if self.cells and utime.time() - self.cells_time < self.max_age:
+			return self.cells
+		try:
+			info = net.getCellInfo()
+			self.read_count += 1
+		except Exception as e:
+			log.error('Cell info error: {}', e)
+			return self.cells
+		if info == -1:
+			return self.cells
+		cells = []
+		# GSM: (flag, cid, mcc, mnc, lac, arfcn, bsic, rssi)
+		for cell in info[0]:
+			cells.append((cell[0], cell[2], cell[3], cell[4], cell[1], cell[7]))
+		# UMTS: (flag, cid, lcid, mcc, mnc, lac, uarfcn, psc, rssi)
+		for cell in info[1]:
+			cells.append((cell[0], cell[3], cell[4], cell[5], cell[1], cell[8]))
+		# LTE: (flag, cid, mcc, mnc, pci, tac, earfcn, rssi, ...)
+		for cell in info[2]:
+			cells.append((cell[0], cell[2], cell[3], cell[5], cell[1], cell[7]))
+		# Serving cell (flag 0) first, then neighbours by signal
+		cells.sort(key=lambda c: (c[0] != 0, -c[5]))
+		cells = cells[:self.max_cells]
+		packed = bytearray(1 + len(cells) * CELL_RECORD_SIZE)
+		packed[0] = len(cells)
+		offset = 1
+		for flag, mcc, mnc, lac, cid, rssi in cells:
+			ustruct.pack_into('>HHHIB', packed, offset, mcc & 0xFFFF, mnc & 0xFFFF, lac & 0xFFFF, cid & 0xFFFFFFFF, min(abs(rssi), 0xFF))
+			offset += CELL_RECORD_SIZE
+		self.cells = bytes(packed) if cells else None
+		self.cells_time = utime.time()
+		return self.cells
+
+
+def cells_size(cells):
+	"""Get number of cells in packed cell list"""
+	return cells[0] if cells else 0
+
+
+def decode_cells(cells):
+	"""Decode packed cell list to list of dicts"""
+	result = []
+	for i in range(cells_size(cells)):
+		mcc, mnc, lac, cid, rssi = ustruct.unpack_from('>HHHIB', cells, 1 + i * CELL_RECORD_SIZE)
+		result.append({'mcc': mcc, 'mnc': mnc, 'lac': lac, 'cid': cid, 'rssi': -rssi})
+	return result
@@ -0,0 +1,437 @@
+import utime
+from usr.status import parse_fields, SMS_LIMIT
+from usr.metrics import metrics
+from usr.memory import memory
+from usr.energy import energy
+from usr.logger import logger, get_logger, parse_level, LEVELS, DEBUG
+
+
+log = get_logger('commands')
+
+# Backup server entries in config 'servers'
+MAX_BACKUPS = 3
+
+
+class CommandError(Exception):
+	"""Invalid command or parameters, aborts the whole message"""
+	pass
+
+
+class CommandIgnored(CommandError):
+	"""Aborts the whole message without reply"""
+	pass
+
+
+class Transaction:
+	"""Changes collected from one message, applied together on commit"""
+
+	def __init__(self, config):
+		self.config = config
+		self.changes = {}
+		self.events = []
+		self.actions = []
+		self.replies = []
+		self.status_fields = None
+
+	def get(self, key, default=None):
+		"""Get value including pending changes"""
+		if key in self.changes:
+			return self.changes[key]
+		return self.config.get(key, default)
+
+	def set(self, key, value):
+		"""Stage configuration change"""
+		self.changes[key] = value
+
+	def event(self, name):
+		"""Stage event applied on commit: config callback or LOCAL_EVENTS reset (fired once per message)"""
+		if name not in self.events:
+			self.events.append(name)
+
+	def action(self, name):
+		"""Stage action run after reply was sent (poweroff, reset)"""
+		if name not in self.actions:
+			self.actions.append(name)
+
+	def reply(self, text):
+		"""Add line to consolidated reply"""
+		self.replies.append(text)
+
+
+def _parse_host_port(host_port, default_port):
+	"""Split host[:port]"""
+	if ':' in host_port:
+		host, port = host_port.split(':', 1)
+		try:
+			return host, int(port)
+		except ValueError:
+			raise CommandError('Invalid port: ' + port)
+	return host_port, default_port
+
+
+def _parse_int(value, name, low, high):
+	"""Parse integer in range"""
+	try:
+		number = int(value)
+	except ValueError:
+		raise CommandError('Invalid {} value'.format(name))
+	if not low <= number <= high:
+		raise CommandError('Invalid {} ({}-{})'.format(name, low, high))
+	return number
+
+
+def cmd_apn(tx, params):
+	"""APN,name[,user,password]"""
+	apn_name = params[0]
+	apn_user = params[1] if len(params) > 1 else ''
+	apn_password = params[2] if len(params) > 2 else ''
+	tx.set('apn', {'name': apn_name, 'user': apn_user, 'password': apn_password})
+	tx.event('apn_changed')
+	tx.reply('APN set: ' + apn_name)
+
+
+def _parse_server(params):
+	"""Server config entry from protocol,host:port[,path] or protocol://host:port/path"""
+	protocol = params[0].upper()
+	host_port = params[1]
+	if '://' in host_port:
+		parts = host_port.split('://', 1)
+		protocol = parts[0].upper()
+		host_port = parts[1]
+		if '/' in host_port:
+			host_port, path = host_port.split('/', 1)
+			path = '/' + path
+		else:
+			path = '/api/location'
+	else:
+		path = params[2] if len(params) > 2 else '/api/location'
+	host, port = _parse_host_port(host_port, 5023 if protocol == 'GT06' else 80)
+	return {'protocol': protocol, 'host': host, 'port': port, 'path': path}
+
+
+def cmd_server(tx, params):
+	"""SERVER,protocol,host:port[,path]"""
+	server = _parse_server(params)
+	tx.set('server', server)
+	tx.event('server_changed')
+	tx.reply('Server: {}://{}:{}'.format(server['protocol'], server['host'], server['port']))
+
+
+def cmd_backup(tx, params):
+	"""BACKUP[,protocol,host:port[,path]|CLEAR|DUP,1/0]"""
+	action = params[0].upper() if params else ''
+	servers = list(tx.get('servers') or [])
+	if action == 'CLEAR' and len(params) == 1:
+		servers = []
+		tx.set('servers', servers)
+		tx.event('server_changed')
+	elif action == 'DUP' and len(params) == 2:
+		tx.set('duplicate_events', _parse_int(params[1], 'value', 0, 1) == 1)
+		tx.event('server_changed')
+	elif len(params) >= 2:
+		if len(servers) >= MAX_BACKUPS:
+			raise CommandError('Too many backup servers ({})'.format(MAX_BACKUPS))
+		servers.append(_parse_server(params))
+		tx.set('servers', servers)
+		tx.event('server_changed')
+	elif params:
+		raise CommandError('Usage: BACKUP[,protocol,host:port[,path]|CLEAR|DUP,1/0]')
+	text = ' '.join('{}://{}:{}'.format(s['protocol'], s['host'], s['port']) for s in servers) or 'none'
+	tx.reply('Backup: {}{}'.format(text, ' DUP' if tx.get('duplicate_events') else ''))
+
+
+def cmd_wifi_server(tx, params):
+	"""WIFISERVER,host:port[,path]"""
+	host, port = _parse_host_port(params[0], 80)
+	path = params[1] if len(params) > 1 else '/api/locate'
+	tx.set('wifi_server', {'host': host, 'port': port, 'path': path})
+	tx.event('wifi_server_changed')
+	tx.reply('WiFi server: {}:{}'.format(host, port))
+
+
+def cmd_wifi_enable(tx, params):
+	"""WIFIENABLE[,1/0]"""
+	if params:
+		enable = _parse_int(params[0], 'value', 0, 1) == 1
+		tx.set('wifi_location_enabled', enable)
+		tx.event('wifi_changed')
+	else:
+		enable = tx.get('wifi_location_enabled', False)
+	tx.reply('WiFi location ' + ('enabled' if enable else 'disabled'))
+
+
+def cmd_add_number(tx, params):
+	"""ADDNUMBER,phone"""
+	new_number = params[0]
+	sms_numbers = tx.get('sms_numbers', [])
+	if new_number in sms_numbers:
+		tx.reply('Number already exists')
+		return
+	tx.set('sms_numbers', sms_numbers + [new_number])
+	tx.reply('Number added: ' + new_number)
+
+
+def cmd_del_number(tx, params):
+	"""DELNUMBER,phone"""
+	del_number = params[0]
+	sms_numbers = tx.get('sms_numbers', [])
+	if del_number not in sms_numbers:
+		tx.reply('Number not found')
+		return
+	tx.set('sms_numbers', [n for n in sms_numbers if n != del_number])
+	tx.reply('Number removed: ' + del_number)
+
+
+def cmd_interval(tx, params):
+	"""INTERVAL[,seconds]"""
+	if params:
+		interval = _parse_int(params[0], 'interval', 1, 600)
+		tx.set('update_interval', interval)
+		tx.event('interval_changed')
+		tx.reply('Interval: {}s'.format(interval))
+	else:
+		tx.reply('Current interval: {}s'.format(tx.get('update_interval', 10)))
+
+
+def cmd_sleep(tx, params):
+	"""SLEEP[,minutes]"""
+	if params:
+		minutes = _parse_int(params[0], 'timeout', 1, 1440)
+		tx.set('sleep_timeout', minutes * 60)
+		tx.event('sleep_changed')
+	else:
+		minutes = tx.get('sleep_timeout', 1800) // 60
+	tx.reply('Sleep timeout: {}min'.format(minutes))
+
+
+def _burst_text(points, interval):
+	"""Burst settings as reply text"""
+	if not points and not interval:
+		return 'Burst off'
+	parts = []
+	if points:
+		parts.append('{} points'.format(points))
+	if interval:
+		parts.append('{}min'.format(interval // 60))
+	return 'Burst: ' + ' / '.join(parts)
+
+
+def cmd_burst(tx, params):
+	"""BURST[,points[,minutes]|OFF]"""
+	if params and params[0].upper() == 'OFF':
+		if len(params) > 1:
+			raise CommandError('Usage: BURST[,points[,minutes]|OFF]')
+		points, minutes = 0, 0
+	elif params:
+		points = _parse_int(params[0], 'points', 0, 500)
+		minutes = _parse_int(params[1], 'minutes', 0, 1440) if len(params) > 1 else 0
+	if params:
+		tx.set('burst_points', points)
+		tx.set('burst_interval', minutes * 60)
+		tx.event('burst_changed')
+	tx.reply(_burst_text(tx.get('burst_points', 0), tx.get('burst_interval', 0)))
+
+
+def cmd_status(tx, params):
+	"""STATUS[,POS|PWR|NET|SYS|ALL]"""
+	fields = parse_fields(params[0] if params else 'ALL')
+	if fields is None:
+		raise CommandError('Usage: STATUS[,POS|PWR|NET|SYS|ALL]')
+	tx.status_fields = fields
+	tx.event('get_status')
+
+
+def cmd_metrics(tx, params):
+	"""METRICS[,RESET]"""
+	if params:
+		if params[0].upper() != 'RESET':
+			raise CommandError('Usage: METRICS[,RESET]')
+		tx.event('metrics_reset')
+		tx.reply('Metrics reset')
+		return
+	tx.reply(metrics.summary())
+
+
+def cmd_memory(tx, params):
+	"""MEMORY"""
+	tx.reply(memory.summary())
+
+
+def cmd_energy(tx, params):
+	"""ENERGY"""
+	tx.reply(energy.summary())
+
+
+def _parse_level(value):
+	"""Parse log level name (DEBUG/INFO/WARN/ERROR/OFF or first letter)"""
+	level = parse_level(value)
+	if level is None:
+		raise CommandError('Invalid level: ' + value)
+	return LEVELS[level]
+
+
+def cmd_log(tx, params):
+	"""LOG[,level|SEND|CLEAR|LEVEL,[module,]level|CONSOLE,level|SPILL,1/0]"""
+	action = params[0].upper() if params else ''
+	if not action or (len(params) == 1 and parse_level(action) is not None):
+		tx.reply(logger.summary(level=parse_level(action) if action else DEBUG))
+	elif action == 'SEND':
+		tx.event('log_upload')
+		tx.reply('Log upload: {} entries'.format(logger.entries))
+	elif action == 'CLEAR':
+		tx.event('log_clear')
+		tx.reply('Log cleared')
+	elif action == 'LEVEL' and len(params) == 2:
+		tx.set('log_level', _parse_level(params[1]))
+		tx.event('log_changed')
+		tx.reply('Log level: ' + tx.get('log_level'))
+	elif action == 'LEVEL' and len(params) == 3:
+		module = params[1].lower()
+		levels = dict(tx.get('log_levels') or {})
+		if params[2].upper() == 'DEFAULT':
+			levels.pop(module, None)
+		else:
+			levels[module] = _parse_level(params[2])
+		tx.set('log_levels', levels)
+		tx.event('log_changed')
+		tx.reply('Log level {}: {}'.format(module, levels.get(module, 'default')))
+	elif action == 'CONSOLE' and len(params) == 2:
+		tx.set('log_console', _parse_level(params[1]))
+		tx.event('log_changed')
+		tx.reply('Log console: ' + tx.get('log_console'))
+	elif action == 'SPILL' and len(params) == 2:
+		tx.set('log_spill', _parse_int(params[1], 'value', 0, 1) == 1)
+		tx.event('log_changed')
+		tx.reply('Log spill ' + ('enabled' if tx.get('log_spill') else 'disabled'))
+	else:
+		raise CommandError('Usage: LOG[,level|SEND|CLEAR|LEVEL,[module,]level|CONSOLE,level|SPILL,1/0]')
+
+
+def cmd_poweroff(tx, params):
+	"""POWEROFF"""
+	tx.action('poweroff')
+	tx.reply('Powering off...')
+
+
+# Events applied to module state by the commit itself instead of the config callback
+LOCAL_EVENTS = {'metrics_reset': metrics.reset, 'log_clear': logger.clear}
+
+# name: (handler, min params, max params, authorization required, usage, allowed from server)
+COMMANDS = {
+	'APN': (cmd_apn, 1, 3, True, 'APN,name[,user,password]', True),
+	'SERVER': (cmd_server, 2, 3, True, 'SERVER,protocol,host:port[,path]', True),
+	'BACKUP': (cmd_backup, 0, 3, True, 'BACKUP[,protocol,host:port[,path]|CLEAR|DUP,1/0]', True),
+	'WIFISERVER': (cmd_wifi_server, 1, 2, True, 'WIFISERVER,host:port[,path]', True),
+	'WIFIENABLE': (cmd_wifi_enable, 0, 1, True, 'WIFIENABLE[,1/0]', True),
+	'ADDNUMBER': (cmd_add_number, 1, 1, True, 'ADDNUMBER,phone', False),
+	'DELNUMBER': (cmd_del_number, 1, 1, True, 'DELNUMBER,phone', False),
+	'INTERVAL': (cmd_interval, 0, 1, True, 'INTERVAL[,seconds]', True),
+	'SLEEP': (cmd_sleep, 0, 1, True, 'SLEEP[,minutes]', True),
+	'BURST': (cmd_burst, 0, 2, True, 'BURST[,points[,minutes]|OFF]', True),
+	'STATUS': (cmd_status, 0, 1, True, 'STATUS[,POS|PWR|NET|SYS|ALL]', True),
+	'METRICS': (cmd_metrics, 0, 1, True, 'METRICS[,RESET]', True),
+	'MEMORY': (cmd_memory, 0, 0, True, 'MEMORY', True),
+	'ENERGY': (cmd_energy, 0, 0, True, 'ENERGY', True),
+	'LOG': (cmd_log, 0, 3, True, 'LOG[,level|SEND|CLEAR|LEVEL,[module,]level|CONSOLE,level|SPILL,1/0]', True),
+	'POWEROFF': (cmd_poweroff, 0, 0, True, 'POWEROFF', False)
+}
+
+
+class CommandRegistry:
+	"""Table-driven command parser and executor with transactional apply"""
+
+	def __init__(self, config, imei, callback=None):
+		self.config = config
+		self.imei = imei
+		self.callback = callback
+		self.commands = dict(COMMANDS)
+		self.register('RESET', self._cmd_reset, 1, 1, False, 'RESET,IMEI')
+
+	def register(self, name, handler, min_params=0, max_params=0, auth=True, usage='', remote=False):
+		"""Register command handler(tx, params), remote: allowed over data channel"""
+		self.commands[name.upper()] = (handler, min_params, max_params, auth, usage or name.upper(), remote)
+
+	def _cmd_reset(self, tx, params):
+		"""RESET,IMEI (allowed from any number)"""
+		if params[0].strip() != self.imei:
+			log.warn('Invalid IMEI for reset')
+			raise CommandIgnored('Invalid IMEI')
+		tx.action('reset')
+		tx.reply('Device reset OK')
+
+	def parse(self, text):
+		"""Split message into (command, params) list"""
+		result = []
+		for part in text.split(';'):
+			part = part.strip()
+			if not part:
+				continue
+			fields = [p.strip() for p in part.split(',')]
+			result.append((fields[0].upper(), fields[1:]))
+		return result
+
+	def execute(self, text, authorize, respond, remote=False):
+		"""Validate and run all commands of message, apply with a single save.
+		authorize() is called once if any command needs authorization,
+		respond(text) sends the consolidated reply, remote: message came from server."""
+		commands = self.parse(text)
+		if not commands:
+			return False
+		tx = Transaction(self.config)
+		authorized = None
+		try:
+			for name, params in commands:
+				entry = self.commands.get(name)
+				if entry is None or entry[3]:
+					if authorized is None:
+						authorized = authorize()
+					if not authorized:
+						log.warn('Unauthorized command: {}', name)
+						return False
+				if entry is None:
+					raise CommandError('Unknown command: ' + name)
+				handler, min_params, max_params, auth, usage, allow_remote = entry
+				if remote and not allow_remote:
+					raise CommandError('Not allowed from server: ' + name)
+				if not min_params <= len(params) <= max_params:
+					raise CommandError('Usage: ' + usage)
+				handler(tx, params)
+		except CommandIgnored:
+			return False
+		except CommandError as e:
+			respond('Error: ' + str(e))
+			return False
+		self._commit(tx)
+		if 'get_status' in tx.events and self.callback:
+			# Status gets what the other replies and their separators leave of one SMS segment
+			budget = SMS_LIMIT - sum(len(reply) + 1 for reply in tx.replies)
+			status = self.callback('get_status', tx.status_fields, budget) if budget > 0 else None
+			if status:
+				tx.reply(status)
+		if tx.replies:
+			respond('\n'.join(tx.replies)[:SMS_LIMIT])
+		if tx.actions:
+			utime.sleep(2)
+			for action in tx.actions:
+				if self.callback:
+					self.callback(action)
+		return True
+
+	def _commit(self, tx):
+		"""Apply staged changes with one save and one reinit"""
+		if tx.changes:
+			self.config.update(**tx.changes)
+			self.config.flush(force=True)
+			log.info('Config updated: {}', ', '.join(tx.changes.keys()))
+		for event in tx.events:
+			if event in LOCAL_EVENTS:
+				LOCAL_EVENTS[event]()
+		if not self.callback:
+			return
+		for event in tx.events:
+			if event == 'get_status' or event in LOCAL_EVENTS:
+				continue
+			if event == 'server_changed' and 'apn_changed' in tx.events:
+				# Network reinit also recreates protocol
+				continue
+			self.callback(event)
@@ -1,71 +1,174 @@
-import ujson
-import uos
-from misc import Power
-import modem
-
-
-CONFIG_FILE = '/usr/tracker_config.json'
-DEFAULT_CONFIG = {
-	'apn': {'name': 'internet', 'user': '', 'password': ''},
-	'server': {'protocol': 'GT06', 'host': '', 'port': 0, 'path': '/api/location'},
-	'wifi_server': None,
-	'wifi_location_enabled': False,
-	'update_interval': 10,
-	'sleep_timeout': 1800,
-	'buffer_enabled': True,
-	'sms_numbers': [],
-	'imei': ''
-}
-
-
-class Config:
-	"""Configuration manager for GPS Tracker"""
-
-
-	def __init__(self):
-		self.config = self._load()
-		if not self.config.get('imei'):
-			self.config['imei'] = modem.getDevImei()
-			self.save()
-		print('Configuration loaded')
-
-	def _load(self):
-		"""Load configuration from file"""
-		try:
-			if CONFIG_FILE in uos.listdir('/usr'):
-				with open(CONFIG_FILE, 'r') as f:
-					config = ujson.load(f)
-					for key, value in DEFAULT_CONFIG.items():
-						if key not in config:
-							config[key] = value
-					return config
-		except Exception as e:
-			print('Config load error:', e)
-		return DEFAULT_CONFIG.copy()
-
-	def save(self):
-		"""Save configuration to file"""
-		try:
-			with open(CONFIG_FILE, 'w') as f:
-				ujson.dump(self.config, f)
-			print('Configuration saved')
-			return True
-		except Exception as e:
-			print('Config save error:', e)
-			return False
-
-	def get(self, key, default=None):
-		"""Get configuration value"""
-		return self.config.get(key, default)
-
-	def update(self, **kwargs):
-		"""Update configuration"""
-		for key, value in kwargs.items():
-			self.config[key] = value
-		return self.save()
-
-	def reset(self):
-		"""Reset to default configuration"""
-		self.config = DEFAULT_CONFIG.copy()
-		self.config['imei'] = modem.getDevImei()
-		return self.save()
+import ujson
+import uos
+import utime
+import _thread
+from misc import Power
+import modem
+from usr.logger import get_logger
+
+
+log = get_logger('config')
+
+CONFIG_DIR = '/usr'
+CONFIG_FILE = '/usr/tracker_config.json'
+CONFIG_TEMP = '/usr/tracker_config.tmp'
+CONFIG_BACKUP = '/usr/tracker_config.bak'
+# Seconds to coalesce updates before writing to flash
+SAVE_DELAY = 5
+DEFAULT_CONFIG = {
+	'apn': {'name': 'internet', 'user': '', 'password': ''},
+	'server': {'protocol': 'GT06', 'host': '', 'port': 0, 'path': '/api/location'},
+	'servers': [],
+	'duplicate_events': False,
+	'wifi_server': None,
+	'wifi_location_enabled': False,
+	'wifi_max_aps': 8,
+	'wifi_max_age': 300,
+	'lbs_enabled': True,
+	'wifi_learn_interval': 600,
+	'bssid_cache_buckets': 64,
+	'update_interval': 10,
+	'sleep_timeout': 1800,
+	'wake_interval': 3600,
+	'motion_pin': None,
+	'buffer_enabled': True,
+	'led_eco_timeout': 0,
+	'status_interval': 3600,
+	'burst_points': 0,
+	'burst_interval': 0,
+	'http_batch': False,
+	'remote_config_enabled': True,
+	'energy_currents': None,
+	'rrc_tail': 10,
+	'log_level': 'INFO',
+	'log_levels': {},
+	'log_console': 'WARN',
+	'log_spill': False,
+	'sms_numbers': [],
+	'imei': ''
+}
+
+
+def _checksum(data):
+	"""FNV-1a 32-bit checksum of bytes"""
+	h = 0x811C9DC5
+	for byte in data:
+		h = ((h ^ byte) * 0x01000193) & 0xFFFFFFFF
+	return h
+
+
+class Config:
+	"""Configuration manager for GPS Tracker"""
+
+	def __init__(self):
+		self.lock = _thread.allocate_lock()
+		self.dirty = False
+		self.dirty_since = 0
+		self.save_count = 0
+		self.config = self._load()
+		self._refresh()
+		if not self.config.get('imei'):
+			self.config['imei'] = modem.getDevImei()
+			self.save()
+		log.info('Configuration loaded')
+
+	def _defaults(self):
+		"""Deep copy of default configuration"""
+		return ujson.loads(ujson.dumps(DEFAULT_CONFIG))
+
+	def _load(self):
+		"""Load configuration, falling back to temp and backup copies"""
+		files = uos.listdir(CONFIG_DIR)
+		for path in (CONFIG_FILE, CONFIG_TEMP, CONFIG_BACKUP):
+			if path.split('/')[-1] not in files:
+				continue
+			config = self._read(path)
+			if config is not None:
+				if path != CONFIG_FILE:
+					log.warn('Config restored from {}', path)
+				defaults = self._defaults()
+				for key, value in defaults.items():
+					if key not in config:
+						config[key] = value
+				return config
+		log.warn('Config not found or corrupted, using defaults')
+		return self._defaults()
+
+	def _read(self, path):
+		"""Read and verify config file, return None if corrupted"""
+		try:
+			with open(path, 'r') as f:
+				content = f.read()
+			if content.startswith('{'):
+				# Legacy file without checksum
+				return ujson.loads(content)
+			crc, body = content.split('\n', 1)
+			if int(crc, 16) != _checksum(body.encode()):
+				log.error('Config checksum mismatch: {}', path)
+				return None
+			return ujson.loads(body)
+		except Exception as e:
+			log.error('Config load error: {} {}', path, e)
+			return None
+
+	def _refresh(self):
+		"""Update typed accessors used on hot paths"""
+		config = self.config
+		self.update_interval = config.get('update_interval', 10)
+		self.sleep_timeout = config.get('sleep_timeout', 1800)
+		self.wake_interval = config.get('wake_interval', 3600)
+		self.buffer_enabled = config.get('buffer_enabled', True)
+		self.wifi_location_enabled = config.get('wifi_location_enabled', False)
+		self.wifi_learn_interval = config.get('wifi_learn_interval', 600)
+		self.lbs_enabled = config.get('lbs_enabled', True)
+		self.status_interval = config.get('status_interval', 3600)
+
+	def save(self):
+		"""Save configuration to flash now (temp file, then rename, keeping backup)"""
+		with self.lock:
+			try:
+				body = ujson.dumps(self.config)
+				with open(CONFIG_TEMP, 'w') as f:
+					f.write('{:08x}\n'.format(_checksum(body.encode())))
+					f.write(body)
+				files = uos.listdir(CONFIG_DIR)
+				if CONFIG_BACKUP.split('/')[-1] in files:
+					uos.remove(CONFIG_BACKUP)
+				if CONFIG_FILE.split('/')[-1] in files:
+					uos.rename(CONFIG_FILE, CONFIG_BACKUP)
+				uos.rename(CONFIG_TEMP, CONFIG_FILE)
+				self.dirty = False
+				self.save_count += 1
+				log.info('Configuration saved')
+				return True
+			except Exception as e:
+				log.error('Config save error: {}', e)
+				return False
+
+	def flush(self, force=False):
+		"""Save pending changes once they have settled for SAVE_DELAY seconds"""
+		if self.dirty and (force or utime.time() - self.dirty_since >= SAVE_DELAY):
+			return self.save()
+		return False
+
+	def get(self, key, default=None):
+		"""Get configuration value"""
+		return self.config.get(key, default)
+
+	def update(self, **kwargs):
+		"""Update configuration, write to flash is deferred to flush()"""
+		with self.lock:
+			for key, value in kwargs.items():
+				self.config[key] = value
+			if not self.dirty:
+				self.dirty = True
+				self.dirty_since = utime.time()
+			self._refresh()
+		return True
+
+	def reset(self):
+		"""Reset to default configuration"""
+		self.config = self._defaults()
+		self.config['imei'] = modem.getDevImei()
+		self._refresh()
+		return self.save()
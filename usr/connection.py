@@ -0,0 +1,162 @@
+import urandom
+import usocket
+import utime
+from usr.logger import get_logger
+
+
+log = get_logger('link')
+
+# Failure classes
+DNS = 'dns'
+REFUSED = 'refused'
+TIMEOUT = 'timeout'
+LOGIN = 'login'
+PDP = 'pdp'
+SERVER = 'server'
+CLASSES = (DNS, REFUSED, TIMEOUT, LOGIN, PDP, SERVER)
+# Retry window per failure class as (first delay, maximum) in seconds, doubled per consecutive failure.
+# Timeouts keep the radio on for the whole socket timeout and a rejected login needs reconfiguration,
+# so both back off further; PDP loss is retried by reactivating the data call.
+BACKOFF = {
+	DNS: (30, 1800),
+	REFUSED: (30, 1800),
+	TIMEOUT: (60, 3600),
+	LOGIN: (300, 21600),
+	PDP: (30, 1800),
+	SERVER: (10, 900)
+}
+# lwIP errno values
+ENETUNREACH = 101
+ECONNRESET = 104
+ENOTCONN = 107
+ETIMEDOUT = 110
+ECONNREFUSED = 111
+EHOSTUNREACH = 113
+
+
+def classify(error, stage):
+	"""Failure class of exception raised during stage ('dns', 'connect', 'login' or 'send')"""
+	code = error.args[0] if isinstance(error, OSError) and error.args else None
+	if code == ENETUNREACH:
+		return PDP
+	if stage == DNS:
+		return DNS
+	if stage == LOGIN:
+		return LOGIN
+	if code == ECONNREFUSED:
+		return REFUSED
+	if code == ETIMEDOUT:
+		return TIMEOUT
+	return SERVER if stage == 'send' else TIMEOUT
+
+
+class ConnectionManager:
+	"""Retry windows for server connections: jittered exponential backoff per failure class and PDP state.
+	Outside the window records are only stored; the first attempt after it decides whether the backlog is sent."""
+
+	def __init__(self):
+		# None until network bring-up finished
+		self.pdp_up = None
+		self.failures = 0
+		self.last_class = None
+		self.retry_at = None
+		self.delay = 0
+		self.counts = dict((name, 0) for name in CLASSES)
+		self.addresses = {}
+		# reactivate() -> bool brings the data call back, on_ready() is called when PDP comes back after a loss
+		self.reactivate = None
+		self.on_ready = None
+
+	def ready(self):
+		"""Connection attempts allowed now (non-blocking)"""
+		if self.pdp_up is None:
+			return False
+		if self.retry_at is not None and utime.ticks_diff(utime.ticks_ms(), self.retry_at) < 0:
+			return False
+		return True
+
+	def prepare(self, force=False):
+		"""Called before an attempt: reactivate data call if it is down, False when the attempt has to wait.
+		force: attempt inside the backoff window while PDP is up (events, command replies)"""
+		if force and self.pdp_up:
+			return True
+		if not self.ready():
+			return False
+		if self.pdp_up:
+			return True
+		log.info('Reactivating data call')
+		if self.reactivate and self.reactivate():
+			self.pdp_changed(True)
+			return True
+		self.failure(PDP)
+		return False
+
+	def success(self):
+		"""Server reached, close backoff"""
+		if self.failures:
+			log.info('Server reachable after {} failures', self.failures)
+		self.failures = 0
+		self.last_class = None
+		self.retry_at = None
+		self.delay = 0
+
+	def failure(self, kind):
+		"""Record failed attempt of class kind, open store-only window until the next retry"""
+		if self.pdp_up is False:
+			kind = PDP
+		self.counts[kind] += 1
+		self.failures += 1
+		self.last_class = kind
+		base, maximum = BACKOFF[kind]
+		delay = min(base << min(self.failures - 1, 16), maximum)
+		# Equal jitter: half fixed, half random, so devices behind the same outage spread out
+		self.delay = delay // 2 + urandom.randint(0, delay // 2)
+		self.retry_at = utime.ticks_add(utime.ticks_ms(), self.delay * 1000)
+		log.warn('{} failure #{}, store-only for {}s', kind, self.failures, self.delay)
+
+	def pdp_changed(self, active):
+		"""PDP context state from network bring-up or data call callback"""
+		previous = self.pdp_up
+		self.pdp_up = active
+		if active:
+			if previous is not True:
+				self.success()
+				if previous is False and self.on_ready:
+					self.on_ready()
+		elif previous is not False:
+			self.failures = 0
+			self.failure(PDP)
+
+	def resolve(self, host, port):
+		"""Resolve server address, falling back to the last good address when DNS fails"""
+		try:
+			addr = usocket.getaddrinfo(host, port)[0][-1]
+		except Exception:
+			addr = self.addresses.get((host, port))
+			if addr is None:
+				raise
+			log.warn('DNS failed, using cached address of {}', host)
+			return addr
+		self.addresses[(host, port)] = addr
+		return addr
+
+	def retry_in(self):
+		"""Seconds until the retry window opens, 0 if open"""
+		if self.retry_at is None:
+			return 0
+		return max(utime.ticks_diff(self.retry_at, utime.ticks_ms()), 0) // 1000
+
+	def snapshot(self):
+		"""State, consecutive failures, last failure class, retry time and failures per class"""
+		if self.pdp_up is None:
+			state = 'init'
+		elif not self.pdp_up:
+			state = 'pdp_down'
+		elif self.retry_in():
+			state = 'backoff'
+		else:
+			state = 'ready'
+		return {'state': state, 'failures': self.failures, 'last': self.last_class, 'retry_in': self.retry_in(), 'counts': dict(self.counts)}
+
+
+link = ConnectionManager()
@@ -1,43 +1,111 @@
-import ujson
-import gc
-
-
-class DataBuffer:
-	"""Data buffer for offline storage"""
-
-	def __init__(self, max_memory_percent=10):
-		self.buffer = []
-		self.max_memory_percent = max_memory_percent
-
-	def add(self, data):
-		"""Add data to buffer"""
-		if self._check_memory():
-			self.buffer.append(data)
-			return True
-		return False
-
-	def get_all(self):
-		"""Get all buffered data"""
-		return self.buffer.copy()
-
-	def clear(self):
-		"""Clear buffer"""
-		self.buffer.clear()
-		gc.collect()
-
-	def remove(self, count):
-		"""Remove first count records"""
-		self.buffer = self.buffer[count:]
-		gc.collect()
-
-	def size(self):
-		"""Get buffer size"""
-		return len(self.buffer)
-
-	def _check_memory(self):
-		"""Check available memory"""
-		gc.collect()
-		free = gc.mem_free()
-		total = gc.mem_free() + gc.mem_alloc()
-		free_percent = (free / total) * 100
-		return free_percent >= self.max_memory_percent
+import _thread
+import ujson
+import ubinascii
+import uos
+from usr.metrics import metrics
+from usr.memory import memory
+from usr.location import LocationFix, fixes
+from usr.logger import get_logger
+
+
+log = get_logger('buffer')
+
+BUFFER_FILE = '/usr/tracker_buffer.json'
+# Record fields holding packed bytes, hex-encoded on flash
+BINARY_FIELDS = ('wifi', 'cells', 'status', 'metrics', 'memory', 'log')
+
+
+class DataBuffer:
+	"""Data buffer for offline storage"""
+
+	def __init__(self, max_memory_percent=10):
+		self.buffer = []
+		# Records are added by the sampling threads and peeked and removed by the uplink worker
+		self.lock = _thread.allocate_lock()
+		self.max_memory_percent = max_memory_percent
+		self.load_from_flash()
+
+	def add(self, data):
+		"""Add data to buffer"""
+		if self._check_memory():
+			with self.lock:
+				self.buffer.append(data)
+			metrics.incr('buffer_add')
+			return True
+		metrics.incr('buffer_drop')
+		return False
+
+	def get_all(self):
+		"""Get all buffered data"""
+		with self.lock:
+			return self.buffer.copy()
+
+	def peek(self, count):
+		"""Get first count records without copying the rest"""
+		with self.lock:
+			return self.buffer[:count]
+
+	def clear(self):
+		"""Clear buffer"""
+		with self.lock:
+			self.buffer.clear()
+
+	def remove(self, count):
+		"""Remove first count records; records added meanwhile stay"""
+		with self.lock:
+			del self.buffer[:count]
+
+	def size(self):
+		"""Get buffer size"""
+		return len(self.buffer)
+
+	def save_to_flash(self):
+		"""Write buffered records to flash (one JSON record per line)"""
+		with self.lock:
+			records = self.buffer[:]
+		try:
+			with open(BUFFER_FILE, 'w') as f:
+				for data in records:
+					record = data.to_dict() if isinstance(data, LocationFix) else data.copy()
+					for key in BINARY_FIELDS:
+						if record.get(key):
+							record[key] = ubinascii.hexlify(record[key]).decode()
+					f.write(ujson.dumps(record))
+					f.write('\n')
+			log.info('Buffer saved to flash: {} records', len(records))
+			return True
+		except Exception as e:
+			log.error('Buffer save error: {}', e)
+			return False
+
+	def load_from_flash(self):
+		"""Restore records saved before power down and remove the file"""
+		try:
+			if BUFFER_FILE.split('/')[-1] not in uos.listdir('/usr'):
+				return 0
+			count = 0
+			with open(BUFFER_FILE, 'r') as f:
+				for line in f:
+					line = line.strip()
+					if not line:
+						continue
+					record = ujson.loads(line)
+					for key in BINARY_FIELDS:
+						if record.get(key):
+							record[key] = ubinascii.unhexlify(record[key])
+					if 'latitude' in record:
+						fix = fixes.acquire()
+						fix.update(record)
+						record = fix
+					self.buffer.append(record)
+					count += 1
+			uos.remove(BUFFER_FILE)
+			log.info('Buffer restored from flash: {} records', count)
+			return count
+		except Exception as e:
+			log.error('Buffer load error: {}', e)
+			return 0
+
+	def _check_memory(self):
+		"""Check available memory (collects only when low)"""
+		return memory.ensure_free(self.max_memory_percent)
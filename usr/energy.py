@@ -0,0 +1,107 @@
+import _thread
+import utime
+
+
+# Accounted components in report order; 'sleep' is elapsed time with the CPU not awake
+COMPONENTS = ('tx', 'rx', 'rrc_tail', 'gnss', 'wifi', 'led', 'cpu', 'sleep')
+# Default current draw per active component in mA (led: per lit LED), overridden by config energy_currents
+DEFAULT_CURRENTS = {'tx': 220.0, 'rx': 60.0, 'rrc_tail': 35.0, 'gnss': 22.0, 'wifi': 50.0, 'led': 4.0, 'cpu': 28.0, 'sleep': 1.5}
+# Seconds the modem stays in RRC connected state after the last transfer
+RRC_TAIL = 10
+
+
+class EnergyLedger:
+	"""Active time per component, converted to charge with configured currents"""
+
+	def __init__(self):
+		self.index = dict((name, i) for i, name in enumerate(COMPONENTS))
+		self.active_ms = [0] * len(COMPONENTS)
+		# Number of active units per component (LEDs lit, 0/1 for the rest)
+		self.count = [0] * len(COMPONENTS)
+		self.count[self.index['cpu']] = 1
+		self.elapsed_ms = 0
+		self.folded = utime.ticks_ms()
+		self.tail_start = None
+		self.currents = dict(DEFAULT_CURRENTS)
+		self.tail_ms = RRC_TAIL * 1000
+		self.lock = _thread.allocate_lock()
+
+	def configure(self, currents=None, tail=RRC_TAIL):
+		"""Set current figures (mA per component) and RRC tail seconds"""
+		if currents:
+			for name, value in currents.items():
+				if name in self.index:
+					self.currents[name] = float(value)
+		self.tail_ms = tail * 1000
+
+	def _fold(self, now):
+		"""Accumulate time of active components up to now"""
+		elapsed = utime.ticks_diff(now, self.folded)
+		if elapsed <= 0:
+			return
+		self.folded = now
+		self.elapsed_ms += elapsed
+		for i in range(len(COMPONENTS)):
+			if self.count[i]:
+				self.active_ms[i] += self.count[i] * elapsed
+
+	def active(self, name, count=1):
+		"""Set number of active units of component (0 switches it off)"""
+		with self.lock:
+			self._fold(utime.ticks_ms())
+			self.count[self.index[name]] = count
+
+	def radio(self, name, start):
+		"""Account modem time since ticks_ms() value start as 'tx' or 'rx'; the RRC tail restarts after it"""
+		with self.lock:
+			now = utime.ticks_ms()
+			self._fold(now)
+			if self.tail_start is not None:
+				gap = utime.ticks_diff(start, self.tail_start)
+				self.active_ms[self.index['rrc_tail']] += min(max(gap, 0), self.tail_ms)
+			self.active_ms[self.index[name]] += max(utime.ticks_diff(now, start), 0)
+			self.tail_start = now
+
+	def sample(self):
+		"""Accumulate running components, call periodically (keeps tick differences short)"""
+		with self.lock:
+			self._fold(utime.ticks_ms())
+
+	def snapshot(self):
+		"""Seconds and mAh per component, total mAh and mAh/day projection"""
+		with self.lock:
+			now = utime.ticks_ms()
+			self._fold(now)
+			active = list(self.active_ms)
+			elapsed = self.elapsed_ms
+			if self.tail_start is not None:
+				active[self.index['rrc_tail']] += min(utime.ticks_diff(now, self.tail_start), self.tail_ms)
+		active[self.index['sleep']] = max(elapsed - active[self.index['cpu']], 0)
+		components = {}
+		total = 0.0
+		for i in range(len(COMPONENTS)):
+			mah = active[i] * self.currents[COMPONENTS[i]] / 3600000.0
+			total += mah
+			components[COMPONENTS[i]] = {'s': active[i] // 1000, 'mah': round(mah, 3)}
+		return {
+			'elapsed_s': elapsed // 1000,
+			'mah': round(total, 2),
+			'mah_day': round(total * 86400000.0 / elapsed, 1) if elapsed else 0.0,
+			'components': components
+		}
+
+	def radio_time(self):
+		"""Seconds the modem was transferring or held connected by the RRC tail"""
+		components = self.snapshot()['components']
+		return components['tx']['s'] + components['rx']['s'] + components['rrc_tail']['s']
+
+	def summary(self):
+		"""One line for SMS: total, daily projection and mAh per component"""
+		s = self.snapshot()
+		parts = ['{:.1f}mAh {:.0f}/day'.format(s['mah'], s['mah_day'])]
+		for name in COMPONENTS:
+			parts.append('{}:{:.1f}'.format(name, s['components'][name]['mah']))
+		return ' '.join(parts)
+
+
+energy = EnergyLedger()
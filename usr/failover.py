@@ -0,0 +1,211 @@
+import utime
+from usr.connection import BACKOFF, PDP, SERVER
+from usr.logger import get_logger
+
+
+log = get_logger('failover')
+
+# Weight of the newest sample in the latency and success rate averages (1/n)
+SMOOTHING = 4
+# Endpoints scoring within this factor of the best are used in configured order (primary first)
+SCORE_RATIO = 2
+# Seconds between attempts to fail back to the primary while a backup is active
+FAILBACK_INTERVAL = 600
+
+
+class Endpoint:
+	"""Server endpoint health: smoothed connect latency and success rate, retry window after failures"""
+
+	def __init__(self, protocol, name):
+		self.protocol = protocol
+		self.name = name
+		# Smoothed connect latency in ms, None until the first connect
+		self.latency = None
+		self.rate = 1.0
+		self.failures = 0
+		self.retry_at = None
+
+	def available(self):
+		"""Outside the retry window"""
+		return self.retry_at is None or utime.ticks_diff(utime.ticks_ms(), self.retry_at) >= 0
+
+	def score(self):
+		"""Expected connect cost in ms (latency divided by success rate, lower is better), None while unknown"""
+		if self.latency is None:
+			return None
+		return self.latency / max(self.rate, 0.1)
+
+	def success(self, latency):
+		"""Record successful attempt, latency in ms if it connected"""
+		if latency is not None:
+			self.latency = latency if self.latency is None else self.latency + (latency - self.latency) / SMOOTHING
+		self.rate += (1.0 - self.rate) / SMOOTHING
+		self.failures = 0
+		self.retry_at = None
+
+	def failure(self, kind):
+		"""Record failed attempt of class kind, skip endpoint until its retry window opens"""
+		self.rate -= self.rate / SMOOTHING
+		self.failures += 1
+		base, maximum = BACKOFF.get(kind, BACKOFF[SERVER])
+		delay = min(base << min(self.failures - 1, 16), maximum)
+		self.retry_at = utime.ticks_add(utime.ticks_ms(), delay * 1000)
+		return delay
+
+
+class FailoverProtocol:
+	"""Sends through one of several server endpoints (GT06 or HTTP protocols, primary first).
+	Failed endpoints are skipped for a backoff window and the next one is tried in the same send; the
+	connection manager only backs off when all failed. Slow or unreliable endpoints lose preference
+	by score, the primary is retried periodically to fail back."""
+
+	def __init__(self, endpoints, duplicate_events=False):
+		self.endpoints = [Endpoint(protocol, name) for protocol, name in endpoints]
+		self.active = self.endpoints[0]
+		self.duplicate_events = duplicate_events
+		self.failure = None
+		self.last_failback = utime.ticks_ms()
+		self._command_callback = None
+
+	@property
+	def connected(self):
+		"""Active endpoint connected"""
+		return self.active.protocol.connected
+
+	@property
+	def command_callback(self):
+		return self._command_callback
+
+	@command_callback.setter
+	def command_callback(self, callback):
+		"""Server commands are accepted from every endpoint"""
+		self._command_callback = callback
+		for endpoint in self.endpoints:
+			endpoint.protocol.command_callback = callback
+
+	def connect(self):
+		"""Connect to the preferred reachable endpoint"""
+		return bool(self._deliver('connect')[1])
+
+	def disconnect(self):
+		"""Disconnect all endpoints"""
+		for endpoint in self.endpoints:
+			endpoint.protocol.disconnect()
+
+	def send_location(self, data):
+		"""Send record, critical events also to a second endpoint when duplicate delivery is enabled"""
+		endpoint, sent = self._deliver('send_location', data)
+		if sent and data.get('event') and self.duplicate_events:
+			self._duplicate(endpoint, data)
+		return bool(sent)
+
+	def send_batch(self, records):
+		"""Send records through the first endpoint that takes them, return number sent"""
+		return self._deliver('send_batch', records)[1] or 0
+
+	def _deliver(self, method, *args):
+		"""Call protocol method on endpoints in order of preference until one succeeds,
+		return (endpoint, result), endpoint is None if all failed"""
+		self.failure = None
+		result = None
+		for endpoint in self._candidates():
+			result = self._attempt(endpoint, method, *args)
+			if result:
+				if endpoint is not self.active:
+					if self._prefer(endpoint):
+						self._switch(endpoint)
+					else:
+						# Fail-back probe reached the primary, but it still scores worse than the active endpoint
+						log.debug('Probe of {} ok, score {}', endpoint.name, endpoint.score())
+						endpoint.protocol.disconnect()
+						if endpoint.protocol.connect_ms is None:
+							# Nothing measured (HTTP connect() opens no connection), probe again with the next send
+							self.last_failback = None
+				return endpoint, result
+			if self.failure == PDP:
+				# No data call, other endpoints would fail the same way
+				break
+		if self.failure is None:
+			# All endpoints inside their retry windows
+			self.failure = SERVER
+		return None, result
+
+	def _attempt(self, endpoint, method, *args):
+		"""Call method of endpoint protocol and update its health"""
+		protocol = endpoint.protocol
+		protocol.connect_ms = None
+		result = getattr(protocol, method)(*args)
+		if result:
+			endpoint.success(protocol.connect_ms)
+			return result
+		self.failure = protocol.failure or SERVER
+		if self.failure != PDP:
+			delay = endpoint.failure(self.failure)
+			log.warn('Endpoint {} {} failure, skipped for {}s', endpoint.name, self.failure, delay)
+		return result
+
+	def _candidates(self):
+		"""Available endpoints in order of preference: configured order among those scoring within SCORE_RATIO
+		of the best (unknown scores included), then the rest by score; the primary goes first when fail-back is due"""
+		available = [endpoint for endpoint in self.endpoints if endpoint.available()]
+		scores = [endpoint.score() for endpoint in available if endpoint.score() is not None]
+		best = min(scores) if scores else None
+		preferred = []
+		rest = []
+		for endpoint in available:
+			score = endpoint.score()
+			if best is None or score is None or score <= best * SCORE_RATIO:
+				preferred.append(endpoint)
+			else:
+				rest.append(endpoint)
+		rest.sort(key=lambda endpoint: endpoint.score())
+		ordered = preferred + rest
+		primary = self.endpoints[0]
+		if self.active is not primary and primary in ordered and (self.last_failback is None or utime.ticks_diff(utime.ticks_ms(), self.last_failback) >= FAILBACK_INTERVAL * 1000):
+			self.last_failback = utime.ticks_ms()
+			ordered.remove(primary)
+			ordered.insert(0, primary)
+		return ordered
+
+	def _prefer(self, endpoint):
+		"""Endpoint should replace the active one: active failed or endpoint scores within SCORE_RATIO of it"""
+		active = self.active
+		if not active.available():
+			return True
+		score = endpoint.score()
+		active_score = active.score()
+		return score is None or active_score is None or score <= active_score * SCORE_RATIO
+
+	def _switch(self, endpoint):
+		"""Make endpoint active, close the previous connection"""
+		previous = self.active
+		self.active = endpoint
+		self.last_failback = utime.ticks_ms()
+		previous.protocol.disconnect()
+		if endpoint is self.endpoints[0]:
+			log.info('Fail-back to {}', endpoint.name)
+		else:
+			log.warn('Failover from {} to {}', previous.name, endpoint.name)
+
+	def _duplicate(self, sent, data):
+		"""Send event to the best other endpoint once, without failover"""
+		for endpoint in self._candidates():
+			if endpoint is not sent:
+				if self._attempt(endpoint, 'send_location', data):
+					log.info('Event duplicated to {}', endpoint.name)
+				endpoint.protocol.disconnect()
+				return
+
+	def snapshot(self):
+		"""Active endpoint and health per endpoint"""
+		endpoints = {}
+		for endpoint in self.endpoints:
+			score = endpoint.score()
+			endpoints[endpoint.name] = {
+				'latency_ms': None if endpoint.latency is None else int(endpoint.latency),
+				'rate': round(endpoint.rate, 2),
+				'score': None if score is None else int(score),
+				'failures': endpoint.failures,
+				'available': endpoint.available()
+			}
+		return {'active': self.active.name, 'endpoints': endpoints}
@@ -1,219 +1,426 @@
-import usocket
-import ustruct
-import utime
-import modem
-from usr.led_controller import Led
-
-
-class GT06Protocol:
-	"""GT06 protocol implementation with WiFi extension"""
-
-	LOGIN = 0x01
-	LOCATION = 0x12
-	HEARTBEAT = 0x13
-	STATUS = 0x14
-	WIFI_LOCATION = 0x69
-
-	def __init__(self, host, port, leds):
-		self.host = host
-		self.port = port
-		self.leds = leds
-		self.socket = None
-		self.connected = False
-		self.serial_number = 1
-		self.imei = modem.getDevImei()
-		print('GT06 protocol initialized: {}:{}, IMEI: {}'.format(host, port, self.imei))
-		self.connect()
-
-	def connect(self):
-		"""Connect to server"""
-		try:
-			if self.socket:
-				try:
-					self.socket.close()
-				except:
-					pass
-			self.leds.set_network_status(Led.MODE_BLINK_CONNECT)
-			print('Connecting to {}:{}'.format(self.host, self.port))
-			self.socket = usocket.socket(usocket.AF_INET, usocket.SOCK_STREAM)
-			self.socket.settimeout(10)
-			addr = usocket.getaddrinfo(self.host, self.port)[0][-1]
-			self.socket.connect(addr)
-			if self._send_login():
-				self.connected = True
-				self.leds.set_network_status(Led.MODE_PULSE)
-				print('Connected to server')
-				return True
-			else:
-				self.connected = False
-				self.leds.set_network_status(Led.MODE_OFF)
-				return False
-		except Exception as e:
-			print('Connection error:', e)
-			self.connected = False
-			self.leds.set_network_status(Led.MODE_OFF)
-			return False
-
-	def disconnect(self):
-		"""Disconnect from server"""
-		if self.socket:
-			try:
-				self.socket.close()
-			except:
-				pass
-			self.socket = None
-		self.connected = False
-		self.leds.set_network_status(Led.MODE_OFF)
-
-	def _send_login(self):
-		"""Send login packet with IMEI"""
-		try:
-			imei_hex = self.imei[-16:] if len(self.imei) >= 16 else self.imei.zfill(16)
-			imei_bytes = bytes.fromhex(imei_hex)
-			packet = bytearray()
-			packet.append(0x78)
-			packet.append(0x78)
-			packet.append(0x0A)
-			packet.append(self.LOGIN)
-			packet.extend(imei_bytes)
-			serial = ustruct.pack('>H', self.serial_number)
-			packet.extend(serial)
-			crc = self._calculate_crc(packet[2:])
-			packet.extend(ustruct.pack('>H', crc))
-			packet.append(0x0D)
-			packet.append(0x0A)
-			self.socket.send(packet)
-			self.serial_number = (self.serial_number + 1) % 0xFFFF
-			response = self.socket.recv(128)
-			if response and len(response) > 4:
-				print('Login successful')
-				return True
-			print('Login failed: no response')
-			return False
-		except Exception as e:
-			print('Login error:', e)
-			return False
-
-	def send_location(self, data):
-		"""Send location data"""
-		if not self.connected:
-			if not self.connect():
-				return False
-		try:
-			if data.get('wifi_networks') and len(data['wifi_networks']) > 0:
-				return self._send_wifi_location(data)
-			else:
-				return self._send_gps_location(data)
-		except Exception as e:
-			print('Send location error:', e)
-			self.connected = False
-			return False
-
-	def _send_gps_location(self, data):
-		"""Send GPS location packet"""
-		try:
-			packet = bytearray()
-			packet.append(0x78)
-			packet.append(0x78)
-			time_tuple = utime.localtime(data['timestamp'])
-			date_time = bytearray([time_tuple[0] - 2000, time_tuple[1], time_tuple[2],
-			                      time_tuple[3], time_tuple[4], time_tuple[5]])
-			satellites = data['satellites'] & 0x0F
-			gps_valid = 1 if data.get('valid', False) else 0
-			lat = int(abs(data['latitude']) * 30000.0)
-			lon = int(abs(data['longitude']) * 30000.0)
-			lat_flag = 0 if data['latitude'] >= 0 else 1
-			lon_flag = 0 if data['longitude'] >= 0 else 1
-			speed = int(data['speed'])
-			course = int(data['course']) & 0x03FF
-			course |= (gps_valid << 12)
-			location_data = bytearray()
-			location_data.extend(date_time)
-			location_data.append((satellites << 4) | (gps_valid << 3))
-			location_data.extend(ustruct.pack('>I', lat))
-			location_data.extend(ustruct.pack('>I', lon))
-			location_data.append(speed)
-			location_data.extend(ustruct.pack('>H', course))
-			packet.append(len(location_data) + 5)
-			packet.append(self.LOCATION)
-			packet.extend(location_data)
-			serial = ustruct.pack('>H', self.serial_number)
-			packet.extend(serial)
-			crc = self._calculate_crc(packet[2:])
-			packet.extend(ustruct.pack('>H', crc))
-			packet.append(0x0D)
-			packet.append(0x0A)
-			self.socket.send(packet)
-			self.serial_number = (self.serial_number + 1) % 0xFFFF
-			try:
-				self.socket.settimeout(5)
-				response = self.socket.recv(128)
-				if response and len(response) > 0:
-					print('GPS location sent successfully')
-					return True
-				else:
-					print('No server response')
-					return True
-			except:
-				return True
-		except Exception as e:
-			print('Send GPS location error:', e)
-			self.connected = False
-			return False
-
-	def _send_wifi_location(self, data):
-		"""Send WiFi location packet (custom extension)"""
-		try:
-			packet = bytearray()
-			packet.append(0x78)
-			packet.append(0x78)
-			wifi_networks = data['wifi_networks']
-			wifi_count = min(len(wifi_networks), 15)
-			wifi_data = bytearray()
-			wifi_data.append(wifi_count)
-			for wifi in wifi_networks[:wifi_count]:
-				mac_bytes = bytes.fromhex(wifi['mac'].replace(':', ''))
-				wifi_data.extend(mac_bytes)
-				wifi_data.append(abs(wifi['signal']) & 0xFF)
-			time_tuple = utime.localtime(data['timestamp'])
-			date_time = bytearray([time_tuple[0] - 2000, time_tuple[1], time_tuple[2],
-			                      time_tuple[3], time_tuple[4], time_tuple[5]])
-			wifi_data.extend(date_time)
-			packet.append(len(wifi_data) + 5)
-			packet.append(self.WIFI_LOCATION)
-			packet.extend(wifi_data)
-			serial = ustruct.pack('>H', self.serial_number)
-			packet.extend(serial)
-			crc = self._calculate_crc(packet[2:])
-			packet.extend(ustruct.pack('>H', crc))
-			packet.append(0x0D)
-			packet.append(0x0A)
-			self.socket.send(packet)
-			self.serial_number = (self.serial_number + 1) % 0xFFFF
-			try:
-				self.socket.settimeout(5)
-				response = self.socket.recv(128)
-				if response and len(response) > 0:
-					print('WiFi location sent successfully ({} networks)'.format(wifi_count))
-					return True
-				else:
-					print('No server response')
-					return True
-			except:
-				return True
-		except Exception as e:
-			print('Send WiFi location error:', e)
-			self.connected = False
-			return False
-
-	def _calculate_crc(self, data):
-		"""Calculate CRC16-IBM"""
-		crc = 0xFFFF
-		for byte in data:
-			crc ^= byte
-			for _ in range(8):
-				if crc & 0x0001:
-					crc = (crc >> 1) ^ 0xA001
-				else:
-					crc >>= 1
-		return crc
+import usocket
+import _thread
+import ustruct
+import utime
+import modem
+import net
+from usr.led_controller import Led
+from usr.metrics import metrics
+from usr.memory import memory
+from usr.energy import energy
+from usr.connection import link, classify, LOGIN
+from usr.logger import get_logger
+from usr.location import LocationFix
+
+
+log = get_logger('gt06')
+
+
+class GT06Protocol:
+	"""GT06 protocol implementation with WiFi extension"""
+
+	LOGIN = 0x01
+	COMMAND_REPLY = 0x21
+	LOCATION = 0x12
+	HEARTBEAT = 0x13
+	STATUS = 0x14
+	# Custom extensions: fallback locations as packed by usr/wifi_scanner.py and usr/cell_scanner.py
+	# (standard 0x28 has a different layout and only 3 byte cell IDs, so it is not reused)
+	WIFI_LOCATION = 0x69
+	LBS_LOCATION = 0x6A
+	HYBRID_LOCATION = 0x6B
+	SERVER_COMMAND = 0x80
+	INFO = 0x94
+	# Information type of INFO packet carrying binary status telemetry (usr/status.py)
+	INFO_STATUS = 0xF0
+	# Information type of INFO packet carrying runtime metrics (usr/metrics.py)
+	INFO_METRICS = 0xF1
+	# Information type of INFO packet carrying heap profile (usr/memory.py)
+	INFO_MEMORY = 0xF2
+	# Information type of INFO packet carrying log entries (usr/logger.py)
+	INFO_LOG = 0xF3
+	# Alarm byte of status packet for tracker events
+	EVENT_ALARMS = {'low_battery': 0x0E, 'shutdown': 0x0F}
+
+	def __init__(self, host, port, leds):
+		self.host = host
+		self.port = port
+		self.leds = leds
+		self.socket = None
+		self.connected = False
+		# Failure class of the last failed connect or send (usr/connection.py)
+		self.failure = None
+		# Duration of the last successful connect (DNS, TCP and login) in ms
+		self.connect_ms = None
+		self.connect_lock = _thread.allocate_lock()
+		self.serial_number = 1
+		# Framed packets collected by send_batch() instead of being sent one by one, None otherwise
+		self.pending = None
+		self.imei = modem.getDevImei()
+		# Called as command_callback(server_flag, text) for server command frames
+		self.command_callback = None
+		log.info('GT06 protocol initialized: {}:{}, IMEI: {}', host, port, self.imei)
+
+	def connect(self):
+		"""Connect to server; a caller arriving during a connect in progress waits for it and shares its result"""
+		if not self.connect_lock.acquire(False):
+			with self.connect_lock:
+				return self.connected
+		try:
+			return self._connect()
+		finally:
+			self.connect_lock.release()
+
+	def _connect(self):
+		"""Open socket and log in"""
+		stage = 'dns'
+		try:
+			if self.socket:
+				try:
+					self.socket.close()
+				except:
+					pass
+			self.leds.set_network_status(Led.MODE_BLINK_CONNECT)
+			log.info('Connecting to {}:{}', self.host, self.port)
+			start = utime.ticks_ms()
+			self.socket = usocket.socket(usocket.AF_INET, usocket.SOCK_STREAM)
+			self.socket.settimeout(10)
+			addr = link.resolve(self.host, self.port)
+			stage = 'connect'
+			radio_start = utime.ticks_ms()
+			try:
+				self.socket.connect(addr)
+			finally:
+				energy.radio('tx', radio_start)
+			stage = LOGIN
+			if self._send_login():
+				self.connected = True
+				metrics.incr('connect')
+				metrics.observe_since('connect_ms', start)
+				self.connect_ms = utime.ticks_diff(utime.ticks_ms(), start)
+				self.leds.set_network_status(Led.MODE_PULSE)
+				log.info('Connected to server')
+				return True
+			else:
+				self.connected = False
+				self.failure = LOGIN
+				metrics.incr('connect_fail')
+				self.leds.set_network_status(Led.MODE_OFF)
+				return False
+		except Exception as e:
+			log.error('Connection error: {}', e)
+			self.failure = classify(e, stage)
+			metrics.incr('connect_fail')
+			self.connected = False
+			self.leds.set_network_status(Led.MODE_OFF)
+			return False
+
+	def disconnect(self):
+		"""Disconnect from server"""
+		if self.socket:
+			try:
+				self.socket.close()
+			except:
+				pass
+			self.socket = None
+		self.connected = False
+		self.leds.set_network_status(Led.MODE_OFF)
+
+	def _send_login(self):
+		"""Send login packet with IMEI"""
+		try:
+			imei_hex = self.imei[-16:] if len(self.imei) >= 16 else self.imei.zfill(16)
+			imei_bytes = bytes.fromhex(imei_hex)
+			packet = bytearray()
+			packet.append(0x78)
+			packet.append(0x78)
+			packet.append(len(imei_bytes) + 5)
+			packet.append(self.LOGIN)
+			packet.extend(imei_bytes)
+			serial = ustruct.pack('>H', self.serial_number)
+			packet.extend(serial)
+			crc = self._calculate_crc(packet[2:])
+			packet.extend(ustruct.pack('>H', crc))
+			packet.append(0x0D)
+			packet.append(0x0A)
+			self._transmit(packet)
+			self.serial_number = (self.serial_number + 1) % 0xFFFF
+			response = self._receive()
+			if response and len(response) > 4:
+				log.info('Login successful')
+				self._handle_response(response)
+				return True
+			log.warn('Login failed: no response')
+			return False
+		except Exception as e:
+			log.error('Login error: {}', e)
+			return False
+
+	def send_location(self, data):
+		"""Send location data"""
+		if not self.connected:
+			if not self.connect():
+				return False
+		start = utime.ticks_ms()
+		try:
+			success = self._send_record(data)
+		except Exception as e:
+			log.error('Send location error: {}', e)
+			self.failure = classify(e, 'send')
+			self.connected = False
+			success = False
+		if success:
+			metrics.incr('send')
+			metrics.observe_since('send_ms', start)
+		else:
+			metrics.incr('send_fail')
+		return success
+
+	def send_batch(self, records):
+		"""Send records back to back in one transmission, then read the acknowledgements (pipelined burst).
+		Return number of leading records sent, 0 on failure"""
+		if not self.connected:
+			if not self.connect():
+				metrics.incr('send_fail', len(records))
+				return 0
+		start = utime.ticks_ms()
+		self.pending = bytearray()
+		framed = 0
+		try:
+			for data in records:
+				if not self._send_record(data):
+					break
+				framed += 1
+			packets = self.pending
+			self.pending = None
+			if framed:
+				self._transmit(packets)
+		except Exception as e:
+			self.pending = None
+			log.error('Send burst error: {}', e)
+			self.failure = classify(e, 'send')
+			self.connected = False
+			metrics.incr('send_fail', len(records))
+			return 0
+		if framed:
+			acknowledged = self._receive_acks(framed)
+			log.debug('Burst of {} records sent, {} acknowledged', framed, acknowledged)
+			metrics.incr('send', framed)
+			metrics.observe_since('send_ms', start)
+		if framed < len(records):
+			metrics.incr('send_fail')
+		return framed
+
+	def _send_record(self, data):
+		"""Send record as the packet type matching its content"""
+		if isinstance(data, LocationFix):
+			return self._send_fix(data)
+		elif data.get('reply') is not None:
+			return self._send_command_reply(data)
+		elif data.get('status'):
+			return self._send_telemetry(data, self.INFO_STATUS, data['status'])
+		elif data.get('metrics'):
+			return self._send_telemetry(data, self.INFO_METRICS, data['metrics'])
+		elif data.get('memory'):
+			return self._send_telemetry(data, self.INFO_MEMORY, data['memory'])
+		return self._send_telemetry(data, self.INFO_LOG, data['log'])
+
+	def _send_fix(self, fix):
+		"""Send location fix as event status, GPS location or fallback packet"""
+		if fix.event:
+			return self._send_status(fix)
+		elif fix.valid or not (fix.wifi or fix.cells):
+			return self._send_gps_location(fix)
+		elif fix.wifi and fix.cells:
+			return self._send_hybrid_location(fix)
+		elif fix.wifi:
+			return self._send_wifi_location(fix)
+		return self._send_lbs_location(fix)
+
+	def _receive_acks(self, count):
+		"""Read responses until count frames arrived or the server goes quiet, handle server commands;
+		return number of frames received"""
+		response = bytearray()
+		frames = 0
+		try:
+			self.socket.settimeout(5)
+			while frames < count:
+				chunk = self._receive()
+				if not chunk:
+					break
+				response.extend(chunk)
+				frames = 0
+				for body in self._frames(response):
+					if body[1] != self.SERVER_COMMAND:
+						frames += 1
+		except:
+			pass
+		if response:
+			self._handle_response(response)
+		return frames
+
+	def _send_gps_location(self, fix):
+		"""Send GPS location packet"""
+		satellites = fix.satellites & 0x0F
+		gps_valid = 1 if fix.valid else 0
+		lat = int(abs(fix.latitude) * 30000.0)
+		lon = int(abs(fix.longitude) * 30000.0)
+		speed = int(fix.speed)
+		course = int(fix.course) & 0x03FF
+		course |= (gps_valid << 12)
+		location_data = self._date_time(fix.timestamp)
+		location_data.append((satellites << 4) | (gps_valid << 3))
+		location_data.extend(ustruct.pack('>I', lat))
+		location_data.extend(ustruct.pack('>I', lon))
+		location_data.append(speed)
+		location_data.extend(ustruct.pack('>H', course))
+		return self._send_packet(self.LOCATION, location_data, 'GPS location')
+
+	def _send_wifi_location(self, fix):
+		"""Send WiFi location packet (custom extension)"""
+		# Fingerprint is already in wire format: count, then MAC + abs(RSSI) per AP
+		wifi_data = bytearray(fix.wifi)
+		wifi_data.extend(self._date_time(fix.timestamp))
+		return self._send_packet(self.WIFI_LOCATION, wifi_data, 'WiFi location ({} networks)'.format(wifi_data[0]))
+
+	def _send_lbs_location(self, fix):
+		"""Send LBS location packet (custom extension): date/time, then cell list (4 byte CI for LTE)"""
+		lbs_data = self._date_time(fix.timestamp)
+		lbs_data.extend(fix.cells)
+		return self._send_packet(self.LBS_LOCATION, lbs_data, 'LBS location ({} cells)'.format(fix.cells[0]))
+
+	def _send_hybrid_location(self, fix):
+		"""Send combined WiFi + LBS fallback packet (custom extension): date/time, cell list, WiFi fingerprint"""
+		hybrid_data = self._date_time(fix.timestamp)
+		hybrid_data.extend(fix.cells)
+		hybrid_data.extend(fix.wifi)
+		return self._send_packet(self.HYBRID_LOCATION, hybrid_data, 'Hybrid location ({} cells, {} networks)'.format(fix.cells[0], fix.wifi[0]))
+
+	def _send_status(self, fix):
+		"""Send status packet: terminal info, voltage level, GSM signal, alarm, language"""
+		battery = fix.battery
+		voltage_level = 6
+		for level, limit in ((1, 5), (2, 10), (3, 20), (4, 50), (5, 80)):
+			if battery < limit:
+				voltage_level = level
+				break
+		try:
+			csq = net.csqQueryPoll()
+			gsm_level = 0 if csq < 0 or csq == 99 else min(4, csq // 7 + 1)
+		except:
+			gsm_level = 0
+		terminal_info = 0x01 | (0x04 if fix.charging else 0x00) | (0x40 if fix.valid else 0x00)
+		alarm = self.EVENT_ALARMS.get(fix.event, 0x00)
+		status_data = bytearray([terminal_info, voltage_level, gsm_level, alarm, 0x02])
+		return self._send_packet(self.HEARTBEAT, status_data, 'Status ({})'.format(fix.event))
+
+	def _send_telemetry(self, data, info_type, record):
+		"""Send information packet with binary status, metrics, memory or log telemetry"""
+		info_data = bytearray([info_type])
+		info_data.extend(self._date_time(data['timestamp']))
+		info_data.extend(record)
+		return self._send_packet(self.INFO, info_data, 'Telemetry 0x{:02X}'.format(info_type))
+
+	def _send_command_reply(self, data):
+		"""Acknowledge server command: server flag, ASCII encoding, reply text"""
+		reply_data = bytearray(ustruct.pack('>I', data.get('command_id', 0)))
+		reply_data.append(0x01)
+		reply_data.extend(data['reply'].encode()[:200])
+		return self._send_packet(self.COMMAND_REPLY, reply_data, 'Command reply')
+
+	def _frames(self, response):
+		"""Complete frames in response, each as body from length byte through CRC"""
+		i = 0
+		while i + 10 <= len(response):
+			if response[i] != 0x78 or response[i + 1] != 0x78:
+				i += 1
+				continue
+			end = i + 3 + response[i + 2]
+			if end > len(response):
+				break
+			yield response[i + 2:end]
+			i = end + 2
+
+	def _handle_response(self, response):
+		"""Pass server command frames (0x80) found in response to command_callback"""
+		for body in self._frames(response):
+			if body[1] == self.SERVER_COMMAND and len(body) >= 9 and self._calculate_crc(body[:-2]) == ustruct.unpack('>H', body[-2:])[0]:
+				command_length = body[2]
+				server_flag = ustruct.unpack('>I', body[3:7])[0]
+				text = bytes(body[7:3 + command_length]).decode()
+				log.info('Server command received: {}', text)
+				if self.command_callback:
+					self.command_callback(server_flag, text)
+
+	def _date_time(self, timestamp):
+		"""Encode timestamp as GT06 YY MM DD hh mm ss"""
+		time_tuple = utime.localtime(timestamp)
+		return bytearray([time_tuple[0] - 2000, time_tuple[1], time_tuple[2], time_tuple[3], time_tuple[4], time_tuple[5]])
+
+	def _send_packet(self, protocol_number, payload, description):
+		"""Frame payload, send it and wait for server response (only collect it during send_batch)"""
+		try:
+			start = memory.begin()
+			packet = bytearray()
+			packet.append(0x78)
+			packet.append(0x78)
+			packet.append(len(payload) + 5)
+			packet.append(protocol_number)
+			packet.extend(payload)
+			packet.extend(ustruct.pack('>H', self.serial_number))
+			crc = self._calculate_crc(packet[2:])
+			packet.extend(ustruct.pack('>H', crc))
+			packet.append(0x0D)
+			packet.append(0x0A)
+			memory.end('packet_build', start)
+			if self.pending is not None:
+				self.pending.extend(packet)
+				self.serial_number = (self.serial_number + 1) % 0xFFFF
+				return True
+			self._transmit(packet)
+			self.serial_number = (self.serial_number + 1) % 0xFFFF
+			try:
+				self.socket.settimeout(5)
+				response = self._receive()
+				if response and len(response) > 0:
+					log.debug('{} sent successfully', description)
+					self._handle_response(response)
+				else:
+					log.debug('No server response')
+			except:
+				pass
+			return True
+		except Exception as e:
+			log.error('Send {} error: {}', description, e)
+			self.failure = classify(e, 'send')
+			self.connected = False
+			return False
+
+	def _transmit(self, packet):
+		"""Send packet, account bytes and modem time"""
+		start = utime.ticks_ms()
+		try:
+			self.socket.send(packet)
+		finally:
+			energy.radio('tx', start)
+		metrics.incr('tx_bytes', len(packet))
+
+	def _receive(self):
+		"""Read server response, waiting time is accounted as modem receive time"""
+		start = utime.ticks_ms()
+		try:
+			return self.socket.recv(128)
+		finally:
+			energy.radio('rx', start)
+
+	def _calculate_crc(self, data):
+		"""Calculate CRC16-IBM"""
+		crc = 0xFFFF
+		for byte in data:
+			crc ^= byte
+			for _ in range(8):
+				if crc & 0x0001:
+					crc = (crc >> 1) ^ 0xA001
+				else:
+					crc >>= 1
+		return crc
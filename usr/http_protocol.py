@@ -1,76 +1,218 @@
-import usocket
-import ujson
-import modem
-from usr.led_controller import Led
-
-
-class HTTPProtocol:
-	"""HTTP protocol implementation for data transmission"""
-
-	def __init__(self, host, port, path, leds):
-		self.host = host
-		self.port = port
-		self.path = path
-		self.leds = leds
-		self.connected = False
-		self.imei = modem.getDevImei()
-		print('HTTP protocol initialized: {}:{}{}'.format(host, port, path))
-
-	def connect(self):
-		"""HTTP doesn't require persistent connection"""
-		self.connected = True
-		return True
-
-	def disconnect(self):
-		"""Disconnect"""
-		self.connected = False
-
-	def send_location(self, data):
-		"""Send location data via HTTP POST"""
-		try:
-			self.leds.set_network_status(Led.MODE_BLINK_CONNECT)
-			json_data = {'imei': self.imei, 'timestamp': data['timestamp'], 'latitude': data['latitude'], 'longitude': data['longitude'], 'altitude': data['altitude'], 'speed': data['speed'], 'course': data['course'],
-                            'satellites': data['satellites'], 'battery': data['battery'], 'charging': data['charging'], 'source': data.get('source', 'gps'), 'accuracy': data.get('accuracy', 0), 'valid': data.get('valid', False)}
-			if 'wifi_networks' in data and len(data['wifi_networks']) > 0:
-				json_data['wifi_networks'] = data['wifi_networks']
-			json_str = ujson.dumps(json_data)
-			request = 'POST {} HTTP/1.1\r\n'.format(self.path)
-			request += 'Host: {}\r\n'.format(self.host)
-			request += 'Content-Type: application/json\r\n'
-			request += 'Content-Length: {}\r\n'.format(len(json_str))
-			request += 'User-Agent: QuecPython-Tracker/1.0\r\n'
-			request += 'X-Device-IMEI: {}\r\n'.format(self.imei)
-			request += 'Connection: close\r\n'
-			request += '\r\n'
-			request += json_str
-			sock = usocket.socket(usocket.AF_INET, usocket.SOCK_STREAM)
-			sock.settimeout(10)
-			addr = usocket.getaddrinfo(self.host, self.port)[0][-1]
-			sock.connect(addr)
-			sock.send(request.encode())
-			response = b''
-			while True:
-				chunk = sock.recv(1024)
-				if not chunk:
-					break
-				response += chunk
-				if b'\r\n\r\n' in response:
-					break
-			sock.close()
-			if response:
-				response_str = response.decode('utf-8', 'ignore')
-				if '200 OK' in response_str or '201' in response_str or '204' in response_str:
-					print('HTTP: Data sent successfully')
-					self.connected = True
-					self.leds.set_network_status(Led.MODE_PULSE)
-					return True
-				else:
-					print('HTTP: Server returned error:', response_str.split('\r\n')[0])
-			self.connected = False
-			self.leds.set_network_status(Led.MODE_OFF)
-			return False
-		except Exception as e:
-			print('HTTP send error:', e)
-			self.connected = False
-			self.leds.set_network_status(Led.MODE_OFF)
-			return False
+import usocket
+import ujson
+import utime
+import modem
+from usr.led_controller import Led
+from usr.wifi_scanner import decode_fingerprint
+from usr.cell_scanner import decode_cells
+from usr.status import decode_status
+from usr.metrics import metrics, decode_metrics
+from usr.memory import memory, decode_memory
+from usr.energy import energy
+from usr.logger import get_logger, decode_log
+from usr.location import LocationFix
+from usr.connection import link, classify, LOGIN, SERVER
+
+
+log = get_logger('http')
+
+# Response bytes read (headers and optional command directive body)
+MAX_RESPONSE = 2048
+
+
+class HTTPProtocol:
+	"""HTTP protocol implementation for data transmission"""
+
+	def __init__(self, host, port, path, leds, batch=False):
+		self.host = host
+		self.port = port
+		self.path = path
+		self.leds = leds
+		# Server accepts several records in one POST ({"imei": ..., "records": [...]})
+		self.batch = batch
+		self.connected = False
+		# Failure class of the last failed send (usr/connection.py)
+		self.failure = None
+		# Duration of the last successful connect (DNS and TCP) in ms
+		self.connect_ms = None
+		self.imei = modem.getDevImei()
+		# Called as command_callback(command_id, text) for response body directives
+		self.command_callback = None
+		log.info('HTTP protocol initialized: {}:{}{}', host, port, path)
+
+	def connect(self):
+		"""HTTP doesn't require persistent connection"""
+		self.connected = True
+		return True
+
+	def disconnect(self):
+		"""Disconnect"""
+		self.connected = False
+
+	def send_location(self, data):
+		"""Send location data via HTTP POST"""
+		try:
+			self.leds.set_network_status(Led.MODE_BLINK_CONNECT)
+			start = memory.begin()
+			json_str = self._encode(data)
+			memory.end('json_encode', start)
+			return self._post(json_str)
+		except Exception as e:
+			log.error('HTTP send error: {}', e)
+			self.failure = SERVER
+			self.connected = False
+			self.leds.set_network_status(Led.MODE_OFF)
+			return False
+
+	def send_batch(self, records):
+		"""Send records in one POST as {"imei": ..., "records": [...]} if the server accepts batches,
+		one POST per record otherwise; return number of leading records sent"""
+		if not self.batch:
+			sent = 0
+			for data in records:
+				if not self.send_location(data):
+					break
+				sent += 1
+			return sent
+		try:
+			self.leds.set_network_status(Led.MODE_BLINK_CONNECT)
+			start = memory.begin()
+			json_str = ujson.dumps({'imei': self.imei, 'records': [self._document(data) for data in records]})
+			memory.end('json_encode', start)
+			return len(records) if self._post(json_str, len(records)) else 0
+		except Exception as e:
+			log.error('HTTP send error: {}', e)
+			self.failure = SERVER
+			self.connected = False
+			self.leds.set_network_status(Led.MODE_OFF)
+			return 0
+
+	def _encode(self, data):
+		"""Encode record as JSON request body"""
+		return ujson.dumps(self._document(data))
+
+	def _document(self, data):
+		"""Record as JSON object"""
+		if isinstance(data, LocationFix):
+			return self._fix_document(data)
+		if data.get('reply') is not None:
+			return {'imei': self.imei, 'timestamp': data['timestamp'], 'command_id': data.get('command_id', 0), 'reply': data['reply']}
+		for key, decode in (('status', decode_status), ('metrics', decode_metrics), ('memory', decode_memory), ('log', decode_log)):
+			if data.get(key):
+				return {'imei': self.imei, 'timestamp': data['timestamp'], key: decode(data[key])}
+
+	def _fix_document(self, fix):
+		"""Location fix as JSON object"""
+		json_data = {'imei': self.imei, 'timestamp': fix.timestamp, 'latitude': fix.latitude, 'longitude': fix.longitude, 'altitude': fix.altitude, 'speed': fix.speed, 'course': fix.course,
+                     'satellites': fix.satellites, 'battery': fix.battery, 'charging': fix.charging, 'source': fix.source, 'accuracy': fix.accuracy, 'valid': fix.valid}
+		if fix.wifi:
+			json_data['wifi_networks'] = decode_fingerprint(fix.wifi)
+		if fix.cells:
+			json_data['cells'] = decode_cells(fix.cells)
+		if fix.event:
+			json_data['event'] = fix.event
+		return json_data
+
+	def _post(self, json_str, count=1):
+		"""POST JSON body carrying count records, return True on 2xx response"""
+		start = utime.ticks_ms()
+		connected = False
+		stage = 'dns'
+		# Modem state being timed for the energy ledger ('tx' or 'rx'), None when idle
+		radio = None
+		try:
+			build = memory.begin()
+			request = 'POST {} HTTP/1.1\r\n'.format(self.path)
+			request += 'Host: {}\r\n'.format(self.host)
+			request += 'Content-Type: application/json\r\n'
+			request += 'Content-Length: {}\r\n'.format(len(json_str))
+			request += 'User-Agent: QuecPython-Tracker/1.0\r\n'
+			request += 'X-Device-IMEI: {}\r\n'.format(self.imei)
+			request += 'Connection: close\r\n'
+			request += '\r\n'
+			request += json_str
+			memory.end('packet_build', build)
+			sock = usocket.socket(usocket.AF_INET, usocket.SOCK_STREAM)
+			sock.settimeout(10)
+			addr = link.resolve(self.host, self.port)
+			stage = 'connect'
+			radio, radio_start = 'tx', utime.ticks_ms()
+			sock.connect(addr)
+			connected = True
+			stage = 'send'
+			metrics.incr('connect')
+			metrics.observe_since('connect_ms', start)
+			self.connect_ms = utime.ticks_diff(utime.ticks_ms(), start)
+			payload = request.encode()
+			sock.send(payload)
+			energy.radio('tx', radio_start)
+			metrics.incr('tx_bytes', len(payload))
+			radio, radio_start = 'rx', utime.ticks_ms()
+			response = b''
+			expected = None
+			while len(response) < MAX_RESPONSE:
+				chunk = sock.recv(1024)
+				if not chunk:
+					break
+				response += chunk
+				if expected is None and b'\r\n\r\n' in response:
+					expected = response.index(b'\r\n\r\n') + 4 + self._content_length(response)
+				if expected is not None and len(response) >= expected:
+					break
+			sock.close()
+			energy.radio('rx', radio_start)
+			radio = None
+			if response:
+				response_str = response.decode('utf-8', 'ignore')
+				if '200 OK' in response_str or '201' in response_str or '204' in response_str:
+					log.debug('Data sent successfully')
+					metrics.incr('send', count)
+					metrics.observe_since('send_ms', start)
+					self._handle_body(response_str)
+					self.connected = True
+					self.leds.set_network_status(Led.MODE_PULSE)
+					return True
+				else:
+					status = response_str.split('\r\n')[0]
+					log.warn('Server returned error: {}', status)
+					# Authentication rejected is handled like a GT06 login failure
+					self.failure = LOGIN if ' 401' in status or ' 403' in status else SERVER
+			else:
+				self.failure = SERVER
+			metrics.incr('send_fail')
+			self.connected = False
+			self.leds.set_network_status(Led.MODE_OFF)
+			return False
+		except Exception as e:
+			log.error('HTTP send error: {}', e)
+			self.failure = classify(e, stage)
+			if radio:
+				energy.radio(radio, radio_start)
+			metrics.incr('send_fail' if connected else 'connect_fail')
+			self.connected = False
+			self.leds.set_network_status(Led.MODE_OFF)
+			return False
+
+	def _content_length(self, response):
+		"""Get Content-Length from response headers, 0 if absent"""
+		for line in response.split(b'\r\n\r\n', 1)[0].split(b'\r\n'):
+			if line.lower().startswith(b'content-length:'):
+				try:
+					return int(line[15:].strip())
+				except ValueError:
+					return 0
+		return 0
+
+	def _handle_body(self, response_str):
+		"""Pass {"id": n, "command": "INTERVAL,30"} directive in response body to command_callback"""
+		body = response_str.split('\r\n\r\n', 1)[-1].strip()
+		if not body.startswith('{'):
+			return
+		try:
+			directive = ujson.loads(body)
+		except Exception:
+			return
+		if directive.get('command'):
+			log.info('Server command received: {}', directive['command'])
+			if self.command_callback:
+				self.command_callback(directive.get('id', 0), directive['command'])
@@ -1,122 +1,195 @@
-from machine import Pin
-import _thread
-import utime
-
-
-class Led:
-	"""Single LED controller with various modes"""
-
-	MODE_OFF = 0
-	MODE_ON = 1
-	MODE_BLINK_SLOW = 2
-	MODE_BLINK_1HZ = 3
-	MODE_BLINK_4HZ = 4
-	MODE_BLINK_CONNECT = 5
-	MODE_PULSE = 6
-
-	def __init__(self, pin_num):
-		self.pin = Pin(pin_num, Pin.OUT, Pin.PULL_DISABLE, 0)
-		self.mode = self.MODE_OFF
-		self.running = False
-		self.thread_started = False
-		self.lock = _thread.allocate_lock()
-
-	def set_mode(self, mode):
-		"""Set LED mode"""
-		with self.lock:
-			self.mode = mode
-			if not self.thread_started and mode != self.MODE_OFF:
-				self.running = True
-				self.thread_started = True
-				_thread.start_new_thread(self._led_thread, ())
-
-	def _led_thread(self):
-		"""LED control thread"""
-		pulse_step = 0
-		while self.running:
-			with self.lock:
-				current_mode = self.mode
-
-			if current_mode == self.MODE_OFF:
-				self.pin.write(0)
-				utime.sleep_ms(100)
-			elif current_mode == self.MODE_ON:
-				self.pin.write(1)
-				utime.sleep_ms(100)
-			elif current_mode == self.MODE_BLINK_SLOW:
-				self.pin.write(1)
-				utime.sleep_ms(500)
-				self.pin.write(0)
-				utime.sleep(5)
-			elif current_mode == self.MODE_BLINK_1HZ:
-				self.pin.write(1)
-				utime.sleep_ms(500)
-				self.pin.write(0)
-				utime.sleep_ms(500)
-			elif current_mode == self.MODE_BLINK_4HZ:
-				self.pin.write(1)
-				utime.sleep_ms(125)
-				self.pin.write(0)
-				utime.sleep_ms(125)
-			elif current_mode == self.MODE_BLINK_CONNECT:
-				self.pin.write(1)
-				utime.sleep_ms(250)
-				self.pin.write(0)
-				utime.sleep_ms(750)
-			elif current_mode == self.MODE_PULSE:
-				duty_cycle = [0, 10, 30, 60, 100, 60, 30, 10]
-				for duty in duty_cycle:
-					if duty > 0:
-						on_time = int(10 * duty / 100)
-						off_time = 10 - on_time
-						self.pin.write(1)
-						utime.sleep_ms(on_time)
-						self.pin.write(0)
-						utime.sleep_ms(off_time)
-					else:
-						self.pin.write(0)
-						utime.sleep_ms(10)
-
-	def cleanup(self):
-		"""Cleanup LED"""
-		self.running = False
-		self.pin.write(0)
-
-
-class Leds:
-	"""LED controller for all status indicators"""
-
-	def __init__(self, red_pin, blue_pin, yellow_pin):
-		self.red_led = Led(red_pin)
-		self.blue_led = Led(blue_pin)
-		self.yellow_led = Led(yellow_pin)
-		self.data_blink_active = False
-
-	def set_gps_status(self, mode):
-		"""Set GPS status LED (red)"""
-		self.red_led.set_mode(mode)
-
-	def set_network_status(self, mode):
-		"""Set network status LED (blue)"""
-		if not self.data_blink_active:
-			self.blue_led.set_mode(mode)
-
-	def set_battery_status(self, mode):
-		"""Set battery status LED (yellow)"""
-		self.yellow_led.set_mode(mode)
-
-	def network_data_start(self):
-		"""Start data transmission indicator"""
-		self.data_blink_active = True
-		self.blue_led.set_mode(Led.MODE_BLINK_4HZ)
-
-	def network_data_stop(self):
-		"""Stop data transmission indicator"""
-		self.data_blink_active = False
-		self.blue_led.set_mode(Led.MODE_PULSE)
-
-	def cleanup(self):
-		"""Cleanup all LEDs"""
-		self.red_led.cleanup()
-		self.blue_led.cleanup()
-		self.yellow_led.cleanup()
+from machine import Pin
+import _thread
+import utime
+import osTimer
+from usr.energy import energy
+from usr.logger import get_logger
+
+
+log = get_logger('led')
+
+
+class Led:
+	"""Single LED with various modes, driven by LedEngine"""
+
+	MODE_OFF = 0
+	MODE_ON = 1
+	MODE_BLINK_SLOW = 2
+	MODE_BLINK_1HZ = 3
+	MODE_BLINK_4HZ = 4
+	MODE_BLINK_CONNECT = 5
+	MODE_PULSE = 6
+
+	# Blinking modes as (on ms, off ms, ...) cycles, starting with LED on
+	PATTERNS = {
+		MODE_BLINK_SLOW: (500, 5000),
+		MODE_BLINK_1HZ: (500, 500),
+		MODE_BLINK_4HZ: (125, 125),
+		MODE_BLINK_CONNECT: (250, 750),
+		MODE_PULSE: (80, 920)
+	}
+
+	def __init__(self, pin_num, engine):
+		self.pin = Pin(pin_num, Pin.OUT, Pin.PULL_DISABLE, 0)
+		self.lit = 0
+		self.mode = self.MODE_OFF
+		self.step = 0
+		self.next_edge = None
+		self.engine = engine
+		engine.add(self)
+
+	def set_mode(self, mode):
+		"""Set LED mode"""
+		self.engine.set_mode(self, mode)
+
+	def write(self, value):
+		"""Drive pin, remember state for energy accounting"""
+		self.pin.write(value)
+		self.lit = value
+
+	def cleanup(self):
+		"""Cleanup LED"""
+		self.mode = self.MODE_OFF
+		self.next_edge = None
+		self.write(0)
+
+
+class LedEngine:
+	"""Drives all LEDs from one timer that fires only on the next pin edge"""
+
+	def __init__(self):
+		self.leds = []
+		self.eco = False
+		self.timer = osTimer()
+		self.lock = _thread.allocate_lock()
+
+	def add(self, led):
+		"""Register LED"""
+		self.leds.append(led)
+
+	def set_mode(self, led, mode):
+		"""Change LED mode, pattern restarts only when mode actually changes"""
+		with self.lock:
+			if led.mode == mode:
+				return
+			led.mode = mode
+			self._start(led, utime.ticks_ms())
+			self._schedule()
+
+	def set_eco(self, eco):
+		"""Blank all LEDs (eco) or restore their patterns"""
+		with self.lock:
+			self.eco = eco
+			now = utime.ticks_ms()
+			for led in self.leds:
+				self._start(led, now)
+			self._schedule()
+
+	def _start(self, led, now):
+		"""Apply first state of LED mode"""
+		led.step = 0
+		pattern = Led.PATTERNS.get(led.mode)
+		if self.eco:
+			led.write(0)
+			led.next_edge = None
+		elif pattern:
+			led.write(1)
+			led.next_edge = utime.ticks_add(now, pattern[0])
+		else:
+			led.write(1 if led.mode == Led.MODE_ON else 0)
+			led.next_edge = None
+
+	def _schedule(self):
+		"""Arm timer for the earliest pending edge"""
+		self.timer.stop()
+		now = utime.ticks_ms()
+		delay = None
+		lit = 0
+		for led in self.leds:
+			lit += led.lit
+			if led.next_edge is not None:
+				led_delay = utime.ticks_diff(led.next_edge, now)
+				if delay is None or led_delay < delay:
+					delay = led_delay
+		energy.active('led', lit)
+		if delay is not None:
+			self.timer.start(max(1, delay), 0, self._on_timer)
+
+	def _on_timer(self, args):
+		"""Timer callback: toggle every LED whose edge is due"""
+		with self.lock:
+			now = utime.ticks_ms()
+			for led in self.leds:
+				if led.next_edge is None or utime.ticks_diff(now, led.next_edge) < 0:
+					continue
+				pattern = Led.PATTERNS[led.mode]
+				led.step = (led.step + 1) % len(pattern)
+				led.write(1 if led.step % 2 == 0 else 0)
+				led.next_edge = utime.ticks_add(led.next_edge, pattern[led.step])
+				if utime.ticks_diff(led.next_edge, now) <= 0:
+					# Timer ran late, restart cycle phase from now
+					led.next_edge = utime.ticks_add(now, pattern[led.step])
+			self._schedule()
+
+	def cleanup(self):
+		"""Stop timer"""
+		with self.lock:
+			self.timer.stop()
+			for led in self.leds:
+				led.cleanup()
+			energy.active('led', 0)
+
+
+class Leds:
+	"""LED controller for all status indicators"""
+
+	def __init__(self, red_pin, blue_pin, yellow_pin, eco_timeout=0):
+		self.engine = LedEngine()
+		self.red_led = Led(red_pin, self.engine)
+		self.blue_led = Led(blue_pin, self.engine)
+		self.yellow_led = Led(yellow_pin, self.engine)
+		self.data_blink_active = False
+		self.eco_timer = None
+		if eco_timeout > 0:
+			self.eco_timer = osTimer()
+			self.eco_timer.start(eco_timeout * 1000, 0, self._eco_callback)
+
+	def _eco_callback(self, args):
+		"""Blank LEDs once boot indication period is over"""
+		log.info('LED eco mode active')
+		self.engine.set_eco(True)
+
+	def set_eco(self, eco):
+		"""Enable/disable LED eco mode"""
+		if self.eco_timer:
+			self.eco_timer.stop()
+		self.engine.set_eco(eco)
+
+	def set_gps_status(self, mode):
+		"""Set GPS status LED (red)"""
+		self.red_led.set_mode(mode)
+
+	def set_network_status(self, mode):
+		"""Set network status LED (blue)"""
+		if not self.data_blink_active:
+			self.blue_led.set_mode(mode)
+
+	def set_battery_status(self, mode):
+		"""Set battery status LED (yellow)"""
+		self.yellow_led.set_mode(mode)
+
+	def network_data_start(self):
+		"""Start data transmission indicator"""
+		self.data_blink_active = True
+		self.blue_led.set_mode(Led.MODE_BLINK_4HZ)
+
+	def network_data_stop(self):
+		"""Stop data transmission indicator"""
+		self.data_blink_active = False
+		self.blue_led.set_mode(Led.MODE_PULSE)
+
+	def cleanup(self):
+		"""Cleanup all LEDs"""
+		if self.eco_timer:
+			self.eco_timer.stop()
+		self.engine.cleanup()
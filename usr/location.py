@@ -0,0 +1,90 @@
+import _thread
+
+
+# Fix fields, also the keys of the JSON form kept in the flash buffer
+FIELDS = ('timestamp', 'latitude', 'longitude', 'altitude', 'speed', 'course', 'satellites', 'battery', 'charging',
+          'valid', 'source', 'accuracy', 'wifi', 'cells', 'event')
+# Released fixes kept for reuse; fixes beyond it (long buffer backlog) are left to the collector
+POOL_SIZE = 8
+
+
+class LocationFix:
+	"""Location report from GNSS or fallback (WiFi, cells, BSSID cache) with battery state and optional event,
+	passed unchanged from sampling through queue and buffer to the protocol encoders"""
+	__slots__ = FIELDS
+
+	def __init__(self):
+		self.reset()
+
+	def reset(self):
+		"""Clear all fields (invalid fix without fallback data)"""
+		self.timestamp = 0
+		self.latitude = 0.0
+		self.longitude = 0.0
+		self.altitude = 0.0
+		self.speed = 0.0
+		self.course = 0.0
+		self.satellites = 0
+		self.battery = 0
+		self.charging = False
+		self.valid = False
+		self.source = 'gps'
+		self.accuracy = 0
+		self.wifi = None
+		self.cells = None
+		self.event = None
+
+	def copy_from(self, fix):
+		"""Copy all fields of fix"""
+		for name in FIELDS:
+			setattr(self, name, getattr(fix, name))
+
+	def get(self, name, default=None):
+		"""Field value like dict.get, for code handling fixes and telemetry records alike"""
+		return getattr(self, name, default)
+
+	def to_dict(self):
+		"""Fields as dict (flash buffer), fallback data and event only when present"""
+		record = {}
+		for name in FIELDS:
+			value = getattr(self, name)
+			if value is not None:
+				record[name] = value
+		return record
+
+	def update(self, record):
+		"""Set fields from dict written by to_dict"""
+		for name in FIELDS:
+			if name in record:
+				setattr(self, name, record[name])
+
+
+class FixPool:
+	"""Free list of LocationFix records: acquired by the sampler, released by the uplink once sent or dropped"""
+
+	def __init__(self, size=POOL_SIZE):
+		self.size = size
+		self.free = [LocationFix() for _ in range(size)]
+		# Fixes allocated because the pool was empty
+		self.allocated = 0
+		self.lock = _thread.allocate_lock()
+
+	def acquire(self):
+		"""Get cleared fix"""
+		with self.lock:
+			if self.free:
+				return self.free.pop()
+			self.allocated += 1
+		return LocationFix()
+
+	def release(self, record):
+		"""Return fix to the pool (other records are ignored); the caller must not use it afterwards"""
+		if not isinstance(record, LocationFix):
+			return
+		record.reset()
+		with self.lock:
+			if len(self.free) < self.size:
+				self.free.append(record)
+
+
+fixes = FixPool()
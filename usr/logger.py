@@ -0,0 +1,308 @@
+import _thread
+import uos
+import ustruct
+import utime
+from usr.status import SMS_LIMIT
+
+
+LOG_VERSION = 1
+LEVELS = ('DEBUG', 'INFO', 'WARN', 'ERROR', 'OFF')
+DEBUG = 0
+INFO = 1
+WARN = 2
+ERROR = 3
+OFF = 4
+# Default ring size in bytes
+RING_SIZE = 4096
+# Entry header: timestamp, level, module index, message length
+ENTRY_FORMAT = '>IBBB'
+ENTRY_HEADER = 7
+MAX_MESSAGE = 255
+LOG_FILE = '/usr/tracker_log.txt'
+LOG_FILE_OLD = '/usr/tracker_log.old'
+# Spill file size before rotation
+LOG_FILE_MAX = 16384
+# Unspilled entries written to flash in one go (errors are written at the next flush)
+SPILL_BATCH = 32
+# Packed record size for the data channel, fits one GT06 INFO packet
+RECORD_SIZE = 240
+
+
+def parse_level(name, default=None):
+	"""Level number from name or first letter, default if unknown"""
+	name = str(name).upper()
+	for i in range(len(LEVELS)):
+		if LEVELS[i] == name or LEVELS[i][0] == name:
+			return i
+	return default
+
+
+def _text(data):
+	"""Decode message, a multi-byte character cut by truncation is dropped"""
+	try:
+		return bytes(data).decode()
+	except UnicodeError:
+		return bytes(b for b in data if b < 0x80).decode()
+
+
+class Log:
+	"""Module handle, messages below its level are dropped before formatting"""
+
+	def __init__(self, ring, index, name, level):
+		self.ring = ring
+		self.index = index
+		self.name = name
+		self.level = level
+
+	def debug(self, fmt, *args):
+		"""Log fmt.format(*args) at DEBUG level"""
+		if self.level <= DEBUG:
+			self.ring.write(self, DEBUG, fmt, args)
+
+	def info(self, fmt, *args):
+		"""Log fmt.format(*args) at INFO level"""
+		if self.level <= INFO:
+			self.ring.write(self, INFO, fmt, args)
+
+	def warn(self, fmt, *args):
+		"""Log fmt.format(*args) at WARN level"""
+		if self.level <= WARN:
+			self.ring.write(self, WARN, fmt, args)
+
+	def error(self, fmt, *args):
+		"""Log fmt.format(*args) at ERROR level"""
+		if self.level <= ERROR:
+			self.ring.write(self, ERROR, fmt, args)
+
+
+class LogRing:
+	"""Binary log entries in a fixed RAM ring (oldest evicted first), optional console echo and flash spill"""
+
+	def __init__(self, size=RING_SIZE):
+		self.buf = bytearray(size)
+		self.header = bytearray(ENTRY_HEADER)
+		self.head = 0
+		self.tail = 0
+		self.used = 0
+		self.entries = 0
+		# Entries ever written and index of the first one not yet spilled to flash
+		self.written = 0
+		self.spilled = 0
+		self.spill = False
+		self.spill_error = False
+		self.dropped = 0
+		self.counts = [0] * (len(LEVELS) - 1)
+		self.default = INFO
+		self.console = WARN
+		self.levels = {}
+		self.modules = []
+		self.lock = _thread.allocate_lock()
+
+	def get(self, name):
+		"""Get handle of module name, registered on first use"""
+		for module in self.modules:
+			if module.name == name:
+				return module
+		module = Log(self, len(self.modules), name, self.levels.get(name, self.default))
+		self.modules.append(module)
+		return module
+
+	def configure(self, level=None, levels=None, console=None, spill=None):
+		"""Set default level, per module levels ({module: level name}), console level and flash spill"""
+		if level is not None:
+			self.default = parse_level(level, INFO)
+		if levels is not None:
+			self.levels = {}
+			for name, value in levels.items():
+				self.levels[name] = parse_level(value, self.default)
+		if console is not None:
+			self.console = parse_level(console, WARN)
+		if spill is not None:
+			self.spill = spill
+			if spill:
+				self.spilled = self.written
+		for module in self.modules:
+			module.level = self.levels.get(module.name, self.default)
+
+	def write(self, module, level, fmt, args):
+		"""Format message and append entry, echo to console at console level and above"""
+		try:
+			text = fmt.format(*args) if args else fmt
+		except Exception:
+			text = fmt
+		if level >= self.console:
+			print('{} {}: {}'.format(LEVELS[level][0], module.name, text))
+		data = text.encode()
+		size = min(len(data), MAX_MESSAGE)
+		with self.lock:
+			ustruct.pack_into(ENTRY_FORMAT, self.header, 0, utime.time() & 0xFFFFFFFF, level, module.index, size)
+			while self.entries and self.used + ENTRY_HEADER + size > len(self.buf):
+				self._evict()
+			self._put(self.header, ENTRY_HEADER)
+			self._put(data, size)
+			self.entries += 1
+			self.written += 1
+			self.counts[level] += 1
+			if level == ERROR:
+				self.spill_error = True
+
+	def _put(self, data, size):
+		"""Copy size bytes of data at tail, wrapping around"""
+		first = min(size, len(self.buf) - self.tail)
+		view = memoryview(data)
+		self.buf[self.tail:self.tail + first] = view[:first]
+		if first < size:
+			self.buf[0:size - first] = view[first:size]
+		self.tail = (self.tail + size) % len(self.buf)
+		self.used += size
+
+	def _read(self, position, size):
+		"""Copy size bytes from ring position, wrapping around"""
+		end = position + size
+		if end <= len(self.buf):
+			return bytes(self.buf[position:end])
+		return bytes(self.buf[position:]) + bytes(self.buf[:end - len(self.buf)])
+
+	def _evict(self):
+		"""Drop oldest entry"""
+		size = ENTRY_HEADER + self.buf[(self.head + ENTRY_HEADER - 1) % len(self.buf)]
+		self.head = (self.head + size) % len(self.buf)
+		self.used -= size
+		self.entries -= 1
+		self.dropped += 1
+
+	def _collect(self, count=None):
+		"""Raw entries (header + message) oldest first, only the newest count if given; call with lock held"""
+		result = []
+		position = self.head
+		skip = self.entries - count if count is not None and count < self.entries else 0
+		for i in range(self.entries):
+			size = ENTRY_HEADER + self.buf[(position + ENTRY_HEADER - 1) % len(self.buf)]
+			if i >= skip:
+				result.append(self._read(position, size))
+			position = (position + size) % len(self.buf)
+		return result
+
+	def _decode(self, raw):
+		"""Entry as (timestamp, level, module name, text)"""
+		timestamp, level, index, size = ustruct.unpack(ENTRY_FORMAT, raw[:ENTRY_HEADER])
+		name = self.modules[index].name if index < len(self.modules) else '?'
+		return timestamp, level, name, _text(raw[ENTRY_HEADER:])
+
+	def records(self, count=None, level=DEBUG):
+		"""Entries at level and above as (timestamp, level, module, text), oldest first"""
+		with self.lock:
+			raws = self._collect(count)
+		result = []
+		for raw in raws:
+			entry = self._decode(raw)
+			if entry[1] >= level:
+				result.append(entry)
+		return result
+
+	def clear(self):
+		"""Drop all entries"""
+		with self.lock:
+			self.head = self.tail = self.used = self.entries = 0
+			self.spilled = self.written
+
+	def flush(self, force=False):
+		"""Append unspilled entries to flash file when spill is enabled; batched unless an error was logged or forced"""
+		if not self.spill:
+			return
+		pending = self.written - self.spilled
+		if not pending or (not force and not self.spill_error and pending < SPILL_BATCH):
+			return
+		with self.lock:
+			# Entries evicted before they were spilled are lost
+			raws = self._collect(min(self.written - self.spilled, self.entries))
+			self.spilled = self.written
+			self.spill_error = False
+		lines = []
+		for raw in raws:
+			timestamp, level, name, text = self._decode(raw)
+			lines.append('{} {} {}: {}\n'.format(timestamp, LEVELS[level][0], name, text))
+		try:
+			try:
+				if uos.stat(LOG_FILE)[6] > LOG_FILE_MAX:
+					uos.rename(LOG_FILE, LOG_FILE_OLD)
+			except OSError:
+				pass
+			with open(LOG_FILE, 'a') as f:
+				for line in lines:
+					f.write(line)
+		except Exception as e:
+			print('Log spill error:', e)
+
+	def summary(self, limit=SMS_LIMIT, level=DEBUG):
+		"""Newest entries that fit in limit as 'hh:mm:ss L module: text' lines, oldest first"""
+		lines = []
+		length = 0
+		for timestamp, entry_level, name, text in reversed(self.records(level=level)):
+			t = utime.localtime(timestamp)
+			line = '{:02d}:{:02d}:{:02d} {} {}: {}'.format(t[3], t[4], t[5], LEVELS[entry_level][0], name, text)
+			if length + len(line) + (1 if lines else 0) > limit:
+				if not lines:
+					lines.append(line[:limit])
+				break
+			lines.append(line)
+			length += len(line) + 1
+		if not lines:
+			return 'Log empty'
+		lines.reverse()
+		return '\n'.join(lines)
+
+	def snapshot(self):
+		"""Entry counts per level, entries held and dropped"""
+		counts = dict((LEVELS[i].lower(), self.counts[i]) for i in range(len(self.counts)))
+		return {'entries': self.entries, 'dropped': self.dropped, 'counts': counts}
+
+	def pack(self, limit=RECORD_SIZE):
+		"""Pack entries into binary records of at most limit bytes, oldest first: version, entry count,
+		then per entry timestamp, level, module name and message (length prefixed, truncated to fit)"""
+		records = []
+		data = bytearray([LOG_VERSION, 0])
+		for timestamp, level, name, text in self.records():
+			name = name.encode()[:16]
+			entry = bytearray(ustruct.pack('>IBB', timestamp, level, len(name)))
+			entry.extend(name)
+			message = text.encode()[:max(limit - 2 - len(entry) - 1, 0)]
+			entry.append(len(message))
+			entry.extend(message)
+			if len(data) + len(entry) > limit:
+				records.append(bytes(data))
+				data = bytearray([LOG_VERSION, 0])
+			data.extend(entry)
+			data[1] += 1
+		if data[1]:
+			records.append(bytes(data))
+		return records
+
+
+def decode_log(data):
+	"""Decode binary log record into entry dicts"""
+	version, count = data[0], data[1]
+	offset = 2
+	entries = []
+	for _ in range(count):
+		timestamp, level, size = ustruct.unpack('>IBB', data[offset:offset + 6])
+		offset += 6
+		module = bytes(data[offset:offset + size]).decode()
+		offset += size
+		size = data[offset]
+		entries.append({
+			'timestamp': timestamp,
+			'level': LEVELS[level] if level < len(LEVELS) else str(level),
+			'module': module,
+			'text': _text(data[offset + 1:offset + 1 + size])
+		})
+		offset += 1 + size
+	return {'version': version, 'entries': entries}
+
+
+logger = LogRing()
+
+
+def get_logger(name):
+	"""Get handle of module name from the shared ring"""
+	return logger.get(name)
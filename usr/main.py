@@ -1,377 +1,649 @@
-import utime
-import _thread
-import gc
-import net
-import dataCall
-import checkNet
-import ntptime
-import modem
-from machine import Pin, UART
-from misc import Power
-
-from usr.config import Config
-from usr.led_controller import Leds, Led
-from usr.gps_controller import GPSController
-from usr.wifi_scanner import WiFiScanner
-from usr.battery import BatteryMonitor
-from usr.sms_handler import SMSHandler
-from usr.data_buffer import DataBuffer
-from usr.gt06_protocol import GT06Protocol
-from usr.http_protocol import HTTPProtocol
-
-
-GNSS_PORT = UART.UART2
-GNSS_PIN = Pin.GPIO10
-
-
-class GPSTracker:
-	"""Main GPS Tracker class"""
-
-	def __init__(self):
-		print('Initializing GPS Tracker...')
-		self.config = Config()
-		self.leds = Leds(red_pin=15, blue_pin=16, yellow_pin=17)
-		self.leds.set_battery_status(Led.MODE_ON)
-		self.battery = BatteryMonitor()
-		self.gps = GPSController(GNSS_PORT, GNSS_PIN)
-		self.wifi_scanner = WiFiScanner()
-		self.sms_handler = SMSHandler(self.config, self._config_callback)
-		self.data_buffer = DataBuffer()
-		self.protocol = None
-		self._init_protocol()
-		self.running = True
-		self.sleep_mode = False
-		self.last_movement_time = utime.time()
-		self.last_location = None
-		self.connected = False
-		self.gps_available = False
-		self.ntp_synced = False
-		_thread.start_new_thread(self._main_loop, ())
-		_thread.start_new_thread(self._battery_monitor_loop, ())
-		print('GPS Tracker initialized')
-
-	def _init_protocol(self):
-		"""Initialize communication protocol"""
-		server = self.config.get('server')
-		if server and server['host'] and server['port']:
-			protocol_type = server['protocol'].upper()
-			if protocol_type == 'GT06':
-				self.protocol = GT06Protocol(server['host'], server['port'], self.leds)
-			elif protocol_type == 'HTTP':
-				self.protocol = HTTPProtocol(server['host'], server['port'], server.get('path', '/api/location'), self.leds)
-			else:
-				print('Unknown protocol:', protocol_type)
-				self.protocol = None
-		else:
-			self.protocol = None
-			print('Server not configured')
-
-	def _config_callback(self, event, *args):
-		"""Callback on configuration change"""
-		if event in ['apn_changed', 'server_changed']:
-			print('Configuration changed, reinitializing...')
-			self._init_network()
-			self._init_protocol()
-		elif event == 'interval_changed':
-			print('Update interval changed')
-		elif event == 'wifi_server_changed':
-			print('WiFi location server changed')
-		elif event == 'get_status':
-			return self._get_status()
-		elif event == 'poweroff':
-			self._poweroff()
-		elif event == 'reset':
-			self._reset()
-
-	def _init_network(self):
-		"""Initialize network connection"""
-		try:
-			checkNet.waitNetworkReady(30)
-			apn_config = self.config.get('apn')
-			if apn_config['name']:
-				dataCall.setApn(1, 0, apn_config['name'], apn_config['user'], apn_config['password'], 0)
-			dataCall.setCallback(self._datacall_callback)
-			ret = dataCall.activate(1)
-			print('Network initialized, PDP active:', ret == 0)
-			if ret == 0 and not self.ntp_synced:
-				self._sync_ntp()
-			return ret == 0
-		except Exception as e:
-			print('Network init error:', e)
-			return False
-
-	def _datacall_callback(self, args):
-		"""Callback on PDP context state change"""
-		pdp_id = args[0]
-		status = args[1]
-		print('PDP context', pdp_id, 'status:', status)
-		if status == 1:
-			print('Network connected')
-			if not self.ntp_synced:
-				self._sync_ntp()
-		else:
-			print('Network disconnected')
-
-	def _sync_ntp(self):
-		"""Sync time via NTP"""
-		try:
-			print('Syncing time via NTP...')
-			ntptime.host = 'pool.ntp.org'
-			ntptime.settime()
-			self.ntp_synced = True
-			print('NTP time synced')
-		except Exception as e:
-			print('NTP sync error:', e)
-
-	def _main_loop(self):
-		"""Main tracker loop"""
-		self._init_network()
-		self.gps.enable()
-		self.leds.set_gps_status(Led.MODE_BLINK_1HZ)
-		update_interval = self.config.get('update_interval', 10)
-		last_update = 0
-		while self.running:
-			try:
-				current_time = utime.time()
-				if self._check_sleep_mode():
-					self._enter_sleep_mode()
-					utime.sleep(10)
-					continue
-				if self.sleep_mode:
-					self._exit_sleep_mode()
-				if self.gps.is_valid():
-					self.leds.set_gps_status(Led.MODE_ON)
-					self.gps_available = True
-					if not self.sleep_mode:
-						self.gps.sync_rtc()
-				else:
-					self.leds.set_gps_status(Led.MODE_BLINK_1HZ)
-					self.gps_available = False
-				if current_time - last_update >= update_interval:
-					self._send_location_data()
-					last_update = current_time
-				if self.connected and self.data_buffer.size() > 0:
-					self._send_buffered_data()
-				utime.sleep(1)
-			except Exception as e:
-				print('Main loop error:', e)
-				utime.sleep(5)
-
-	def _send_location_data(self):
-		"""Send location data"""
-		try:
-			location = None
-			wifi_networks = []
-			if self.gps_available:
-				location = self.gps.get_location()
-			if not location or not location.get('valid'):
-				wifi_enabled = self.config.get('wifi_location_enabled', False)
-				if wifi_enabled:
-					print('GPS unavailable, scanning WiFi networks...')
-					wifi_networks = self.wifi_scanner.scan_networks()
-					if wifi_networks and len(wifi_networks) > 0:
-						print('Found {} WiFi networks'.format(len(wifi_networks)))
-						location = {'valid': False, 'latitude': 0.0, 'longitude': 0.0, 'altitude': 0.0,
-                                                    'speed': 0.0, 'course': 0.0, 'satellites': 0, 'source': 'wifi', 'accuracy': 0}
-			if not location:
-				print('No location data available')
-				return
-			if self._detect_movement(location):
-				self.last_movement_time = utime.time()
-			data = {'timestamp': utime.time(), 'latitude': location['latitude'], 'longitude': location['longitude'], 'altitude': location.get('altitude', 0.0), 'speed': location.get('speed', 0.0), 'course': location.get('course', 0.0), 'satellites': location.get(
-				'satellites', 0), 'battery': self.battery.get_percentage(), 'charging': self.battery.is_charging, 'valid': location.get('valid', False), 'source': location.get('source', 'gps'), 'accuracy': location.get('accuracy', 0)}
-			if wifi_networks and len(wifi_networks) > 0:
-				data['wifi_networks'] = wifi_networks
-			if self.protocol:
-				self.leds.set_network_status(Led.MODE_PULSE)
-				self.leds.network_data_start()
-				success = self.protocol.send_location(data)
-				self.leds.network_data_stop()
-				if success:
-					self.connected = True
-					print('Location sent successfully')
-				else:
-					self.connected = False
-					if self.config.get('buffer_enabled'):
-						if self.data_buffer.add(data):
-							print('Data buffered, size:', self.data_buffer.size())
-						else:
-							print('Buffer full, data lost')
-			else:
-				if self.config.get('buffer_enabled'):
-					self.data_buffer.add(data)
-					print('No server, data buffered')
-			self.last_location = location
-		except Exception as e:
-			print('Send location error:', e)
-
-	def _send_buffered_data(self):
-		"""Send buffered data"""
-		try:
-			buffered = self.data_buffer.get_all()
-			if not buffered:
-				return
-			print('Sending buffered data, count:', len(buffered))
-			sent_count = 0
-			for data in buffered:
-				self.leds.network_data_start()
-				success = self.protocol.send_location(data)
-				self.leds.network_data_stop()
-				if success:
-					sent_count += 1
-				else:
-					print('Failed to send buffered data, stopping')
-					break
-				utime.sleep_ms(100)
-			if sent_count > 0:
-				self.data_buffer.remove(sent_count)
-				print('Sent {} buffered records'.format(sent_count))
-		except Exception as e:
-			print('Send buffered data error:', e)
-
-	def _detect_movement(self, location):
-		"""Detect movement based on location change"""
-		if not self.last_location:
-			return True
-		if location.get('speed', 0) > 1.0:
-			return True
-		lat_diff = abs(location['latitude'] - self.last_location['latitude'])
-		lon_diff = abs(location['longitude'] - self.last_location['longitude'])
-		if lat_diff > 0.0001 or lon_diff > 0.0001:
-			return True
-		return False
-
-	def _check_sleep_mode(self):
-		"""Check if should enter sleep mode"""
-		if self.sleep_mode:
-			return False
-		sleep_timeout = self.config.get('sleep_timeout', 1800)
-		idle_time = utime.time() - self.last_movement_time
-		return idle_time >= sleep_timeout
-
-	def _enter_sleep_mode(self):
-		"""Enter sleep mode"""
-		if not self.sleep_mode:
-			print('Entering sleep mode')
-			self.sleep_mode = True
-			self.gps.disable()
-			self.leds.set_gps_status(Led.MODE_OFF)
-			self.wifi_scanner.disable()
-			self.leds.set_network_status(Led.MODE_OFF)
-			self.leds.set_battery_status(Led.MODE_BLINK_SLOW)
-			if self.protocol:
-				self.protocol.disconnect()
-			print('Sleep mode active')
-
-	def _exit_sleep_mode(self):
-		"""Exit sleep mode"""
-		if self.sleep_mode:
-			print('Exiting sleep mode')
-			self.sleep_mode = False
-			self.gps.enable()
-			self.leds.set_gps_status(Led.MODE_BLINK_1HZ)
-			self._update_battery_led()
-			if self.protocol:
-				self.protocol.connect()
-			self.last_movement_time = utime.time()
-			print('Sleep mode exited')
-
-	def _battery_monitor_loop(self):
-		"""Battery monitoring loop"""
-		while self.running:
-			try:
-				self.battery.update()
-				if not self.sleep_mode:
-					self._update_battery_led()
-				utime.sleep(5)
-			except Exception as e:
-				print('Battery monitor error:', e)
-				utime.sleep(10)
-
-	def _update_battery_led(self):
-		"""Update battery status LED"""
-		if self.battery.is_charging:
-			self.leds.set_battery_status(Led.MODE_BLINK_1HZ)
-		elif self.battery.is_low(20):
-			self.leds.set_battery_status(Led.MODE_BLINK_4HZ)
-		else:
-			self.leds.set_battery_status(Led.MODE_ON)
-
-	def _get_status(self):
-		"""Get device status"""
-		location = self.last_location
-		status = 'GPS Tracker Status:\n'
-		status += 'Battery: {}%{}\n'.format(self.battery.get_percentage(), ' (Charging)' if self.battery.is_charging else '')
-		status += 'Voltage: {:.2f}V\n'.format(self.battery.voltage)
-		status += 'Sleep: {}\n'.format('Yes' if self.sleep_mode else 'No')
-		status += 'GPS: {}\n'.format('Valid' if self.gps_available else 'Invalid')
-		if location and location.get('valid'):
-			status += 'Source: {}\n'.format(location.get('source', 'unknown'))
-			status += 'Lat: {:.6f}\n'.format(location['latitude'])
-			status += 'Lon: {:.6f}\n'.format(location['longitude'])
-			status += 'Speed: {:.1f} km/h\n'.format(location.get('speed', 0))
-			status += 'Sats: {}\n'.format(location.get('satellites', 0))
-		status += 'Buffer: {} records\n'.format(self.data_buffer.size())
-		status += 'Connected: {}\n'.format('Yes' if self.connected else 'No')
-		gc.collect()
-		status += 'Memory free: {} bytes'.format(gc.mem_free())
-		return status
-
-	def _poweroff(self):
-		"""Power off device"""
-		print('Powering off device...')
-		try:
-			self.config.save()
-			self.cleanup()
-			utime.sleep(1)
-			Power.powerDown()
-		except Exception as e:
-			print('Poweroff error:', e)
-
-	def _reset(self):
-		"""Reset device"""
-		print('Resetting device...')
-		try:
-			self.config.save()
-			self.cleanup()
-			utime.sleep(1)
-			Power.powerRestart()
-		except Exception as e:
-			print('Reset error:', e)
-
-	def cleanup(self):
-		"""Cleanup resources"""
-		print('Cleaning up...')
-		self.running = False
-		self.gps.disable()
-		self.wifi_scanner.disable()
-		self.leds.cleanup()
-		if self.protocol:
-			self.protocol.disconnect()
-		print('Cleanup complete')
-
-
-if __name__ == '__main__':
-	try:
-		print('=== GPS Tracker Starting ===')
-		imei = modem.getDevImei()
-		print('IMEI:', imei)
-		tracker = GPSTracker()
-		while True:
-			utime.sleep(60)
-			gc.collect()
-			free_mem = gc.mem_free()
-			total_mem = gc.mem_free() + gc.mem_alloc()
-			mem_percent = (free_mem / total_mem) * 100
-			print('Memory: {} bytes free ({:.1f}%)'.format(free_mem, mem_percent))
-	except KeyboardInterrupt:
-		print('Interrupted by user')
-		tracker.cleanup()
-	except Exception as e:
-		print('Fatal error:', e)
-		import sys
-		sys.print_exception(e)
-		try:
-			tracker.cleanup()
-		except:
-			pass
+import utime
+import _thread
+import gc
+import net
+import dataCall
+import checkNet
+import ntptime
+import modem
+from machine import Pin, UART
+from misc import Power
+
+from usr.boot import boot_profile
+from usr.config import Config
+from usr.led_controller import Leds, Led
+from usr.gps_controller import GPSController
+from usr.cell_scanner import CellScanner, cells_size
+from usr.battery import BatteryMonitor
+from usr.data_buffer import DataBuffer
+from usr.gt06_protocol import GT06Protocol
+from usr.http_protocol import HTTPProtocol
+from usr.uplink import UplinkWorker
+from usr.failover import FailoverProtocol
+from usr.location import LocationFix, fixes
+from usr.sleep_manager import SleepManager
+from usr.power_policy import PowerPolicy
+from usr.status import format_status, pack_status, SMS_LIMIT
+from usr.metrics import metrics
+from usr.memory import memory
+from usr.energy import energy
+from usr.logger import logger, get_logger
+from usr.connection import link
+
+
+log = get_logger('main')
+
+GNSS_PORT = UART.UART2
+GNSS_PIN = Pin.GPIO10
+# Seconds to stay awake after a timer/SMS wake before parking again
+WAKE_CHECK_TIME = 120
+# Seconds without movement after which cached WiFi fingerprints are reused
+STATIONARY_TIME = 60
+# Max speed (km/h) and fingerprint age (s) for learning AP positions from GNSS
+LEARN_MAX_SPEED = 5
+LEARN_MAX_AGE = 15
+
+
+class GPSTracker:
+	"""Main GPS Tracker class"""
+
+	def __init__(self):
+		log.info('Initializing GPS Tracker...')
+		memory.configure()
+		# Stage 1: GNSS acquisition starts before anything else
+		self.gps = GPSController(GNSS_PORT, GNSS_PIN)
+		self.gps.enable()
+		boot_profile.mark('gnss_on')
+		self.config = Config()
+		self._configure_log()
+		energy.configure(self.config.get('energy_currents'), self.config.get('rrc_tail', 10))
+		self.leds = Leds(red_pin=15, blue_pin=16, yellow_pin=17, eco_timeout=self.config.get('led_eco_timeout', 0))
+		self.leds.set_battery_status(Led.MODE_ON)
+		self.leds.set_gps_status(Led.MODE_BLINK_1HZ)
+		self.battery = BatteryMonitor()
+		self.policy = PowerPolicy(self.battery, self.config)
+		# Effective interval changed, main loop pulls the next report in if it is due later
+		self.reschedule = False
+		self.sleep_manager = SleepManager(self.config.get('motion_pin'))
+		self.cell_scanner = CellScanner()
+		# WiFi scanner, BSSID cache and SMS handler are loaded on first use
+		self._wifi_scanner = None
+		self._bssid_cache = None
+		self.learned_fingerprint = None
+		self.sms_handler = None
+		self.data_buffer = DataBuffer()
+		self.uplink = UplinkWorker(self.data_buffer, self.config, self.leds, self.battery)
+		link.reactivate = self._init_network
+		link.on_ready = self.uplink.request_flush
+		self._configure_burst()
+		self.protocol = self._build_protocol()
+		self.uplink.set_protocol(self.protocol)
+		# Background protocol rebuild after SERVER/APN changes: running, requested again, APN changed
+		self.reconfiguring = False
+		self.reconfigure_pending = False
+		self.reconfigure_network = False
+		self.reconfigure_lock = _thread.allocate_lock()
+		self.running = True
+		self.sleep_mode = False
+		self.last_movement_time = utime.time()
+		self.last_location = None
+		self.gps_available = False
+		self.ntp_synced = False
+		self.last_status_time = utime.time()
+		boot_profile.mark('init')
+		# Stage 2: sampling and network bring-up run concurrently
+		self.uplink.start()
+		_thread.start_new_thread(self._network_bringup, ())
+		_thread.start_new_thread(self._main_loop, ())
+		_thread.start_new_thread(self._battery_monitor_loop, ())
+		log.info('GPS Tracker initialized')
+
+	@property
+	def wifi_scanner(self):
+		"""WiFi scanner, imported and created on first use"""
+		if self._wifi_scanner is None:
+			from usr.wifi_scanner import WiFiScanner
+			self._wifi_scanner = WiFiScanner(self.config.get('wifi_max_aps', 8), self.config.get('wifi_max_age', 300))
+		return self._wifi_scanner
+
+	@property
+	def bssid_cache(self):
+		"""BSSID position cache, loaded from flash on first use"""
+		if self._bssid_cache is None:
+			from usr.bssid_cache import BSSIDCache
+			self._bssid_cache = BSSIDCache(self.config.get('bssid_cache_buckets', 64))
+		return self._bssid_cache
+
+	def _init_sms(self):
+		"""Create SMS handler (needs network registration)"""
+		if self.sms_handler is None:
+			from usr.sms_handler import SMSHandler
+			self.sms_handler = SMSHandler(self.config, self._config_callback)
+
+	def _network_bringup(self):
+		"""Attach to network, then start NTP, SMS and protocol login"""
+		active = self._init_network()
+		link.pdp_changed(active)
+		if active:
+			boot_profile.mark('pdp_active')
+		self._init_sms()
+		boot_profile.mark('sms_ready')
+		protocol = self.protocol
+		if protocol and active:
+			if protocol.connect():
+				link.success()
+				boot_profile.mark('login')
+				if protocol is not self.protocol:
+					# Replaced by a reconfiguration while logging in
+					protocol.disconnect()
+				self.uplink.set_protocol(self.protocol)
+			else:
+				link.failure(protocol.failure)
+
+	def _build_protocol(self):
+		"""Create communication protocol from config, with failover when backup servers are configured"""
+		server = self.config.get('server')
+		if not server or not server['host'] or not server['port']:
+			log.warn('Server not configured')
+			return None
+		protocol = self._create_protocol(server)
+		endpoints = [(protocol, '{}:{}'.format(server['host'], server['port']))] if protocol else []
+		for backup in self.config.get('servers') or []:
+			protocol = self._create_protocol(backup)
+			if protocol:
+				endpoints.append((protocol, '{}:{}'.format(backup['host'], backup['port'])))
+		if not endpoints:
+			return None
+		protocol = FailoverProtocol(endpoints, self.config.get('duplicate_events', False)) if len(endpoints) > 1 else endpoints[0][0]
+		protocol.command_callback = self._remote_command
+		return protocol
+
+	def _reconfigure(self, network=False):
+		"""Rebuild protocol (and network after an APN change) in a background thread, changes arriving
+		meanwhile are picked up by the same thread; the uplink switches over at its next send boundary"""
+		with self.reconfigure_lock:
+			self.reconfigure_pending = True
+			self.reconfigure_network = self.reconfigure_network or network
+			if self.reconfiguring:
+				return
+			self.reconfiguring = True
+		_thread.start_new_thread(self._reconfigure_worker, ())
+
+	def _reconfigure_worker(self):
+		"""Reconfiguration thread: network bring-up, protocol build and warm-up connect, then hand over to the uplink"""
+		while True:
+			with self.reconfigure_lock:
+				if not self.reconfigure_pending:
+					self.reconfiguring = False
+					return
+				self.reconfigure_pending = False
+				network = self.reconfigure_network
+				self.reconfigure_network = False
+			try:
+				if network:
+					log.info('APN changed, reinitializing...')
+					link.pdp_changed(self._init_network())
+				protocol = self._build_protocol()
+				if protocol and link.ready() and not self.sleep_mode:
+					# Connect (GT06 login) before the switch so the first send after it goes out at once;
+					# a failure is left to the first send, which applies the backoff
+					log.info('Connecting to server in background')
+					protocol.connect()
+				self.protocol = protocol
+				self.uplink.set_protocol(protocol)
+			except Exception as e:
+				log.error('Reconfiguration error: {}', e)
+
+	def _create_protocol(self, server):
+		"""Protocol instance for server config entry, None if the protocol is unknown"""
+		protocol_type = server['protocol'].upper()
+		if protocol_type == 'GT06':
+			return GT06Protocol(server['host'], server['port'], self.leds)
+		elif protocol_type == 'HTTP':
+			return HTTPProtocol(server['host'], server['port'], server.get('path', '/api/location'), self.leds, self.config.get('http_batch', False))
+		log.error('Unknown protocol: {}', protocol_type)
+		return None
+
+	@property
+	def connected(self):
+		"""Server connection state as seen by uplink worker"""
+		return self.uplink.connected
+
+	def _config_callback(self, event, *args):
+		"""Callback on configuration change"""
+		if event == 'sms_received':
+			self.sleep_manager.wake(SleepManager.WAKE_SMS)
+		elif event == 'apn_changed':
+			self._reconfigure(network=True)
+		elif event == 'server_changed':
+			self._reconfigure()
+		elif event in ('interval_changed', 'sleep_changed', 'wifi_changed'):
+			self.policy.refresh()
+			self.reschedule = True
+			log.info('Reporting settings changed: interval {}s, sleep {}s', self.policy.update_interval, self.policy.sleep_timeout)
+		elif event == 'wifi_server_changed':
+			log.info('WiFi location server changed')
+		elif event == 'burst_changed':
+			self._configure_burst()
+		elif event == 'log_changed':
+			self._configure_log()
+		elif event == 'log_upload':
+			self._submit_log()
+		elif event == 'get_status':
+			return self._get_status(*args)
+		elif event == 'poweroff':
+			self._poweroff()
+		elif event == 'reset':
+			self._reset()
+
+	def _remote_command(self, command_id, text):
+		"""Queue command received over the data channel (called from uplink thread)"""
+		if not self.config.get('remote_config_enabled', True) or not self.sms_handler:
+			log.warn('Server command ignored')
+			return
+		self.sms_handler.submit_remote(text, lambda reply: self._submit_reply(command_id, reply))
+
+	def _submit_reply(self, command_id, reply):
+		"""Queue command acknowledgement for the server"""
+		self.uplink.submit({'timestamp': utime.time(), 'reply': reply, 'command_id': command_id})
+
+	def _init_network(self):
+		"""Initialize network connection"""
+		try:
+			checkNet.waitNetworkReady(30)
+			apn_config = self.config.get('apn')
+			if apn_config['name']:
+				dataCall.setApn(1, 0, apn_config['name'], apn_config['user'], apn_config['password'], 0)
+			dataCall.setCallback(self._datacall_callback)
+			ret = dataCall.activate(1)
+			log.info('Network initialized, PDP active: {}', ret == 0)
+			if ret == 0 and not self.ntp_synced:
+				_thread.start_new_thread(self._sync_ntp, ())
+			return ret == 0
+		except Exception as e:
+			log.error('Network init error: {}', e)
+			return False
+
+	def _datacall_callback(self, args):
+		"""Callback on PDP context state change"""
+		pdp_id = args[0]
+		status = args[1]
+		log.debug('PDP context {} status: {}', pdp_id, status)
+		link.pdp_changed(status == 1)
+		if status == 1:
+			log.info('Network connected')
+			if not self.ntp_synced:
+				_thread.start_new_thread(self._sync_ntp, ())
+		else:
+			log.warn('Network disconnected')
+
+	def _sync_ntp(self):
+		"""Sync time via NTP"""
+		try:
+			log.debug('Syncing time via NTP...')
+			ntptime.host = 'pool.ntp.org'
+			ntptime.settime()
+			self.ntp_synced = True
+			boot_profile.mark('ntp_synced')
+			log.info('NTP time synced')
+		except Exception as e:
+			log.error('NTP sync error: {}', e)
+
+	def _main_loop(self):
+		"""Main tracker loop"""
+		next_update = utime.ticks_ms()
+		while self.running:
+			loop_start = utime.ticks_ms()
+			try:
+				if self._check_sleep_mode():
+					self._enter_sleep_mode()
+					reason = self.sleep_manager.sleep(self.config.wake_interval)
+					self._exit_sleep_mode(reason)
+					next_update = utime.ticks_ms()
+					continue
+				if self.gps.is_valid():
+					self.leds.set_gps_status(Led.MODE_ON)
+					self.gps_available = True
+					if not self.sleep_mode:
+						self.gps.sync_rtc()
+				else:
+					self.leds.set_gps_status(Led.MODE_BLINK_1HZ)
+					self.gps_available = False
+				now = utime.ticks_ms()
+				if self.reschedule:
+					self.reschedule = False
+					earliest = utime.ticks_add(now, self.policy.update_interval * 1000)
+					if utime.ticks_diff(next_update, earliest) > 0:
+						next_update = earliest
+				if utime.ticks_diff(now, next_update) >= 0:
+					self._send_location_data()
+					metrics.observe('backlog', self.data_buffer.size() + self.uplink.queue.size())
+					interval_ms = self.policy.update_interval * 1000
+					next_update = utime.ticks_add(next_update, interval_ms)
+					if utime.ticks_diff(utime.ticks_ms(), next_update) >= 0:
+						# Fell behind by more than an interval, restart cadence from now
+						next_update = utime.ticks_add(now, interval_ms)
+				if self.config.status_interval and utime.time() - self.last_status_time >= self.config.status_interval:
+					self._submit_status()
+				if self.policy.flush_due():
+					self.uplink.request_flush()
+				self.config.flush()
+				metrics.incr('loop')
+				metrics.observe_since('loop_ms', loop_start)
+				memory.sample()
+				energy.sample()
+				logger.flush()
+				utime.sleep_ms(max(0, min(1000, utime.ticks_diff(next_update, utime.ticks_ms()))))
+			except Exception as e:
+				log.error('Main loop error: {}', e)
+				metrics.incr('loop_error')
+				utime.sleep(5)
+
+	def _send_location_data(self):
+		"""Send location data"""
+		location = None
+		try:
+			wifi = None
+			cells = None
+			if self.gps_available:
+				location = self.gps.get_location()
+			if location:
+				self._learn_bssids(location)
+			else:
+				if self.config.lbs_enabled:
+					cells = self.cell_scanner.get_cells()
+				if self.policy.wifi_enabled:
+					stationary = utime.time() - self.last_movement_time >= STATIONARY_TIME
+					wifi = self.wifi_scanner.get_fingerprint(stationary, self.policy.update_interval)
+				position = self.bssid_cache.locate(wifi) if wifi else None
+				if position:
+					log.debug('Position resolved from BSSID cache')
+					location = fixes.acquire()
+					location.valid = True
+					location.latitude, location.longitude, location.accuracy = position
+					location.source = 'wifi_cache'
+				elif wifi or cells:
+					log.debug('Using {} WiFi networks, {} cells', wifi[0] if wifi else 0, cells_size(cells))
+					location = fixes.acquire()
+					location.source = 'hybrid' if wifi and cells else ('wifi' if wifi else 'lbs')
+					location.wifi = wifi
+					location.cells = cells
+			if not location:
+				log.debug('No location data available')
+				return
+			if self._detect_movement(location):
+				self.last_movement_time = utime.time()
+			location.timestamp = utime.time()
+			location.battery = self.battery.get_percentage()
+			location.charging = self.battery.is_charging
+			if self.last_location is None:
+				self.last_location = LocationFix()
+			self.last_location.copy_from(location)
+		except Exception as e:
+			log.error('Send location error: {}', e)
+			fixes.release(location)
+			return
+		# The uplink owns the fix from here and returns it to the pool once sent
+		self.uplink.submit(location)
+
+	def _learn_bssids(self, location):
+		"""Learn AP positions from a fresh WiFi scan taken at a GNSS fix"""
+		learn_interval = self.config.wifi_learn_interval
+		if not learn_interval or not self.policy.wifi_enabled:
+			return
+		if location.speed > LEARN_MAX_SPEED:
+			return
+		scanner = self.wifi_scanner
+		age = utime.time() - scanner.fingerprint_time
+		if scanner.fingerprint and age <= LEARN_MAX_AGE and scanner.fingerprint is not self.learned_fingerprint:
+			self.bssid_cache.learn(scanner.fingerprint, location.latitude, location.longitude)
+			self.learned_fingerprint = scanner.fingerprint
+			self.bssid_cache.flush()
+		elif age >= learn_interval:
+			scanner.start_scan()
+
+	def _detect_movement(self, location):
+		"""Detect movement based on location change"""
+		if not location.valid:
+			# Fallback reports carry no usable position
+			return False
+		if location.speed > 1.0:
+			return True
+		if not self.last_location:
+			return True
+		if not self.last_location.valid:
+			return False
+		lat_diff = abs(location.latitude - self.last_location.latitude)
+		lon_diff = abs(location.longitude - self.last_location.longitude)
+		if lat_diff > 0.0001 or lon_diff > 0.0001:
+			return True
+		return False
+
+	def _check_sleep_mode(self):
+		"""Check if should enter sleep mode"""
+		if self.sleep_mode:
+			return False
+		idle_time = utime.time() - self.last_movement_time
+		return idle_time >= self.policy.sleep_timeout
+
+	def _enter_sleep_mode(self):
+		"""Enter sleep mode"""
+		if not self.sleep_mode:
+			log.info('Entering sleep mode')
+			self.sleep_mode = True
+			self.gps.disable()
+			self.leds.set_gps_status(Led.MODE_OFF)
+			if self._wifi_scanner:
+				self._wifi_scanner.disable()
+			if self._bssid_cache:
+				self._bssid_cache.flush(force=True)
+			self.config.flush(force=True)
+			self.leds.set_network_status(Led.MODE_OFF)
+			self.leds.set_battery_status(Led.MODE_BLINK_SLOW)
+			# The uplink closes the connection once a send in progress (event, reply) is done
+			self.uplink.disconnect()
+			log.debug('Sleep mode active')
+
+	def _exit_sleep_mode(self, reason=SleepManager.WAKE_MOTION):
+		"""Exit sleep mode"""
+		if self.sleep_mode:
+			log.info('Exiting sleep mode')
+			self.sleep_mode = False
+			self.gps.enable()
+			self.leds.set_gps_status(Led.MODE_BLINK_1HZ)
+			self._update_battery_led()
+			if self.protocol and link.ready():
+				if self.protocol.connect():
+					link.success()
+				else:
+					link.failure(self.protocol.failure)
+			if reason == SleepManager.WAKE_MOTION:
+				self.last_movement_time = utime.time()
+			else:
+				# Short check-in: report position and park again unless movement is detected
+				self.last_movement_time = utime.time() - self.policy.sleep_timeout + WAKE_CHECK_TIME
+			log.debug('Sleep mode exited')
+
+	def _battery_monitor_loop(self):
+		"""Battery monitoring loop"""
+		while self.running:
+			try:
+				self.battery.update()
+				tier = self.policy.evaluate()
+				if tier:
+					self._apply_power_tier(tier)
+				if not self.sleep_mode:
+					self._update_battery_led()
+					utime.sleep(self.battery.next_interval())
+				else:
+					utime.sleep(300)
+			except Exception as e:
+				log.error('Battery monitor error: {}', e)
+				utime.sleep(10)
+
+	def _apply_power_tier(self, tier):
+		"""Apply power policy tier change"""
+		self.uplink.set_store_only(tier.get('store', False))
+		self.reschedule = True
+		if tier.get('event'):
+			self._submit_event('low_battery')
+		if tier.get('shutdown'):
+			self._low_battery_shutdown()
+
+	def _submit_event(self, event):
+		"""Queue event record for the server"""
+		fix = fixes.acquire()
+		if self.last_location:
+			fix.copy_from(self.last_location)
+			fix.speed = 0.0
+			fix.course = 0.0
+			fix.wifi = None
+			fix.cells = None
+		fix.timestamp = utime.time()
+		fix.battery = self.battery.get_percentage()
+		fix.charging = self.battery.is_charging
+		fix.event = event
+		self.uplink.submit(fix)
+
+	def _low_battery_shutdown(self):
+		"""Report shutdown, persist buffered data and power down"""
+		log.warn('Battery exhausted, shutting down')
+		self._submit_event('shutdown')
+		for _ in range(15):
+			if self.uplink.idle():
+				break
+			utime.sleep(1)
+		self.uplink.stop()
+		self.uplink.spill()
+		self.data_buffer.save_to_flash()
+		self._poweroff()
+
+	def _update_battery_led(self):
+		"""Update battery status LED"""
+		if self.battery.is_charging:
+			self.leds.set_battery_status(Led.MODE_BLINK_1HZ)
+		elif self.battery.is_low(20):
+			self.leds.set_battery_status(Led.MODE_BLINK_4HZ)
+		else:
+			self.leds.set_battery_status(Led.MODE_ON)
+
+	def _status_snapshot(self):
+		"""Collect status fields shared by SMS reply and telemetry"""
+		location = self.last_location or LocationFix()
+		valid = location.valid
+		metrics = self.uplink.get_metrics()
+		sms_metrics = self.sms_handler.get_metrics() if self.sms_handler else None
+		return {
+			'valid': valid,
+			'latitude': location.latitude if valid else 0.0,
+			'longitude': location.longitude if valid else 0.0,
+			'speed': location.speed,
+			'satellites': location.satellites,
+			'source': location.source,
+			'battery': self.battery.get_percentage(),
+			'charging': self.battery.is_charging,
+			'voltage': self.battery.get_voltage(),
+			'hours': self.battery.get_hours_remaining(),
+			'tier': self.policy.get_name(),
+			'tier_index': self.policy.tiers.index(self.policy.tier),
+			'connected': self.connected,
+			'buffer': self.data_buffer.size(),
+			'queue': metrics['depth'],
+			'latency': metrics['avg_latency_ms'],
+			'sleep': self.sleep_mode,
+			'sleep_total': self.sleep_manager.get_sleep_time(),
+			'radio': energy.radio_time(),
+			'mem_free': gc.mem_free(),
+			'sms': (sms_metrics['processed'], sms_metrics['duplicates']) if sms_metrics else None
+		}
+
+	def _get_status(self, fields=None, limit=SMS_LIMIT):
+		"""Get device status as one line of at most limit characters"""
+		return format_status(self._status_snapshot(), fields, limit)
+
+	def _submit_status(self):
+		"""Queue binary status, metrics and memory telemetry records for the server"""
+		self.last_status_time = utime.time()
+		data = {'timestamp': utime.time(), 'battery': self.battery.get_percentage(), 'charging': self.battery.is_charging,
+		        'status': pack_status(self._status_snapshot())}
+		self.uplink.submit(data)
+		self.uplink.submit({'timestamp': utime.time(), 'battery': data['battery'], 'charging': data['charging'], 'metrics': metrics.pack()})
+		self.uplink.submit({'timestamp': utime.time(), 'battery': data['battery'], 'charging': data['charging'], 'memory': memory.pack()})
+
+	def _configure_burst(self):
+		"""Apply burst mode settings from config"""
+		self.uplink.set_burst(self.config.get('burst_points', 0), self.config.get('burst_interval', 0))
+
+	def _configure_log(self):
+		"""Apply log levels, console level and flash spill from config"""
+		logger.configure(self.config.get('log_level', 'INFO'), self.config.get('log_levels') or {},
+		                 self.config.get('log_console', 'WARN'), self.config.get('log_spill', False))
+
+	def _submit_log(self):
+		"""Queue log ring contents for the server as binary records"""
+		battery = self.battery.get_percentage()
+		for record in logger.pack():
+			self.uplink.submit({'timestamp': utime.time(), 'battery': battery, 'charging': self.battery.is_charging, 'log': record})
+
+	def _poweroff(self):
+		"""Power off device"""
+		log.warn('Powering off device...')
+		try:
+			self.config.save()
+			self.cleanup()
+			utime.sleep(1)
+			Power.powerDown()
+		except Exception as e:
+			log.error('Poweroff error: {}', e)
+
+	def _reset(self):
+		"""Reset device"""
+		log.warn('Resetting device...')
+		try:
+			self.config.save()
+			self.cleanup()
+			utime.sleep(1)
+			Power.powerRestart()
+		except Exception as e:
+			log.error('Reset error: {}', e)
+
+	def cleanup(self):
+		"""Cleanup resources"""
+		log.info('Cleaning up...')
+		self.running = False
+		self.uplink.stop()
+		if self.sms_handler:
+			self.sms_handler.stop()
+		self.sleep_manager.cleanup()
+		self.gps.disable()
+		if self._wifi_scanner:
+			self._wifi_scanner.disable()
+		if self._bssid_cache:
+			self._bssid_cache.flush(force=True)
+		self.leds.cleanup()
+		if self.protocol:
+			self.protocol.disconnect()
+		log.info('Cleanup complete')
+		logger.flush(force=True)
+
+
+if __name__ == '__main__':
+	try:
+		log.info('=== GPS Tracker Starting ===')
+		imei = modem.getDevImei()
+		log.info('IMEI: {}', imei)
+		tracker = GPSTracker()
+		while True:
+			utime.sleep(60)
+			log.debug('Memory: {}', memory.summary())
+	except KeyboardInterrupt:
+		log.warn('Interrupted by user')
+		tracker.cleanup()
+	except Exception as e:
+		log.error('Fatal error: {}', e)
+		import sys
+		sys.print_exception(e)
+		try:
+			tracker.cleanup()
+		except:
+			pass
@@ -0,0 +1,177 @@
+import gc
+import uarray
+import ustruct
+import utime
+from usr.metrics import metrics
+from usr.status import SMS_LIMIT
+from usr.logger import get_logger
+
+
+log = get_logger('memory')
+
+MEMORY_VERSION = 1
+# Profiled phases in telemetry order (append only)
+PHASES = ('packet_build', 'json_encode', 'wifi_scan', 'buffer_drain')
+# Automatic collection after allocating this fraction of the heap
+THRESHOLD_DIVISOR = 8
+# Drop of allocated bytes between samples counted as an automatic collection
+AUTO_GC_DROP = 4096
+HEADER_FORMAT = '>BBIIIIHHHI'
+PHASE_FORMAT = '>IIII'
+
+
+class MemoryProfiler:
+	"""Allocation per phase, heap high-water marks and timed explicit collections.
+	Deltas are heap-wide, so allocations of other threads during a phase are included."""
+
+	def __init__(self):
+		count = len(PHASES)
+		self.phase_index = dict((name, i) for i, name in enumerate(PHASES))
+		self.calls = uarray.array('L', [0] * count)
+		self.alloc_total = uarray.array('L', [0] * count)
+		self.alloc_max = uarray.array('L', [0] * count)
+		self.peak = uarray.array('L', [0] * count)
+		self.heap_peak = 0
+		self.last_alloc = 0
+		self.threshold = 0
+		self.collections = 0
+		self.auto_collections = 0
+		self.pause_max = 0
+		self.pause_total = 0
+
+	def configure(self, divisor=THRESHOLD_DIVISOR):
+		"""Collect automatically after every heap/divisor allocated bytes instead of only on exhaustion"""
+		total = gc.mem_free() + gc.mem_alloc()
+		try:
+			gc.threshold(total // divisor)
+			self.threshold = total // divisor
+		except AttributeError:
+			log.warn('gc.threshold not supported')
+		gc.enable()
+		self.last_alloc = gc.mem_alloc()
+
+	def begin(self):
+		"""Start phase, pass result to end()"""
+		return gc.mem_alloc()
+
+	def end(self, name, start):
+		"""Record bytes allocated since begin(); phases interrupted by a collection are not counted"""
+		used = gc.mem_alloc()
+		i = self.phase_index[name]
+		if used >= start:
+			delta = used - start
+			self.calls[i] += 1
+			self.alloc_total[i] = (self.alloc_total[i] + delta) & 0xFFFFFFFF
+			if delta > self.alloc_max[i]:
+				self.alloc_max[i] = delta
+		if used > self.peak[i]:
+			self.peak[i] = used
+		self._mark(used)
+
+	def sample(self):
+		"""Update high-water mark and detect automatic collections, call periodically"""
+		self._mark(gc.mem_alloc())
+
+	def _mark(self, used):
+		if used > self.heap_peak:
+			self.heap_peak = used
+		if used + AUTO_GC_DROP < self.last_alloc:
+			self.auto_collections += 1
+		self.last_alloc = used
+
+	def collect(self):
+		"""Timed explicit collection, returns pause in ms"""
+		start = utime.ticks_ms()
+		gc.collect()
+		pause = utime.ticks_diff(utime.ticks_ms(), start)
+		self.collections += 1
+		self.pause_total += pause
+		if pause > self.pause_max:
+			self.pause_max = pause
+		metrics.observe('gc_ms', pause)
+		self.last_alloc = gc.mem_alloc()
+		return pause
+
+	def free_percent(self):
+		"""Free heap in percent"""
+		free = gc.mem_free()
+		return free * 100 // (free + gc.mem_alloc())
+
+	def ensure_free(self, percent):
+		"""Check free heap, collecting once when below percent"""
+		if self.free_percent() >= percent:
+			return True
+		self.collect()
+		return self.free_percent() >= percent
+
+	def snapshot(self):
+		"""Heap figures and per-phase allocation as dict"""
+		used = gc.mem_alloc()
+		self._mark(used)
+		phases = {}
+		for i in range(len(PHASES)):
+			calls = self.calls[i]
+			phases[PHASES[i]] = {'calls': calls, 'avg': self.alloc_total[i] // calls if calls else 0, 'max': self.alloc_max[i], 'peak': self.peak[i]}
+		return {
+			'heap': used + gc.mem_free(),
+			'used': used,
+			'peak': self.heap_peak,
+			'threshold': self.threshold,
+			'collections': self.collections,
+			'auto_collections': self.auto_collections,
+			'pause_max_ms': self.pause_max,
+			'pause_total_ms': self.pause_total,
+			'phases': phases
+		}
+
+	def pack(self):
+		"""Pack snapshot into binary telemetry record"""
+		s = self.snapshot()
+		data = bytearray(ustruct.pack(HEADER_FORMAT, MEMORY_VERSION, len(PHASES), s['heap'], s['used'], s['peak'], s['threshold'],
+		                              min(s['collections'], 0xFFFF), min(s['auto_collections'], 0xFFFF), min(s['pause_max_ms'], 0xFFFF), s['pause_total_ms']))
+		for name in PHASES:
+			phase = s['phases'][name]
+			data.extend(ustruct.pack(PHASE_FORMAT, phase['calls'], phase['avg'], phase['max'], phase['peak']))
+		return bytes(data)
+
+	def summary(self, limit=SMS_LIMIT):
+		"""One line for SMS: heap used/total/peak in KB, collections, pauses, then phases as name:avg/max bytes"""
+		s = self.snapshot()
+		parts = ['heap:{}/{}k peak:{}k'.format(s['used'] // 1024, s['heap'] // 1024, s['peak'] // 1024),
+		         'gc:{}+{} pause:{}ms'.format(s['collections'], s['auto_collections'], s['pause_max_ms'])]
+		for name in PHASES:
+			phase = s['phases'][name]
+			if phase['calls']:
+				parts.append('{}:{}/{}'.format(name, phase['avg'], phase['max']))
+		line = ''
+		for part in parts:
+			if len(line) + len(part) + (1 if line else 0) <= limit:
+				line = line + ' ' + part if line else part
+		return line
+
+
+def decode_memory(data):
+	"""Decode binary memory record into snapshot dict"""
+	size = ustruct.calcsize(HEADER_FORMAT)
+	(version, count, heap, used, peak, threshold, collections, auto_collections,
+	 pause_max, pause_total) = ustruct.unpack(HEADER_FORMAT, data[:size])
+	phases = {}
+	for i in range(count):
+		offset = size + i * ustruct.calcsize(PHASE_FORMAT)
+		calls, avg, maximum, phase_peak = ustruct.unpack(PHASE_FORMAT, data[offset:offset + ustruct.calcsize(PHASE_FORMAT)])
+		phases[PHASES[i] if i < len(PHASES) else 'phase_{}'.format(i)] = {'calls': calls, 'avg': avg, 'max': maximum, 'peak': phase_peak}
+	return {
+		'version': version,
+		'heap': heap,
+		'used': used,
+		'peak': peak,
+		'threshold': threshold,
+		'collections': collections,
+		'auto_collections': auto_collections,
+		'pause_max_ms': pause_max,
+		'pause_total_ms': pause_total,
+		'phases': phases
+	}
+
+
+memory = MemoryProfiler()
@@ -0,0 +1,143 @@
+import uarray
+import ustruct
+import utime
+from usr.status import SMS_LIMIT
+
+
+METRICS_VERSION = 1
+# Counters in telemetry order (append only, the server decodes by position)
+COUNTERS = ('connect', 'connect_fail', 'send', 'send_fail', 'tx_bytes', 'buffer_add', 'buffer_drop',
+            'gps_fix', 'gps_nofix', 'wifi_scan', 'wifi_reuse', 'wifi_timeout', 'loop', 'loop_error')
+# Histograms as (name, upper bucket bounds), one more bucket counts values above the last bound
+HISTOGRAMS = (
+	('send_ms', (100, 250, 500, 1000, 2500, 5000, 10000)),
+	('connect_ms', (250, 500, 1000, 2500, 5000, 10000, 20000)),
+	('backlog', (0, 1, 8, 32, 128, 512, 2048)),
+	('gc_ms', (1, 2, 5, 10, 20, 50, 100)),
+	('ttff_s', (5, 10, 20, 40, 60, 120, 300)),
+	('wifi_scan_ms', (250, 500, 1000, 2000, 4000, 8000, 10000)),
+	('loop_ms', (10, 50, 100, 250, 500, 1000, 5000))
+)
+BUCKETS = 8
+
+
+class Metrics:
+	"""Counters and fixed-bucket integer histograms in preallocated arrays.
+	Updates take no lock and allocate nothing; an increment lost to a thread race is acceptable."""
+
+	def __init__(self):
+		self.counter_index = dict((name, i) for i, name in enumerate(COUNTERS))
+		self.histogram_index = dict((name, i) for i, (name, _) in enumerate(HISTOGRAMS))
+		self.counters = uarray.array('L', [0] * len(COUNTERS))
+		self.bounds = uarray.array('L', [bound for _, bounds in HISTOGRAMS for bound in bounds])
+		self.buckets = uarray.array('L', [0] * (len(HISTOGRAMS) * BUCKETS))
+		self.maximum = uarray.array('L', [0] * len(HISTOGRAMS))
+
+	def incr(self, name, count=1):
+		"""Increment counter"""
+		i = self.counter_index[name]
+		self.counters[i] = (self.counters[i] + count) & 0xFFFFFFFF
+
+	def observe(self, name, value):
+		"""Count value in its histogram bucket"""
+		h = self.histogram_index[name]
+		if value < 0:
+			value = 0
+		bounds = h * (BUCKETS - 1)
+		bucket = BUCKETS - 1
+		for b in range(BUCKETS - 1):
+			if value <= self.bounds[bounds + b]:
+				bucket = b
+				break
+		i = h * BUCKETS + bucket
+		self.buckets[i] = (self.buckets[i] + 1) & 0xFFFFFFFF
+		if value > self.maximum[h]:
+			self.maximum[h] = min(value, 0xFFFFFFFF)
+
+	def observe_since(self, name, start_ms):
+		"""Count milliseconds elapsed since ticks_ms() value start_ms"""
+		self.observe(name, utime.ticks_diff(utime.ticks_ms(), start_ms))
+
+	def get(self, name):
+		"""Get counter value"""
+		return self.counters[self.counter_index[name]]
+
+	def count(self, name):
+		"""Get number of values observed by histogram"""
+		h = self.histogram_index[name]
+		return sum(self.buckets[h * BUCKETS:(h + 1) * BUCKETS])
+
+	def percentile(self, name, percent):
+		"""Upper bound of the bucket holding percentile (histogram maximum for the last bucket), None if empty"""
+		h = self.histogram_index[name]
+		total = self.count(name)
+		if not total:
+			return None
+		rank = (total * percent + 99) // 100
+		seen = 0
+		for b in range(BUCKETS - 1):
+			seen += self.buckets[h * BUCKETS + b]
+			if seen >= rank:
+				return min(self.bounds[h * (BUCKETS - 1) + b], self.maximum[h])
+		return self.maximum[h]
+
+	def reset(self):
+		"""Zero all counters and histograms"""
+		for i in range(len(self.counters)):
+			self.counters[i] = 0
+		for i in range(len(self.buckets)):
+			self.buckets[i] = 0
+		for i in range(len(self.maximum)):
+			self.maximum[i] = 0
+
+	def pack(self):
+		"""Pack into binary telemetry record: version, counter and histogram count, counters,
+		then per histogram bucket counts (saturated to 16 bit) and maximum"""
+		data = bytearray(ustruct.pack('>BBB', METRICS_VERSION, len(COUNTERS), len(HISTOGRAMS)))
+		for value in self.counters:
+			data.extend(ustruct.pack('>I', value))
+		for h in range(len(HISTOGRAMS)):
+			for b in range(BUCKETS):
+				data.extend(ustruct.pack('>H', min(self.buckets[h * BUCKETS + b], 0xFFFF)))
+			data.extend(ustruct.pack('>I', self.maximum[h]))
+		return bytes(data)
+
+	def summary(self, limit=SMS_LIMIT):
+		"""One line for SMS: histograms as name:p50/p90/max, then non-zero counters (parts that don't fit are skipped)"""
+		parts = []
+		for name, _ in HISTOGRAMS:
+			if self.count(name):
+				parts.append('{}:{}/{}/{}'.format(name, self.percentile(name, 50), self.percentile(name, 90), self.maximum[self.histogram_index[name]]))
+		for i in range(len(COUNTERS)):
+			if self.counters[i]:
+				parts.append('{}={}'.format(COUNTERS[i], self.counters[i]))
+		line = ''
+		for part in parts:
+			if len(line) + len(part) + (1 if line else 0) <= limit:
+				line = line + ' ' + part if line else part
+		return line or 'No metrics'
+
+
+def decode_metrics(data):
+	"""Decode binary metrics record into dict"""
+	version, counter_count, histogram_count = ustruct.unpack('>BBB', data[:3])
+	offset = 3
+	counters = {}
+	for i in range(counter_count):
+		name = COUNTERS[i] if i < len(COUNTERS) else 'counter_{}'.format(i)
+		counters[name] = ustruct.unpack('>I', data[offset:offset + 4])[0]
+		offset += 4
+	histograms = {}
+	for h in range(histogram_count):
+		buckets = list(ustruct.unpack('>' + 'H' * BUCKETS, data[offset:offset + BUCKETS * 2]))
+		maximum = ustruct.unpack('>I', data[offset + BUCKETS * 2:offset + BUCKETS * 2 + 4])[0]
+		offset += BUCKETS * 2 + 4
+		if h < len(HISTOGRAMS):
+			name, bounds = HISTOGRAMS[h]
+		else:
+			name, bounds = 'histogram_{}'.format(h), ()
+		histograms[name] = {'bounds': list(bounds), 'buckets': buckets, 'max': maximum}
+	return {'version': version, 'counters': counters, 'histograms': histograms}
+
+
+metrics = Metrics()
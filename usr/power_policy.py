@@ -0,0 +1,88 @@
+import utime
+from usr.logger import get_logger
+
+
+log = get_logger('power')
+
+# Tiers ordered from full to empty. A tier applies while battery percentage >= 'min'.
+# interval/sleep: multipliers for configured update_interval and sleep_timeout
+# wifi: WiFi scanning allowed, store: store-and-forward, flushing buffer every 'flush' seconds
+# event: report low battery event to server on entering tier, shutdown: power down cleanly
+POWER_TIERS = [
+	{'name': 'normal', 'min': 30, 'interval': 1, 'sleep': 1, 'wifi': True, 'store': False},
+	{'name': 'saver', 'min': 20, 'interval': 3, 'sleep': 1, 'wifi': False, 'store': False, 'event': True},
+	{'name': 'low', 'min': 10, 'interval': 6, 'sleep': 0.5, 'wifi': False, 'store': True, 'flush': 1800, 'event': True},
+	{'name': 'critical', 'min': 4, 'interval': 12, 'sleep': 0.25, 'wifi': False, 'store': True, 'flush': 3600, 'event': True},
+	{'name': 'shutdown', 'min': 0, 'interval': 12, 'sleep': 0.25, 'wifi': False, 'store': True, 'shutdown': True}
+]
+# Percent above tier minimum needed to move back to a higher tier
+HYSTERESIS = 3
+
+
+class PowerPolicy:
+	"""Battery-aware power policy selecting reporting behaviour from declarative tiers"""
+
+	def __init__(self, battery, config, tiers=POWER_TIERS):
+		self.battery = battery
+		self.config = config
+		self.tiers = tiers
+		self.tier = tiers[0]
+		self.tier_since = utime.time()
+		self.last_flush = utime.time()
+		self.transitions = 0
+		self._apply()
+
+	def evaluate(self):
+		"""Re-evaluate tier, return new tier dict on change or None"""
+		if self.battery.is_charging:
+			tier = self.tiers[0]
+		else:
+			percentage = self.battery.get_percentage()
+			tier = self.tiers[-1]
+			for candidate in self.tiers:
+				if percentage >= candidate['min']:
+					tier = candidate
+					break
+			current = self.tiers.index(self.tier)
+			if self.tiers.index(tier) < current and percentage < self.tier_min(current - 1) + HYSTERESIS:
+				# Not enough recovery to leave current tier
+				tier = self.tier
+		if tier is self.tier:
+			self._apply()
+			return None
+		log.info('Power policy: {} -> {} ({}%)', self.tier['name'], tier['name'], self.battery.get_percentage())
+		self.tier = tier
+		self.tier_since = utime.time()
+		self.transitions += 1
+		self._apply()
+		return tier
+
+	def refresh(self):
+		"""Recompute effective settings after a config change (INTERVAL, SLEEP, WIFIENABLE)"""
+		self._apply()
+
+	def tier_min(self, index):
+		"""Get minimum percentage of tier by index"""
+		return self.tiers[index]['min']
+
+	def _apply(self):
+		"""Compute effective settings from config and current tier"""
+		tier = self.tier
+		self.update_interval = int(self.config.update_interval * tier.get('interval', 1))
+		self.sleep_timeout = int(self.config.sleep_timeout * tier.get('sleep', 1))
+		self.wifi_enabled = self.config.wifi_location_enabled and tier.get('wifi', True)
+		self.store_forward = tier.get('store', False)
+		self.shutdown = tier.get('shutdown', False)
+
+	def flush_due(self):
+		"""Check if store-and-forward buffer should be flushed now"""
+		if not self.store_forward:
+			return False
+		if utime.time() - self.last_flush >= self.tier.get('flush', 1800):
+			self.last_flush = utime.time()
+			return True
+		return False
+
+	def get_name(self):
+		"""Get current tier name"""
+		return self.tier['name']
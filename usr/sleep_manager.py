@@ -0,0 +1,117 @@
+import pm
+import utime
+import osTimer
+from machine import RTC, ExtInt
+from usr.sync import Event
+from usr.energy import energy
+from usr.logger import get_logger
+
+
+log = get_logger('sleep')
+
+
+class SleepManager:
+	"""Low-power sleep control using pm autosleep, wakelocks and RTC alarm"""
+
+	WAKE_TIMER = 'timer'
+	WAKE_SMS = 'sms'
+	WAKE_MOTION = 'motion'
+	WAKE_MANUAL = 'manual'
+
+	def __init__(self, motion_pin=None):
+		self.asleep = False
+		self.wake_reason = None
+		self.sleep_started = 0
+		self.total_sleep_time = 0
+		self.last_sleep_time = 0
+		self.wake_counts = {}
+		self.event = Event()
+		self.wakelock = pm.create_wakelock('tracker', len('tracker'))
+		pm.wakelock_lock(self.wakelock)
+		pm.autosleep(1)
+		self.rtc = RTC()
+		self.timer = osTimer()
+		self.alarm_ok = False
+		try:
+			self.rtc.register_callback(self._alarm_callback)
+			self.alarm_ok = True
+		except Exception as e:
+			log.warn('RTC alarm unavailable: {}', e)
+		self.motion_int = None
+		if motion_pin is not None:
+			try:
+				self.motion_int = ExtInt(getattr(ExtInt, 'GPIO{}'.format(motion_pin)), ExtInt.IRQ_RISING, ExtInt.PULL_PD, self._motion_callback)
+			except Exception as e:
+				log.error('Motion wake init error: {}', e)
+		log.info('Sleep manager initialized')
+
+	def sleep(self, seconds):
+		"""Release wakelock and block until timer, SMS or motion wake"""
+		self.wake_reason = None
+		self.asleep = True
+		self.sleep_started = utime.time()
+		self._set_alarm(seconds)
+		if self.motion_int:
+			self.motion_int.enable()
+		log.info('Entering low-power sleep for up to {}s', seconds)
+		energy.active('cpu', 0)
+		pm.wakelock_unlock(self.wakelock)
+		self.event.wait()
+		pm.wakelock_lock(self.wakelock)
+		energy.active('cpu', 1)
+		if self.motion_int:
+			self.motion_int.disable()
+		self._cancel_alarm()
+		self.asleep = False
+		self.last_sleep_time = utime.time() - self.sleep_started
+		self.total_sleep_time += self.last_sleep_time
+		reason = self.wake_reason or self.WAKE_MANUAL
+		self.wake_counts[reason] = self.wake_counts.get(reason, 0) + 1
+		log.info('Woke up after {}s, reason: {}', self.last_sleep_time, reason)
+		return reason
+
+	def wake(self, reason=WAKE_MANUAL):
+		"""Wake sleeping thread"""
+		if self.asleep and not self.wake_reason:
+			self.wake_reason = reason
+			self.event.set()
+
+	def get_sleep_time(self):
+		"""Get total time spent asleep including current sleep"""
+		if self.asleep:
+			return self.total_sleep_time + utime.time() - self.sleep_started
+		return self.total_sleep_time
+
+	def _set_alarm(self, seconds):
+		"""Program RTC alarm (or OS timer as fallback) to wake after given seconds"""
+		if self.alarm_ok:
+			try:
+				t = utime.localtime(utime.time() + seconds)
+				self.rtc.set_alarm([t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0])
+				self.rtc.enable_alarm(1)
+				return
+			except Exception as e:
+				log.error('RTC alarm set error: {}', e)
+		self.timer.start(seconds * 1000, 0, self._alarm_callback)
+
+	def _cancel_alarm(self):
+		"""Disable RTC alarm and fallback timer"""
+		self.timer.stop()
+		if self.alarm_ok:
+			try:
+				self.rtc.enable_alarm(0)
+			except Exception as e:
+				log.error('RTC alarm cancel error: {}', e)
+
+	def _alarm_callback(self, args):
+		"""Callback on RTC alarm"""
+		self.wake(self.WAKE_TIMER)
+
+	def _motion_callback(self, args):
+		"""Callback on motion sensor interrupt"""
+		self.wake(self.WAKE_MOTION)
+
+	def cleanup(self):
+		"""Wake any sleeper and keep system awake"""
+		self.wake(self.WAKE_MANUAL)
+		pm.autosleep(0)
@@ -1,270 +1,215 @@
-import sms
-import utime
-import modem
-from usr.config import Config
-
-
-class SMSHandler:
-	"""SMS command handler"""
-
-	def __init__(self, config, callback=None):
-		self.config = config
-		self.callback = callback
-		self.imei = modem.getDevImei()
-		self.init_sms()
-
-	def init_sms(self):
-		"""Initialize SMS handler"""
-		try:
-			sms.setCallback(self._sms_callback)
-			print('SMS handler initialized, IMEI:', self.imei)
-		except Exception as e:
-			print('SMS init error:', e)
-
-	def _sms_callback(self, args):
-		"""Callback on SMS received"""
-		try:
-			if args[0] == 1:
-				print('SMS received, index:', args[2])
-				msg = sms.searchTextMsg(args[2])
-				if msg != -1:
-					phone, text, timestamp = msg
-					print('From:', phone, 'Text:', text)
-					sms.deleteMsg(args[2])
-					self._process_command(phone, text)
-		except Exception as e:
-			print('SMS callback error:', e)
-
-	def _process_command(self, phone, text):
-		"""Process SMS command"""
-		text = text.strip().upper()
-		try:
-			parts = [p.strip() for p in text.split(',')]
-			command = parts[0]
-			params = parts[1:] if len(parts) > 1 else []
-			if command == 'RESET' and len(params) >= 1:
-				self._cmd_reset(phone, params)
-			elif not self._is_authorized(phone):
-				print('Unauthorized command from:', phone)
-				return
-			if command == 'APN':
-				self._cmd_apn(phone, params)
-			elif command == 'SERVER':
-				self._cmd_server(phone, params)
-			elif command == 'WIFISERVER':
-				self._cmd_wifi_server(phone, params)
-			elif command == 'WIFIENABLE':
-				self._cmd_wifi_enable(phone, params)
-			elif command == 'ADDNUMBER':
-				self._cmd_add_number(phone, params)
-			elif command == 'DELNUMBER':
-				self._cmd_del_number(phone, params)
-			elif command == 'INTERVAL':
-				self._cmd_interval(phone, params)
-			elif command == 'SLEEP':
-				self._cmd_sleep(phone, params)
-			elif command == 'STATUS':
-				self._cmd_status(phone, params)
-			elif command == 'POWEROFF':
-				self._cmd_poweroff(phone, params)
-			else:
-				self._send_sms(phone, 'Unknown command: ' + command)
-		except Exception as e:
-			print('Command processing error:', e)
-			self._send_sms(phone, 'Error: ' + str(e))
-
-	def _is_authorized(self, phone):
-		"""Check if phone number is authorized"""
-		sms_numbers = self.config.get('sms_numbers', [])
-		if not sms_numbers:
-			sms_numbers.append(phone)
-			self.config.update(sms_numbers=sms_numbers)
-			print('First number added:', phone)
-			return True
-		for allowed_number in sms_numbers:
-			if phone in allowed_number or allowed_number in phone:
-				return True
-		return False
-
-	def _send_sms(self, phone, text):
-		"""Send SMS response"""
-		try:
-			ret = sms.sendTextMsg(phone, text, 'GSM')
-			if ret >= 0:
-				print('SMS sent to', phone)
-			else:
-				print('SMS send failed')
-		except Exception as e:
-			print('SMS send error:', e)
-
-	def _cmd_reset(self, phone, params):
-		"""Reset device - RESET,IMEI"""
-		if len(params) >= 1:
-			provided_imei = params[0].strip()
-			if provided_imei == self.imei:
-				self._send_sms(phone, 'Device reset OK')
-				utime.sleep(2)
-				if self.callback:
-					self.callback('reset')
-			else:
-				print('Invalid IMEI for reset from:', phone)
-		else:
-			self._send_sms(phone, 'Usage: RESET,IMEI')
-
-	def _cmd_apn(self, phone, params):
-		"""Configure APN - APN,name[,user,password]"""
-		if len(params) >= 1:
-			apn_name = params[0]
-			apn_user = params[1] if len(params) > 1 else ''
-			apn_password = params[2] if len(params) > 2 else ''
-			self.config.update(apn={'name': apn_name, 'user': apn_user, 'password': apn_password})
-			if self.callback:
-				self.callback('apn_changed')
-			self._send_sms(phone, 'APN set: ' + apn_name)
-			print('APN updated:', apn_name)
-		else:
-			self._send_sms(phone, 'Usage: APN,name[,user,password]')
-
-	def _cmd_server(self, phone, params):
-		"""Configure server - SERVER,protocol,host:port[,path]"""
-		if len(params) >= 2:
-			protocol = params[0].upper()
-			host_port = params[1]
-			if '://' in host_port:
-				parts = host_port.split('://', 1)
-				protocol = parts[0].upper()
-				host_port = parts[1]
-				if '/' in host_port:
-					host_port, path = host_port.split('/', 1)
-					path = '/' + path
-				else:
-					path = '/api/location'
-			else:
-				path = params[2] if len(params) > 2 else '/api/location'
-			if ':' in host_port:
-				host, port = host_port.split(':', 1)
-				port = int(port)
-			else:
-				host = host_port
-				port = 5023 if protocol == 'GT06' else 80
-			self.config.update(server={'protocol': protocol, 'host': host, 'port': port, 'path': path})
-			if self.callback:
-				self.callback('server_changed')
-			self._send_sms(phone, 'Server: {}://{}:{}'.format(protocol, host, port))
-			print('Server updated:', protocol, host, port)
-		else:
-			self._send_sms(phone, 'Usage: SERVER,protocol,host:port[,path]')
-
-	def _cmd_wifi_server(self, phone, params):
-		"""Set WiFi location server - WIFISERVER,host:port[,path]"""
-		if len(params) >= 1:
-			host_port = params[0]
-			path = params[1] if len(params) > 1 else '/api/locate'
-			if ':' in host_port:
-				host, port = host_port.split(':', 1)
-				port = int(port)
-			else:
-				host = host_port
-				port = 80
-			self.config.update(wifi_server={'host': host, 'port': port, 'path': path})
-			if self.callback:
-				self.callback('wifi_server_changed')
-			self._send_sms(phone, 'WiFi server: {}:{}'.format(host, port))
-			print('WiFi location server updated:', host, port)
-		else:
-			self._send_sms(phone, 'Usage: WIFISERVER,host:port[,path]')
-
-	def _cmd_wifi_enable(self, phone, params):
-		"""Enable/disable WiFi location - WIFIENABLE,1/0"""
-		if len(params) >= 1:
-			try:
-				enable = int(params[0])
-				self.config.update(wifi_location_enabled=(enable == 1))
-				status = 'enabled' if enable == 1 else 'disabled'
-				self._send_sms(phone, 'WiFi location ' + status)
-				print('WiFi location:', status)
-			except ValueError:
-				self._send_sms(phone, 'Invalid value (0 or 1)')
-		else:
-			enabled = self.config.get('wifi_location_enabled', False)
-			status = 'enabled' if enabled else 'disabled'
-			self._send_sms(phone, 'WiFi location: ' + status)
-
-	def _cmd_add_number(self, phone, params):
-		"""Add allowed number - ADDNUMBER,phone"""
-		if len(params) >= 1:
-			new_number = params[0]
-			sms_numbers = self.config.get('sms_numbers', [])
-			if new_number not in sms_numbers:
-				sms_numbers.append(new_number)
-				self.config.update(sms_numbers=sms_numbers)
-				self._send_sms(phone, 'Number added: ' + new_number)
-				print('SMS number added:', new_number)
-			else:
-				self._send_sms(phone, 'Number already exists')
-		else:
-			self._send_sms(phone, 'Usage: ADDNUMBER,phone')
-
-	def _cmd_del_number(self, phone, params):
-		"""Remove allowed number - DELNUMBER,phone"""
-		if len(params) >= 1:
-			del_number = params[0]
-			sms_numbers = self.config.get('sms_numbers', [])
-			if del_number in sms_numbers:
-				sms_numbers.remove(del_number)
-				self.config.update(sms_numbers=sms_numbers)
-				self._send_sms(phone, 'Number removed: ' + del_number)
-				print('SMS number removed:', del_number)
-			else:
-				self._send_sms(phone, 'Number not found')
-		else:
-			self._send_sms(phone, 'Usage: DELNUMBER,phone')
-
-	def _cmd_interval(self, phone, params):
-		"""Set update interval - INTERVAL,seconds"""
-		if len(params) >= 1:
-			try:
-				interval = int(params[0])
-				if 1 <= interval <= 600:
-					self.config.update(update_interval=interval)
-					if self.callback:
-						self.callback('interval_changed')
-					self._send_sms(phone, 'Interval: {}s'.format(interval))
-					print('Update interval changed:', interval)
-				else:
-					self._send_sms(phone, 'Invalid interval (1-600)')
-			except ValueError:
-				self._send_sms(phone, 'Invalid interval value')
-		else:
-			interval = self.config.get('update_interval', 10)
-			self._send_sms(phone, 'Current interval: {}s'.format(interval))
-
-	def _cmd_sleep(self, phone, params):
-		"""Set sleep timeout - SLEEP,minutes"""
-		if len(params) >= 1:
-			try:
-				minutes = int(params[0])
-				timeout = minutes * 60
-				self.config.update(sleep_timeout=timeout)
-				self._send_sms(phone, 'Sleep timeout: {}min'.format(minutes))
-				print('Sleep timeout changed:', minutes, 'minutes')
-			except ValueError:
-				self._send_sms(phone, 'Invalid timeout value')
-		else:
-			timeout = self.config.get('sleep_timeout', 1800)
-			minutes = timeout // 60
-			self._send_sms(phone, 'Sleep timeout: {}min'.format(minutes))
-
-	def _cmd_status(self, phone, params):
-		"""Get device status - STATUS"""
-		if self.callback:
-			status = self.callback('get_status')
-			if status:
-				self._send_sms(phone, status)
-
-	def _cmd_poweroff(self, phone, params):
-		"""Power off device - POWEROFF"""
-		self._send_sms(phone, 'Powering off...')
-		utime.sleep(2)
-		if self.callback:
-			self.callback('poweroff')
+import _thread
+import utime
+import sms
+import modem
+from usr.commands import CommandRegistry
+from usr.sync import Event
+from usr.logger import get_logger
+
+
+log = get_logger('sms')
+
+# Recently processed messages remembered to drop network retransmits (same sender, SC timestamp and text)
+DEDUP_HISTORY = 4
+
+
+class SMSQueue:
+	"""Bounded FIFO of tagged entries: ('sms', storage index) or ('remote', text, respond) for server commands"""
+
+	def __init__(self, max_size=8):
+		self.items = []
+		self.max_size = max_size
+		self.max_depth = 0
+		self.dropped = 0
+		self.lock = _thread.allocate_lock()
+
+	def put(self, entry):
+		"""Add entry, return False if full or the SMS storage index is already queued"""
+		with self.lock:
+			if entry[0] == 'sms':
+				for queued, _ in self.items:
+					if queued == entry:
+						return False
+			if len(self.items) >= self.max_size:
+				self.dropped += 1
+				return False
+			self.items.append((entry, utime.ticks_ms()))
+			if len(self.items) > self.max_depth:
+				self.max_depth = len(self.items)
+			return True
+
+	def take(self):
+		"""Remove and return oldest (entry, ticks) or None"""
+		with self.lock:
+			if not self.items:
+				return None
+			return self.items.pop(0)
+
+	def size(self):
+		"""Get queue depth"""
+		return len(self.items)
+
+
+class SMSHandler:
+	"""SMS command handler, also executes commands received from the server"""
+
+	def __init__(self, config, callback=None, queue_size=8):
+		self.config = config
+		self.callback = callback
+		self.imei = modem.getDevImei()
+		self.commands = CommandRegistry(config, self.imei, callback)
+		self.queue = SMSQueue(queue_size)
+		self.event = Event()
+		self.recent = []
+		self.received_count = 0
+		self.processed_count = 0
+		self.duplicate_count = 0
+		self.last_latency = 0
+		self.max_latency = 0
+		self.avg_latency = 0
+		self.running = True
+		_thread.start_new_thread(self._worker_loop, ())
+		self.init_sms()
+
+	def init_sms(self):
+		"""Initialize SMS handler"""
+		try:
+			sms.setCallback(self._sms_callback)
+			log.info('SMS handler initialized, IMEI: {}', self.imei)
+		except Exception as e:
+			log.error('SMS init error: {}', e)
+
+	def stop(self):
+		"""Stop worker thread"""
+		self.running = False
+		self.event.set()
+
+	def _sms_callback(self, args):
+		"""Callback on SMS received (modem context: only queue the index)"""
+		try:
+			if args[0] == 1:
+				self.received_count += 1
+				self.queue.put(('sms', args[2]))
+				self.event.set()
+				if self.callback:
+					self.callback('sms_received')
+		except Exception as e:
+			log.error('SMS callback error: {}', e)
+
+	def submit_remote(self, text, respond):
+		"""Queue command received over the data channel, respond(text) sends acknowledgement"""
+		if self.queue.put(('remote', text, respond)):
+			self.event.set()
+			return True
+		log.warn('Command queue full, server command dropped')
+		return False
+
+	def get_metrics(self):
+		"""Get command queue and latency metrics"""
+		return {
+			'received': self.received_count,
+			'processed': self.processed_count,
+			'duplicates': self.duplicate_count,
+			'dropped': self.queue.dropped,
+			'depth': self.queue.size(),
+			'max_depth': self.queue.max_depth,
+			'latency_ms': self.last_latency,
+			'max_latency_ms': self.max_latency,
+			'avg_latency_ms': self.avg_latency
+		}
+
+	def _worker_loop(self):
+		"""Read and execute queued messages"""
+		while self.running:
+			self.event.wait()
+			while self.running:
+				item = self.queue.take()
+				if item is None:
+					break
+				entry, received_at = item
+				try:
+					if entry[0] == 'remote':
+						self._process_remote(entry[1], entry[2])
+					else:
+						self._handle_message(entry[1])
+				except Exception as e:
+					log.error('SMS worker error: {}', e)
+				self._record_latency(utime.ticks_diff(utime.ticks_ms(), received_at))
+
+	def _handle_message(self, index):
+		"""Read message from storage, delete it and process"""
+		log.debug('SMS received, index: {}', index)
+		msg = sms.searchTextMsg(index)
+		if msg == -1:
+			return
+		phone, text, timestamp = msg
+		log.info('From: {} Text: {}', phone, text)
+		sms.deleteMsg(index)
+		if self._is_duplicate(phone, text, timestamp):
+			log.info('Retransmitted SMS ignored')
+			self.duplicate_count += 1
+			return
+		self._process_command(phone, text)
+		self.processed_count += 1
+
+	def _is_duplicate(self, phone, text, timestamp):
+		"""Check and remember message: a retransmit repeats sender, service centre timestamp and text,
+		the same command sent again by the operator has a new timestamp and is executed"""
+		key = (phone, timestamp, text)
+		if key in self.recent:
+			return True
+		self.recent.append(key)
+		if len(self.recent) > DEDUP_HISTORY:
+			self.recent.pop(0)
+		return False
+
+	def _record_latency(self, latency):
+		"""Update receive-to-done latency stats"""
+		self.last_latency = latency
+		if latency > self.max_latency:
+			self.max_latency = latency
+		if self.avg_latency:
+			self.avg_latency = (self.avg_latency * 7 + latency) // 8
+		else:
+			self.avg_latency = latency
+
+	def _process_command(self, phone, text):
+		"""Process SMS with one or more ';'-separated commands"""
+		try:
+			self.commands.execute(text.strip(), lambda: self._is_authorized(phone), lambda reply: self._send_sms(phone, reply))
+		except Exception as e:
+			log.error('Command processing error: {}', e)
+			self._send_sms(phone, 'Error: ' + str(e))
+
+	def _process_remote(self, text, respond):
+		"""Process command from server (session is authenticated by login)"""
+		log.info('Server command: {}', text)
+		try:
+			self.commands.execute(text.strip(), lambda: True, respond, remote=True)
+		except Exception as e:
+			log.error('Command processing error: {}', e)
+			respond('Error: ' + str(e))
+		self.processed_count += 1
+
+	def _is_authorized(self, phone):
+		"""Check if phone number is authorized"""
+		sms_numbers = self.config.get('sms_numbers', [])
+		if not sms_numbers:
+			self.config.update(sms_numbers=[phone])
+			log.info('First number added: {}', phone)
+			return True
+		for allowed_number in sms_numbers:
+			if phone in allowed_number or allowed_number in phone:
+				return True
+		return False
+
+	def _send_sms(self, phone, text):
+		"""Send SMS response"""
+		try:
+			ret = sms.sendTextMsg(phone, text, 'GSM')
+			if ret >= 0:
+				log.info('SMS sent to {}', phone)
+			else:
+				log.warn('SMS send failed')
+		except Exception as e:
+			log.error('SMS send error: {}', e)
@@ -0,0 +1,123 @@
+import ustruct
+
+
+# Single GSM 7-bit SMS segment
+SMS_LIMIT = 160
+# Binary status telemetry, version 2:
+# version, flags, battery %, battery mV, hours left, power tier, lat, lon (1e-6 deg),
+# speed, satellites, source, buffered records, queue depth, latency ms, free memory KB, sleep total s,
+# radio on s (version 2)
+STATUS_VERSION = 2
+STATUS_FORMAT = '>BBBHHBiiBBBHBHHII'
+STATUS_FORMAT_V1 = '>BBBHHBiiBBBHBHHI'
+FLAG_CHARGING = 0x01
+FLAG_VALID = 0x02
+FLAG_CONNECTED = 0x04
+FLAG_SLEEP = 0x08
+SOURCES = ('gps', 'wifi_cache', 'wifi', 'lbs', 'hybrid')
+
+
+def _format_pos(s):
+	"""Position fields"""
+	if not s['valid']:
+		return 'GPS:NO'
+	text = 'GPS:{:.6f},{:.6f} {}kmh {}sat'.format(s['latitude'], s['longitude'], int(s['speed']), s['satellites'])
+	if s['source'] != 'gps':
+		text += ' ' + s['source']
+	return text
+
+
+def _format_pwr(s):
+	"""Power fields"""
+	text = 'BAT:{}%{} {:.2f}V'.format(s['battery'], 'C' if s['charging'] else '', s['voltage'])
+	if s['hours'] is not None:
+		text += ' {}h'.format(int(s['hours']))
+	return text + ' P:' + s['tier']
+
+
+def _format_net(s):
+	"""Connection and queue fields"""
+	return 'NET:{} BUF:{} Q:{} LAT:{}ms RADIO:{}s'.format('ON' if s['connected'] else 'OFF', s['buffer'], s['queue'], s['latency'], s['radio'])
+
+
+def _format_sys(s):
+	"""Sleep, memory and SMS command fields"""
+	text = 'SLP:{} {}s MEM:{}k'.format('Y' if s['sleep'] else 'N', s['sleep_total'], s['mem_free'] // 1024)
+	if s.get('sms') is not None:
+		text += ' SMS:{}/{}'.format(*s['sms'])
+	return text
+
+
+# Field set name: formatter, in ALL order
+STATUS_FIELDS = (('POS', _format_pos), ('PWR', _format_pwr), ('NET', _format_net), ('SYS', _format_sys))
+
+
+def parse_fields(text):
+	"""Parse 'POS|PWR' style selector into list of field set names, None if invalid"""
+	names = [name.strip().upper() for name in text.replace('+', '|').split('|') if name.strip()]
+	if not names or 'ALL' in names:
+		return [name for name, _ in STATUS_FIELDS]
+	for name in names:
+		if name not in [field for field, _ in STATUS_FIELDS]:
+			return None
+	return names
+
+
+def format_status(snapshot, fields=None, limit=SMS_LIMIT):
+	"""Format status snapshot as one line not longer than limit (field sets that don't fit are skipped)"""
+	parts = []
+	length = 0
+	for name, formatter in STATUS_FIELDS:
+		if fields and name not in fields:
+			continue
+		text = formatter(snapshot)
+		needed = len(text) + (1 if parts else 0)
+		if length + needed > limit:
+			continue
+		parts.append(text)
+		length += needed
+	return ' '.join(parts)
+
+
+def pack_status(s):
+	"""Pack status snapshot into binary telemetry record"""
+	flags = (FLAG_CHARGING if s['charging'] else 0) | (FLAG_VALID if s['valid'] else 0) | \
+		(FLAG_CONNECTED if s['connected'] else 0) | (FLAG_SLEEP if s['sleep'] else 0)
+	source = SOURCES.index(s['source']) if s['source'] in SOURCES else 0xFF
+	hours = 0xFFFF if s['hours'] is None else min(int(s['hours']), 0xFFFE)
+	return ustruct.pack(STATUS_FORMAT, STATUS_VERSION, flags, s['battery'], int(s['voltage'] * 1000), hours, s['tier_index'],
+	                    int(s['latitude'] * 1000000), int(s['longitude'] * 1000000), min(int(s['speed']), 255), min(s['satellites'], 255),
+	                    source, min(s['buffer'], 0xFFFF), min(s['queue'], 255), min(s['latency'], 0xFFFF), min(s['mem_free'] // 1024, 0xFFFF),
+	                    s['sleep_total'], s['radio'])
+
+
+def decode_status(data):
+	"""Decode binary telemetry record (version 1 or 2) into dict, radio is None for version 1"""
+	if data[0] < 2:
+		fields = ustruct.unpack(STATUS_FORMAT_V1, data) + (None,)
+	else:
+		fields = ustruct.unpack(STATUS_FORMAT, data[:ustruct.calcsize(STATUS_FORMAT)])
+	(version, flags, battery, mv, hours, tier, lat, lon, speed, satellites, source,
+	 buffered, queue, latency, mem_kb, sleep_total, radio) = fields
+	return {
+		'version': version,
+		'charging': bool(flags & FLAG_CHARGING),
+		'valid': bool(flags & FLAG_VALID),
+		'connected': bool(flags & FLAG_CONNECTED),
+		'sleep': bool(flags & FLAG_SLEEP),
+		'battery': battery,
+		'voltage': mv / 1000.0,
+		'hours': None if hours == 0xFFFF else hours,
+		'tier': tier,
+		'latitude': lat / 1000000.0,
+		'longitude': lon / 1000000.0,
+		'speed': speed,
+		'satellites': satellites,
+		'source': SOURCES[source] if source < len(SOURCES) else 'unknown',
+		'buffer': buffered,
+		'queue': queue,
+		'latency': latency,
+		'mem_free': mem_kb * 1024,
+		'sleep_total': sleep_total,
+		'radio': radio
+	}
@@ -0,0 +1,24 @@
+import _thread
+
+
+class Event:
+	"""Wake-up flag a thread can block on without polling"""
+
+	def __init__(self):
+		self.pending = False
+		self._guard = _thread.allocate_lock()
+		self._signal = _thread.allocate_lock()
+		self._signal.acquire()
+
+	def set(self):
+		"""Wake waiting thread (safe to call from callbacks)"""
+		with self._guard:
+			if not self.pending:
+				self.pending = True
+				self._signal.release()
+
+	def wait(self):
+		"""Block until set, then clear"""
+		self._signal.acquire()
+		with self._guard:
+			self.pending = False
@@ -0,0 +1,326 @@
+import _thread
+import utime
+from usr.led_controller import Led
+from usr.sync import Event
+from usr.boot import boot_profile
+from usr.memory import memory
+from usr.location import fixes
+from usr.connection import link, SERVER
+from usr.logger import get_logger
+
+
+log = get_logger('uplink')
+
+# Buffered records sent per pipelined burst (one transmission, acknowledgements read afterwards)
+BURST_BATCH = 16
+
+
+class UplinkQueue:
+	"""Bounded FIFO between location sampler and uplink worker"""
+
+	def __init__(self, max_size=16):
+		self.items = []
+		self.max_size = max_size
+		self.max_depth = 0
+		self.dropped = 0
+		self.lock = _thread.allocate_lock()
+
+	def put(self, data):
+		"""Add record, return False if queue is full"""
+		with self.lock:
+			if len(self.items) >= self.max_size:
+				self.dropped += 1
+				return False
+			self.items.append((utime.ticks_ms(), data))
+			if len(self.items) > self.max_depth:
+				self.max_depth = len(self.items)
+			return True
+
+	def take(self, count):
+		"""Remove and return up to count oldest records"""
+		with self.lock:
+			batch = self.items[:count]
+			self.items = self.items[count:]
+			return batch
+
+	def size(self):
+		"""Get queue depth"""
+		return len(self.items)
+
+
+class UplinkWorker:
+	"""Drains sampled records to the server in a dedicated thread"""
+
+	def __init__(self, data_buffer, config, leds, battery=None, queue_size=16, batch_size=8):
+		self.data_buffer = data_buffer
+		self.config = config
+		self.leds = leds
+		self.battery = battery
+		self.queue = UplinkQueue(queue_size)
+		self.batch_size = batch_size
+		self.protocol = None
+		# Protocol set by set_protocol(), switched to by the worker between sends
+		self.staged = None
+		self.swap_pending = False
+		self.lock = _thread.allocate_lock()
+		# Held by the worker while it processes a wake-up (sends), stop() waits for it
+		self.work_lock = _thread.allocate_lock()
+		self.connected = False
+		self.running = False
+		self.store_only = False
+		self.flush_requested = False
+		# Queued records taken by the worker and being sent
+		self.sending = False
+		# Close the connection once the queue is drained (sleep mode)
+		self.disconnect_pending = False
+		# Burst mode: buffer records, send them every burst_points records or burst_interval seconds
+		self.burst_points = 0
+		self.burst_interval = 0
+		self.last_burst = utime.ticks_ms()
+		self.sent_count = 0
+		self.last_latency = 0
+		self.max_latency = 0
+		self.avg_latency = 0
+		self.event = Event()
+
+	def start(self):
+		"""Start worker thread"""
+		if not self.running:
+			self.running = True
+			_thread.start_new_thread(self._worker_loop, ())
+
+	def stop(self):
+		"""Stop worker thread, waiting for a send in progress so records it took are either sent or still buffered"""
+		self.running = False
+		self.event.set()
+		with self.work_lock:
+			pass
+
+	def spill(self):
+		"""Move all queued records to offline buffer"""
+		for _, data in self.queue.take(self.queue.size()):
+			self._store(data)
+
+	def set_protocol(self, protocol):
+		"""Send through protocol from the next send boundary on; the worker disconnects the previous one
+		after its last send, so queued and buffered records go to exactly one of them"""
+		with self.lock:
+			superseded = self.staged if self.swap_pending else None
+			self.staged = protocol
+			self.swap_pending = True
+		if superseded is not None and superseded is not protocol and superseded is not self.protocol:
+			superseded.disconnect()
+		self.event.set()
+
+	def _swap(self):
+		"""Switch to protocol staged by set_protocol (worker thread, between sends)"""
+		with self.lock:
+			if not self.swap_pending:
+				return
+			protocol = self.staged
+			self.staged = None
+			self.swap_pending = False
+		previous = self.protocol
+		self.protocol = protocol
+		self.connected = bool(protocol and protocol.connected)
+		if previous is not None and previous is not protocol:
+			previous.disconnect()
+			log.info('Protocol switched')
+
+	def set_store_only(self, store_only):
+		"""Enable store-and-forward: records go to buffer until flush is requested"""
+		self.store_only = store_only
+		if not store_only:
+			self.event.set()
+
+	def set_burst(self, points, interval):
+		"""Enable burst mode with flush after points records or interval seconds (0 disables each, both 0 turn it off)"""
+		self.burst_points = points
+		self.burst_interval = interval
+		self.last_burst = utime.ticks_ms()
+		if points or interval:
+			log.info('Burst mode: {} points, {}s', points, interval)
+		else:
+			self.event.set()
+
+	def request_flush(self):
+		"""Send buffered records now"""
+		self.flush_requested = True
+		self.event.set()
+
+	def submit(self, data):
+		"""Queue record for sending, spill to buffer when queue is full.
+		Store-only (power policy, burst mode or connection backoff) records go straight to the buffer, except events and replies"""
+		urgent = self._urgent(data)
+		if (self._buffering() or not link.ready()) and not urgent:
+			self._store(data)
+			if self._burst_due():
+				self.request_flush()
+			return True
+		if urgent and self._burst_pending():
+			# Radio comes up for the event anyway, send the pending burst with it
+			self.flush_requested = True
+		if self.queue.put(data):
+			self.event.set()
+			return True
+		self._store(data)
+		self.event.set()
+		return False
+
+	def idle(self):
+		"""No queued records and none being sent"""
+		return not self.sending and self.queue.size() == 0
+
+	def get_metrics(self):
+		"""Get queue depth and latency metrics"""
+		return {
+			'depth': self.queue.size(),
+			'max_depth': self.queue.max_depth,
+			'dropped': self.queue.dropped,
+			'sent': self.sent_count,
+			'latency_ms': self.last_latency,
+			'max_latency_ms': self.max_latency,
+			'avg_latency_ms': self.avg_latency
+		}
+
+	def _worker_loop(self):
+		"""Uplink worker loop"""
+		while self.running:
+			self.event.wait()
+			with self.work_lock:
+				try:
+					self._swap()
+					while self.running and self.queue.size() > 0:
+						# Set before taking records so queue and flag never both look empty during a send
+						self.sending = True
+						try:
+							self._send_batch(self.queue.take(self.batch_size))
+						finally:
+							self.sending = False
+					if not self._buffering() or self.flush_requested:
+						while self.running and (self.connected or self.flush_requested) and link.ready() and self.queue.size() == 0 and self.data_buffer.size() > 0:
+							if not self._send_buffered_data():
+								break
+						if self.flush_requested:
+							self.last_burst = utime.ticks_ms()
+						self.flush_requested = False
+					if self.disconnect_pending and self.queue.size() == 0:
+						self._disconnect()
+				except Exception as e:
+					log.error('Uplink worker error: {}', e)
+
+	def disconnect(self):
+		"""Close the server connection after the sends in progress and queued (events, replies), not during them"""
+		self.disconnect_pending = True
+		self.event.set()
+
+	def _disconnect(self):
+		"""Disconnect requested by disconnect() (worker thread, idle)"""
+		self.disconnect_pending = False
+		if self.protocol:
+			self.protocol.disconnect()
+		self.connected = False
+
+	def _send_batch(self, batch):
+		"""Send queued records, buffer the rest on failure; sent fixes go back to the pool"""
+		self._swap()
+		protocol = self.protocol
+		for i in range(len(batch)):
+			queued_at, data = batch[i]
+			if not protocol or not link.prepare(self._urgent(data)) or not self._send(protocol, data):
+				for _, rest in batch[i:]:
+					self._store(rest)
+				return False
+			self._record_latency(utime.ticks_diff(utime.ticks_ms(), queued_at))
+			fixes.release(data)
+		return True
+
+	def _send(self, protocol, data):
+		"""Send single record"""
+		return self._transfer(protocol, [data]) == 1
+
+	def _transfer(self, protocol, records):
+		"""Send records, several are pipelined in one burst; return number sent"""
+		self.leds.set_network_status(Led.MODE_PULSE)
+		self.leds.network_data_start()
+		if self.battery:
+			self.battery.load_begin()
+		try:
+			if len(records) == 1:
+				sent = 1 if protocol.send_location(records[0]) else 0
+			else:
+				sent = protocol.send_batch(records)
+		finally:
+			if self.battery:
+				self.battery.load_end()
+		self.leds.network_data_stop()
+		success = sent == len(records)
+		self.connected = success
+		if sent:
+			if not self.sent_count:
+				boot_profile.mark('first_report')
+			self.sent_count += sent
+		if success:
+			link.success()
+		else:
+			link.failure(getattr(protocol, 'failure', None) or SERVER)
+		return sent
+
+	def _urgent(self, data):
+		"""Events and command replies are sent even in store-only mode"""
+		return bool(data.get('event') or data.get('reply') is not None)
+
+	def _buffering(self):
+		"""Records are held in the buffer until a flush (power policy store-and-forward or burst mode)"""
+		return self.store_only or bool(self.burst_points or self.burst_interval)
+
+	def _burst_pending(self):
+		"""Burst mode holds buffered records"""
+		return bool(self.burst_points or self.burst_interval) and self.data_buffer.size() > 0
+
+	def _burst_due(self):
+		"""Burst point count or interval reached"""
+		if self.burst_points and self.data_buffer.size() >= self.burst_points:
+			return True
+		return bool(self.burst_interval) and utime.ticks_diff(utime.ticks_ms(), self.last_burst) >= self.burst_interval * 1000
+
+	def _store(self, data):
+		"""Store record in offline buffer"""
+		if not self.config.buffer_enabled:
+			fixes.release(data)
+			return
+		if self.data_buffer.add(data):
+			log.debug('Data buffered, size: {}', self.data_buffer.size())
+		else:
+			log.warn('Buffer full, data lost')
+			fixes.release(data)
+
+	def _record_latency(self, latency):
+		"""Update enqueue-to-send latency stats"""
+		self.last_latency = latency
+		if latency > self.max_latency:
+			self.max_latency = latency
+		if self.avg_latency:
+			self.avg_latency = (self.avg_latency * 7 + latency) // 8
+		else:
+			self.avg_latency = latency
+
+	def _send_buffered_data(self):
+		"""Send one pipelined burst of buffered data"""
+		self._swap()
+		protocol = self.protocol
+		buffered = self.data_buffer.peek(BURST_BATCH)
+		if not protocol or not buffered or not link.prepare() or not self.running or self.queue.size() > 0:
+			return False
+		start = memory.begin()
+		log.debug('Sending buffered data, count: {}', len(buffered))
+		sent_count = self._transfer(protocol, buffered)
+		if sent_count < len(buffered):
+			log.warn('Failed to send buffered data, stopping')
+		if sent_count > 0:
+			self.data_buffer.remove(sent_count)
+			for i in range(sent_count):
+				fixes.release(buffered[i])
+			log.info('Sent {} buffered records', sent_count)
+		memory.end('buffer_drain', start)
+		return sent_count == len(buffered)
@@ -1,78 +1,151 @@
-import wifiScan
-import _thread
-import utime
-
-
-class WiFiScanner:
-	"""WiFi scanner for location assistance"""
-
-	def __init__(self):
-		self.enabled = False
-		self.scan_result = None
-		self.scan_complete = False
-		self.lock = _thread.allocate_lock()
-
-	def enable(self):
-		"""Enable WiFi module"""
-		try:
-			ret = wifiScan.control(1)
-			if ret == 0:
-				self.enabled = True
-				print('WiFi scanner enabled')
-				return True
-			else:
-				print('WiFi scanner enable failed:', ret)
-				return False
-		except Exception as e:
-			print('WiFi enable error:', e)
-			return False
-
-	def disable(self):
-		"""Disable WiFi module"""
-		try:
-			wifiScan.control(0)
-			self.enabled = False
-			print('WiFi scanner disabled')
-		except Exception as e:
-			print('WiFi disable error:', e)
-
-	def scan_networks(self):
-		"""Scan for nearby WiFi networks"""
-		if not self.enabled:
-			if not self.enable():
-				return []
-		try:
-			self.scan_result = None
-			self.scan_complete = False
-			wifiScan.setCallback(self._scan_callback)
-			ret = wifiScan.asyncStart()
-			if ret != 0:
-				print('WiFi scan start failed:', ret)
-				return []
-			timeout = 10
-			start_time = utime.time()
-			while not self.scan_complete and (utime.time() - start_time) < timeout:
-				utime.sleep_ms(100)
-			if not self.scan_complete:
-				print('WiFi scan timeout')
-				return []
-			return self.scan_result if self.scan_result else []
-		except Exception as e:
-			print('WiFi scan error:', e)
-			return []
-
-	def _scan_callback(self, data):
-		"""Callback for WiFi scan results"""
-		try:
-			with self.lock:
-				count, aps = data
-				wifi_list = []
-				for ap_info in aps:
-					mac_addr, rssi = ap_info
-					wifi_list.append({'mac': mac_addr, 'signal': rssi})
-					print('WiFi AP: MAC={}, RSSI={}dB'.format(mac_addr, rssi))
-				self.scan_result = wifi_list
-				self.scan_complete = True
-		except Exception as e:
-			print('Scan callback error:', e)
-			self.scan_complete = True
+import wifiScan
+import _thread
+import utime
+import ubinascii
+from usr.metrics import metrics
+from usr.memory import memory
+from usr.energy import energy
+from usr.logger import get_logger
+
+
+log = get_logger('wifi')
+
+# Fingerprint layout: count byte, then per AP 6 bytes MAC + 1 byte abs(RSSI)
+AP_RECORD_SIZE = 7
+
+
+class WiFiScanner:
+	"""Asynchronous WiFi scanner with cached fingerprints for location assistance"""
+
+	SCAN_TIMEOUT = 10
+
+	def __init__(self, max_aps=8, max_age=300):
+		self.enabled = False
+		self.scanning = False
+		self.scan_started = 0
+		self.scan_ticks = 0
+		self.max_aps = max_aps
+		self.max_age = max_age
+		self.fingerprint = None
+		self.fingerprint_time = 0
+		self.scan_count = 0
+		self.reuse_count = 0
+		self.lock = _thread.allocate_lock()
+
+	def enable(self):
+		"""Enable WiFi module"""
+		try:
+			ret = wifiScan.control(1)
+			if ret == 0:
+				self.enabled = True
+				energy.active('wifi', 1)
+				log.debug('WiFi scanner enabled')
+				return True
+			else:
+				log.error('WiFi scanner enable failed: {}', ret)
+				return False
+		except Exception as e:
+			log.error('WiFi enable error: {}', e)
+			return False
+
+	def disable(self):
+		"""Disable WiFi module"""
+		try:
+			wifiScan.control(0)
+			self.enabled = False
+			energy.active('wifi', 0)
+			self.scanning = False
+			log.debug('WiFi scanner disabled')
+		except Exception as e:
+			log.error('WiFi disable error: {}', e)
+
+	def get_fingerprint(self, stationary=False, interval=None):
+		"""Get latest fingerprint without blocking, starting a new scan when needed.
+		The cache is reused up to max_age only while stationary; when moving the last scan counts only if it is
+		no older than interval (report interval in seconds, one scan period if not given)"""
+		age = utime.time() - self.fingerprint_time
+		if self.fingerprint and stationary and age < self.max_age:
+			self.reuse_count += 1
+			metrics.incr('wifi_reuse')
+			return self.fingerprint
+		self.start_scan()
+		if age <= (interval or self.SCAN_TIMEOUT):
+			return self.fingerprint
+		return None
+
+	def start_scan(self):
+		"""Start asynchronous scan, radio is powered down when results arrive"""
+		if self.scanning:
+			if utime.time() - self.scan_started < self.SCAN_TIMEOUT:
+				return True
+			log.warn('WiFi scan timeout')
+			metrics.incr('wifi_timeout')
+			self.disable()
+		if not self.enabled:
+			if not self.enable():
+				return False
+		try:
+			wifiScan.setCallback(self._scan_callback)
+			ret = wifiScan.asyncStart()
+			if ret != 0:
+				log.error('WiFi scan start failed: {}', ret)
+				self.disable()
+				return False
+			self.scanning = True
+			self.scan_started = utime.time()
+			self.scan_ticks = utime.ticks_ms()
+			self.scan_count += 1
+			metrics.incr('wifi_scan')
+			return True
+		except Exception as e:
+			log.error('WiFi scan error: {}', e)
+			return False
+
+	def _scan_callback(self, data):
+		"""Callback for WiFi scan results"""
+		start = memory.begin()
+		try:
+			count, aps = data
+			best = {}
+			for mac_addr, rssi in aps:
+				if mac_addr not in best or rssi > best[mac_addr]:
+					best[mac_addr] = rssi
+			ranked = sorted(best.items(), key=lambda ap: ap[1], reverse=True)[:self.max_aps]
+			fingerprint = bytearray(1 + len(ranked) * AP_RECORD_SIZE)
+			fingerprint[0] = len(ranked)
+			offset = 1
+			for mac_addr, rssi in ranked:
+				fingerprint[offset:offset + 6] = ubinascii.unhexlify(mac_addr.replace(':', ''))
+				fingerprint[offset + 6] = min(abs(rssi), 0xFF)
+				offset += AP_RECORD_SIZE
+			with self.lock:
+				self.fingerprint = bytes(fingerprint) if ranked else None
+				self.fingerprint_time = utime.time()
+			memory.end('wifi_scan', start)
+			metrics.observe_since('wifi_scan_ms', self.scan_ticks)
+			log.debug('WiFi scan complete: {} APs, {} kept', count, len(ranked))
+		except Exception as e:
+			log.error('Scan callback error: {}', e)
+		self.scanning = False
+		self.disable()
+
+
+def fingerprint_size(fingerprint):
+	"""Get number of APs in fingerprint"""
+	return fingerprint[0] if fingerprint else 0
+
+
+def iter_fingerprint(fingerprint):
+	"""Yield (mac_bytes, rssi) pairs from fingerprint"""
+	for i in range(fingerprint_size(fingerprint)):
+		offset = 1 + i * AP_RECORD_SIZE
+		yield fingerprint[offset:offset + 6], -fingerprint[offset + 6]
+
+
+def decode_fingerprint(fingerprint):
+	"""Decode fingerprint to list of {'mac', 'signal'} dicts"""
+	networks = []
+	for mac, rssi in iter_fingerprint(fingerprint):
+		mac_hex = ubinascii.hexlify(mac).decode()
+		networks.append({'mac': ':'.join([mac_hex[i:i + 2] for i in range(0, 12, 2)]), 'signal': rssi})
+	return networks